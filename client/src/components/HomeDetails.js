@@ -8,6 +8,9 @@ const HomeDetails = () => {
   const navigate = useNavigate();
   const { id } = useParams();
   const [home, setHome] = useState(null);
+  const [reviews, setReviews] = useState([]);
+  const [reviewsCursor, setReviewsCursor] = useState(null);
+  const [reviewSort, setReviewSort] = useState("newest");
   const [showReviewModal, setShowReviewModal] = useState(false);
   const [reviewData, setReviewData] = useState({
     rating: "",
@@ -29,6 +32,30 @@ const HomeDetails = () => {
       });
   }, [id]);
 
+  const loadReviews = (cursor = null) => {
+    const params = new URLSearchParams({ sort: reviewSort });
+    if (cursor) {
+      params.set("cursor", cursor);
+    }
+    fetch(`/homes/${id}/reviews?${params}`)
+      .then((res) => {
+        if (res.ok) {
+          return res.json().then((page) => {
+            setReviews((prev) => (cursor ? [...prev, ...page] : page));
+            setReviewsCursor(res.headers.get("X-Next-Cursor"));
+          });
+        }
+        return res.json().then((errorObj) => toast.error(errorObj.Error));
+      })
+      .catch((error) => {
+        console.error("Error fetching reviews:", error);
+        toast.error("Error fetching reviews.");
+      });
+  };
+
+  // eslint-disable-next-line react-hooks/exhaustive-deps
+  useEffect(() => loadReviews(), [id, reviewSort]);
+
   if (!home) {
     return <div>Loading...</div>;
   }
@@ -61,10 +88,7 @@ const HomeDetails = () => {
         if (res.ok) {
           return res.json().then((data) => {
             setShowReviewModal(false);
-            setHome((prevHome) => ({
-              ...prevHome,
-              reviews: [...prevHome.reviews, data],
-            }));
+            setReviews((prev) => [data, ...prev]);
           });
         } else {
           return res.json().then((errorObj) => toast.error(errorObj.Error));
@@ -186,15 +210,31 @@ const HomeDetails = () => {
       )}
       <div className="reviews-container">
         <h3>Reviews</h3>
-        {home.reviews && home.reviews.length > 0 ? (
-          home.reviews.map((review, index) => (
-            <div key={index}>
+        <select
+          value={reviewSort}
+          onChange={(e) => setReviewSort(e.target.value)}
+        >
+          <option value="newest">Newest</option>
+          <option value="highest">Highest rated</option>
+          <option value="lowest">Lowest rated</option>
+        </select>
+        {reviews.length > 0 ? (
+          reviews.map((review) => (
+            <div key={review.id}>
               <p>{review.review}</p>
+              <span>
+                {review.rating}/5 by {review.user?.username}
+              </span>
             </div>
           ))
         ) : (
           <p>No reviews yet.</p>
         )}
+        {reviewsCursor && (
+          <button onClick={() => loadReviews(reviewsCursor)}>
+            Show more reviews
+          </button>
+        )}
       </div>
     </div>
   ) : (
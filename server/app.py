@@ -1,12 +1,14 @@
 #!/usr/bin/env python3
 
+import hmac
 import os
 
 # Remote library imports
-from flask import request, session, jsonify, render_template
+from flask import request, session, jsonify, render_template, send_from_directory
 from flask_restful import Resource
 from werkzeug.exceptions import NotFound
 from functools import wraps
+from sqlalchemy import update
 from sqlalchemy.sql import func
 
 # Cloudinary
@@ -21,6 +23,37 @@ from config import app, db, api
 # Add your model imports
 from models.homeFavorite import HomeFavorite
 from models.user import User
+from models.home import Home
+from models.review import Review
+from models.favoritesCollection import FavoriteCollection
+from models.job import Job
+from home_search import STREAM_MAX_PAGE_SIZE, parse_home_filters, parse_page, search_home_ids
+from filter_engine import hydrate_homes, iter_homes
+from similar_homes import similar_homes
+from recommendations import recommended_homes
+from market import market_summary, parse_market_query
+from review_feed import parse_review_page, review_page
+from favorites import apply_operations, default_collection, parse_operations
+from pagination import wants_stream
+from serializers import eager_options, json_response, stream_response, to_dict, to_dicts, warm_plans
+from compression import compress_response
+from metrics import finish_request, record_status, render_metrics, start_request
+from query_budget import query_budget, query_count
+from uploads import queue_profile_image
+from passwords import PasswordPoolBusy
+from jobs import create_job
+from purge import purge_user
+from routing import stick_to_primary
+from conditional import home_etag, homes_etag, not_modified, set_validators, user_etag
+import commands
+
+# Compile serializer field plans once at import
+warm_plans(User, Home, Review, FavoriteCollection, HomeFavorite, Job)
+
+# Loader strategies: each payload is fetched in a fixed number of round trips
+USER_LOADERS = eager_options(User)
+FAVORITES_LOADERS = eager_options(FavoriteCollection)
+FAVORITES_STREAM_LOADERS = eager_options(FavoriteCollection, joined=False)
 
 
 # Cloudinary
@@ -34,6 +67,38 @@ def not_found(error):
     return {"error": error.description}, 404
 
 
+# Compression (registered first so it runs after every other after_request hook)
+app.after_request(compress_response)
+
+
+# Metrics
+app.before_request(start_request)
+app.after_request(record_status)
+app.teardown_request(finish_request)
+
+
+@app.route("/metrics")
+def metrics():
+    if token := app.config["METRICS_TOKEN"]:
+        allowed = hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")
+    else:
+        allowed = app.debug or app.config["METRICS_PUBLIC"]
+    if not allowed:
+        return {"Error": "Access Denied."}, 403
+    return render_metrics(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
+# Replica Routing
+app.after_request(stick_to_primary)
+
+
+# Query Counting
+@app.after_request
+def add_query_count(response):
+    response.headers["X-Query-Count"] = str(query_count())
+    return response
+
+
 # Route Protection
 def login_required(func):
     @wraps(func)
@@ -45,6 +110,20 @@ def login_required(func):
     return decorated_function
 
 
+def owner_required(key):
+    # Below login_required: the logged-in user has to be the one named by the URL's `key`
+    def decorator(func):
+        @wraps(func)
+        def decorated_function(*args, **kwargs):
+            if session["user_id"] != kwargs[key]:
+                return {"Error": "Access Denied."}, 403
+            return func(*args, **kwargs)
+
+        return decorated_function
+
+    return decorator
+
+
 # API Routes
 
 
@@ -56,32 +135,127 @@ def index(id=0):
     return render_template("index.html")
 
 
+# Locally stored uploads (IMAGE_UPLOAD_BACKEND=local)
+@app.route("/uploads/<path:filename>")
+def uploaded_file(filename):
+    return send_from_directory(app.config["IMAGE_UPLOAD_DIR"], filename)
+
+
+class Homes(Resource):
+    @query_budget(4)
+    def get(self):
+        try:
+            filters = parse_home_filters(request.args)
+            if wants_stream(request.args):
+                # Large pages: ids first, then rows hydrated and encoded chunk by chunk
+                sort, cursor, limit = parse_page(request.args, STREAM_MAX_PAGE_SIZE)
+                ids, next_cursor = search_home_ids(filters, sort, cursor, limit)
+                headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+                return stream_response(iter_homes(ids), 200, headers)
+
+            # The validator comes from the page's ids and row versions; rows are only hydrated for a 200
+            sort, cursor, limit = parse_page(request.args)
+            ids, next_cursor = search_home_ids(filters, sort, cursor, limit)
+            headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+            etag = homes_etag(ids, request.query_string, next_cursor)
+            if response := not_modified(etag):
+                response.headers.update(headers)
+                return response
+            return set_validators(json_response(to_dicts(hydrate_homes(ids)), 200, headers), etag)
+        except Exception as e:
+            return {"Error": str(e)}, 400
+
+
+api.add_resource(Homes, "/homes")
+
+
+class HomeById(Resource):
+    @query_budget(2)
+    def get(self, id):
+        try:
+            if not (validators := home_etag(id)):
+                return {"Error": "Home not found."}, 404
+            if response := not_modified(*validators):
+                return response
+            home = db.session.get(Home, id)
+            return set_validators(json_response(to_dict(home), 200), *validators)
+        except Exception as e:
+            return {"Error": str(e)}, 400
+
+
+api.add_resource(HomeById, "/homes/<int:id>")
+
+
+class SimilarHomes(Resource):
+    @query_budget(2)
+    def get(self, id):
+        try:
+            limit = min(int(request.args.get("limit", app.config["SIMILAR_HOMES_K"])), app.config["SIMILAR_HOMES_K"])
+            if limit < 1:
+                raise ValueError("Limit must be a positive integer.")
+            similar = similar_homes(id, limit)
+            if not similar and not home_etag(id):
+                return {"Error": "Home not found."}, 404
+            return json_response([{**to_dict(home), "similarity": round(score, 4)} for home, score in similar], 200)
+        except Exception as e:
+            return {"Error": str(e)}, 400
+
+
+api.add_resource(SimilarHomes, "/homes/<int:id>/similar")
+
+
+class MarketAnalytics(Resource):
+    @query_budget(2)
+    def get(self):
+        try:
+            return json_response({"locations": market_summary(**parse_market_query(request.args))}, 200)
+        except Exception as e:
+            return {"Error": str(e)}, 400
+
+
+api.add_resource(MarketAnalytics, "/analytics/market")
+
+
+class HomeReviews(Resource):
+    @query_budget(2)
+    def get(self, id):
+        try:
+            sort, cursor, limit = parse_review_page(request.args)
+            reviews, next_cursor = review_page(id, sort, cursor, limit)
+            if not reviews and not cursor and not home_etag(id):
+                return {"Error": "Home not found."}, 404
+            headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+            return json_response(reviews, 200, headers)
+        except Exception as e:
+            return {"Error": str(e)}, 400
+
+
+api.add_resource(HomeReviews, "/homes/<int:id>/reviews")
+
+
 class UserById(Resource):
     @login_required
+    @query_budget(7)
     def get(self, id):
         try:
-            if user := db.session.get(User, id):
-                return user.to_dict(), 200
-            else:
+            if not (etag := user_etag(id, "user")):
                 return {"Error": "User not found."}, 404
+            if response := not_modified(etag, private=True):
+                return response
+            user = db.session.get(User, id, options=USER_LOADERS)
+            return set_validators(json_response(to_dict(user), 200), etag, private=True)
         except Exception as e:
             return {"Error": str(e)}, 400
 
     @login_required
+    @owner_required("id")
     def patch(self, id):
         if user := db.session.get(User, id):
             try:
-                file = request.files["profile_image"]
-                if file:
-                    response = cloudinary.uploader.upload(
-                        file,
-                        upload_preset="HomeApp",
-                        unique_filename=True,
-                        overwrite=True,
-                        eager=[{"width": 500, "crop": "fill"}],
-                    )
-                    image_url = response["eager"][0]["secure_url"]
-                    user.profile_image = image_url
+                headers = {}
+                if file := request.files.get("profile_image"):
+                    job = queue_profile_image(user, file)
+                    headers["X-Upload-Job"] = f"/jobs/{job.id}"
 
                 data = request.form
                 for attr, value in data.items():
@@ -90,22 +264,36 @@ class UserById(Resource):
                     else:
                         setattr(user, attr, value)
                 db.session.commit()
-                return user.to_dict(), 202
+                return json_response(to_dict(user), 202, headers)
 
+            except PasswordPoolBusy as e:
+                db.session.rollback()
+                return {"Error": str(e)}, 503
             except Exception as e:
+                db.session.rollback()
                 return {"Error": [str(e)]}, 400
         else:
             return {"Error": "User not found"}, 404
 
     @login_required
+    @owner_required("id")
     def delete(self, id):
+        # Marks the caller's own account deleted with one UPDATE and hands the rows behind it to a purge job
         try:
-            if user := db.session.get(User, id):
-                db.session.delete(user)
-                db.session.commit()
-                return "", 204
-            else:
+            users = User.__table__
+            marked = db.session.execute(
+                update(users)
+                .where(users.c.id == id, users.c.deleted_at.is_(None))
+                .values(deleted_at=func.now(), version=users.c.version + 1)
+            )
+            if not marked.rowcount:
+                db.session.rollback()
                 return {"Error": "User not found."}, 404
+            create_job("purge_user", purge_user, id, user_id=session["user_id"])
+            db.session.commit()
+            # No link to the job: the caller is logged out here and could never read it
+            del session["user_id"]
+            return {}, 202
         except Exception as e:
             db.session.rollback()
             return {"Error": str(e)}, 400
@@ -116,13 +304,21 @@ api.add_resource(UserById, "/users/<int:id>")
 
 class Favorites(Resource):
     @login_required
+    @query_budget(8)
     def get(self, user_id):
         try:
-            if user := db.session.get(User, user_id):
-                favorites = [favorite.to_dict() for favorite in user.favorites]
-                return favorites, 200
-            else:
+            if not (etag := user_etag(user_id, "favorites")):
                 return {"Error": "User not found."}, 404
+            if response := not_modified(etag, private=True):
+                return response
+            favorites = FavoriteCollection.query.filter_by(user_id=user_id).order_by(FavoriteCollection.id)
+            if wants_stream(request.args):
+                # Server-side cursor: collections are fetched, loaded and encoded 100 at a time
+                statement = favorites.options(*FAVORITES_STREAM_LOADERS).statement
+                response = stream_response(db.session.scalars(statement, execution_options={"yield_per": 100}), 200)
+            else:
+                response = json_response(to_dicts(favorites.options(*FAVORITES_LOADERS).all()), 200)
+            return set_validators(response, etag, private=True)
         except Exception as e:
             return {"Error": str(e)}, 400
 
@@ -130,22 +326,61 @@ class Favorites(Resource):
 api.add_resource(Favorites, "/users/<int:user_id>/favorites")
 
 
-class AddFavorite(Resource):
+class Recommendations(Resource):
     @login_required
-    def post(self, user_id):
+    @owner_required("user_id")
+    @query_budget(2)
+    def get(self, user_id):
         try:
-            user = User.query.get(user_id)
-
-            if not user:
+            per_user = app.config["RECOMMENDATIONS_PER_USER"]
+            limit = min(int(request.args.get("limit", per_user)), per_user)
+            if limit < 1:
+                raise ValueError("Limit must be a positive integer.")
+            recommended = recommended_homes(user_id, limit)
+            if not recommended and not db.session.query(User.id).filter_by(id=user_id).first():
                 return {"Error": "User not found."}, 404
+            return json_response([{**to_dict(home), "score": round(score, 4)} for home, score in recommended], 200)
+        except Exception as e:
+            return {"Error": str(e)}, 400
+
 
-            data = request.json
-            new_favorite = Favorite(user_id=user.id, **data)
-            db.session.add(new_favorite)
+api.add_resource(Recommendations, "/users/<int:user_id>/recommendations")
+
+
+class FavoritesBatch(Resource):
+    @login_required
+    @owner_required("user_id")
+    def post(self, user_id):
+        # Adds, removes, moves or replaces many homes across the user's collections in one transaction
+        try:
+            diff = apply_operations(user_id, parse_operations(request.get_json(silent=True)))
             db.session.commit()
+            return diff, 200
+        except LookupError as e:
+            db.session.rollback()
+            return {"Error": str(e)}, 404
+        except Exception as e:
+            db.session.rollback()
+            return {"Error": str(e)}, 400
+
 
-            return new_favorite.to_dict(), 201
+api.add_resource(FavoritesBatch, "/users/<int:user_id>/favorites/batch")
 
+
+class AddFavorite(Resource):
+    @login_required
+    @owner_required("user_id")
+    def post(self, user_id):
+        try:
+            data = request.get_json(silent=True) or {}
+            operation = {"op": "add", "collection_id": data.get("favorite_collection_id"), "home_ids": [data.get("home_id")]}
+            diff = apply_operations(user_id, parse_operations({"operations": [operation]}))
+            db.session.commit()
+            favorite = {"favorite_collection_id": operation["collection_id"], "home_id": data["home_id"]}
+            return favorite, 201 if diff["added"] else 200
+        except LookupError as e:
+            db.session.rollback()
+            return {"Error": str(e)}, 404
         except Exception as e:
             db.session.rollback()
             return {"Error": str(e)}, 400
@@ -154,22 +389,45 @@ class AddFavorite(Resource):
 api.add_resource(AddFavorite, "/<int:user_id>/add_favorite")
 
 
+class AddToStack(Resource):
+    @login_required
+    @owner_required("user_id")
+    def post(self, user_id, home_id):
+        try:
+            collection = default_collection(user_id)
+            apply_operations(user_id, [{"op": "add", "collection_id": collection.id, "home_ids": [home_id]}])
+            db.session.commit()
+            return {"favorite_collection_id": collection.id, "home_id": home_id}, 201
+        except LookupError as e:
+            db.session.rollback()
+            return {"Error": str(e)}, 404
+        except Exception as e:
+            db.session.rollback()
+            return {"Error": str(e)}, 400
+
+
+api.add_resource(AddToStack, "/<int:user_id>/add_to_stack/<int:home_id>")
+
+
 class RemoveFavorite(Resource):
     @login_required
+    @owner_required("user_id")
     def delete(self, user_id, favorite_id):
+        # favorite_id is the home; it leaves ?favorite_collection_id= or, without one, every collection
         try:
-            user = User.query.get(user_id)
-            if not user:
-                return {"Error": "User not found."}, 404
-
-            favorite = Favorite.query.filter_by(id=favorite_id, user_id=user_id).first()
-            if not favorite:
+            if collection_id := request.args.get("favorite_collection_id", type=int):
+                collection_ids = [collection_id]
+            else:
+                collection_ids = FavoriteCollection.query.with_entities(FavoriteCollection.id).filter_by(user_id=user_id)
+                collection_ids = [id for (id,) in collection_ids]
+            operations = [{"op": "remove", "collection_id": id, "home_ids": [favorite_id]} for id in collection_ids]
+            if not operations or not apply_operations(user_id, operations)["removed"]:
                 return {"Error": "Favorite not found."}, 404
-
-            db.session.delete(favorite)
             db.session.commit()
-
             return {"Success": "Favorite removed"}, 200
+        except LookupError as e:
+            db.session.rollback()
+            return {"Error": str(e)}, 404
         except Exception as e:
             db.session.rollback()
             return {"Error": str(e)}, 400
@@ -183,35 +441,28 @@ api.add_resource(RemoveFavorite, "/<int:user_id>/remove_favorite/<int:favorite_i
 # Signup
 class SignUp(Resource):
     def post(self):
-        file = request.files["profile_image"]
-        if file:
-            try:
-                response = cloudinary.uploader.upload(
-                    file,
-                    upload_preset="HomeApp",
-                    unique_filename=True,
-                    overwrite=True,
-                    eager=[{"width": 500, "crop": "fill"}],
-                )
-                image_url = response["eager"][0]["secure_url"]
-            except Exception as e:
-                return {"Error": str(e)}, 400
-
         data = request.form
 
         try:
             new_user = User(
                 username=data["username"],
                 email=data["email"],
-                profile_image=image_url if file and image_url else None,
             )
             new_user.password_hash = data["_password_hash"]
-
             db.session.add(new_user)
+
+            # The image is uploaded by a background worker; the user starts out "pending"
+            headers = {}
+            if file := request.files.get("profile_image"):
+                job = queue_profile_image(new_user, file)
+                headers["X-Upload-Job"] = f"/jobs/{job.id}"
             db.session.commit()
 
             session["user_id"] = new_user.id
-            return new_user.to_dict(), 201
+            return json_response(to_dict(new_user), 201, headers)
+        except PasswordPoolBusy as e:
+            db.session.rollback()
+            return {"Error": str(e)}, 503
         except Exception as e:
             db.session.rollback()
             return {"Error": str(e)}, 400
@@ -224,12 +475,17 @@ class Login(Resource):
     def post(self):
         try:
             data = request.form
-            user = User.query.filter_by(email=data.get("email")).first()
+            user = User.query.options(*USER_LOADERS).filter_by(email=data.get("email"), deleted_at=None).first()
             if user and user.authenticate(data.get("_password_hash")):
+                if user.rehash_if_needed(data.get("_password_hash")):
+                    db.session.commit()
                 session["user_id"] = user.id
-                return user.to_dict(), 200
+                return json_response(to_dict(user), 200)
             else:
                 return {"Error": "Invalid Login"}, 422
+        except PasswordPoolBusy as e:
+            db.session.rollback()
+            return {"Error": str(e)}, 503
         except Exception as e:
             db.session.rollback()
             return {"Error": str(e)}, 400
@@ -255,15 +511,32 @@ api.add_resource(Logout, "/logout")
 
 
 class CheckMe(Resource):
+    @query_budget(7)
     def get(self):
         if "user_id" in session:
-            user = db.session.get(User, session.get("user_id"))
-            return user.to_dict(), 200
+            if not (etag := user_etag(session["user_id"], "user")):
+                return {"Error": "Please log in."}, 400
+            if response := not_modified(etag, private=True):
+                return response
+            user = db.session.get(User, session["user_id"], options=USER_LOADERS)
+            return set_validators(json_response(to_dict(user), 200), etag, private=True)
         else:
             return {"Error": "Please log in."}, 400
 
 
 api.add_resource(CheckMe, "/me")
 
+
+class JobById(Resource):
+    @login_required
+    def get(self, job_id):
+        job = db.session.get(Job, job_id)
+        if job and job.user_id == session.get("user_id"):
+            return json_response(to_dict(job), 200)
+        return {"Error": "Job not found."}, 404
+
+
+api.add_resource(JobById, "/jobs/<string:job_id>")
+
 if __name__ == "__main__":
     app.run(port=5555, debug=True)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# Password hashing throughput at different BCRYPT_LOG_ROUNDS, inline vs. the process pool:
+#   python benchmarks/bcrypt_benchmark.py --costs 10 11 12 --requests 32 --workers 4
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URI", "sqlite://")
+os.environ.setdefault("SESSION_SECRET", "benchmark")
+
+
+def run(app, passwords, cost, requests, concurrency):
+    # `requests` hashes issued from `concurrency` request threads, as concurrent signups would
+    def signup(_):
+        with app.app_context():
+            return passwords.hash_password("benchmark-password", rounds=cost)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as threads:
+        list(threads.map(signup, range(requests)))
+    elapsed = time.perf_counter() - start
+    return requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--costs", type=int, nargs="+", default=[10, 11, 12, 13])
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    from config import app
+    import passwords
+
+    results = []
+    for cost in args.costs:
+        app.config.update(BCRYPT_POOL_WORKERS=0)
+        inline = run(app, passwords, cost, args.requests, args.concurrency)
+        app.config.update(
+            BCRYPT_POOL_WORKERS=args.workers,
+            BCRYPT_QUEUE_DEPTH=args.requests,
+            BCRYPT_QUEUE_TIMEOUT=None,
+        )
+        run(app, passwords, 4, args.workers, args.workers)  # start the worker processes outside the timing
+        pooled = run(app, passwords, cost, args.requests, args.concurrency)
+        print(f"cost {cost:2d}   inline {inline:8.1f} hashes/s   pool({args.workers}) {pooled:8.1f} hashes/s")
+        results.append({"cost": cost, "inline_per_sec": inline, "pool_per_sec": pooled, "workers": args.workers})
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
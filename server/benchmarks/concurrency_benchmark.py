@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# How many concurrent connections a single server process sustains when requests wait on I/O:
+# the threaded Werkzeug server (what `python app.py` runs) against the gevent mode (serve.py).
+#   python benchmarks/concurrency_benchmark.py --connections 10 100 500 1000 --io-delay 50
+# --io-delay sleeps that many ms before every SQL statement, standing in for a network database
+# or an upstream API; the client is one asyncio process holding that many keep-alive connections.
+# --write-interval commits a Home price change inside the server every that many seconds, so the
+# CPU-bound work a Home write sets off (the similar-homes refresh, index updates) runs under load.
+
+import sys
+
+# The gevent server process has to patch before anything imports socket or threading
+if "--serve" in sys.argv and sys.argv[sys.argv.index("--mode") + 1] == "gevent":
+    from gevent import monkey
+
+    monkey.patch_all()
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import signal
+import subprocess
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("SESSION_SECRET", "benchmark")
+# No logins here, so no bcrypt pool processes to clean up
+os.environ.setdefault("BCRYPT_POOL_WORKERS", "0")
+
+from load_test import SCALES, _git_revision, _percentile, seed  # noqa: E402
+
+MODES = ("threaded", "gevent")
+READ_TIMEOUT = 30
+
+
+# Server
+def _write_homes(interval, homes):
+    # Runs in the server process, as a request that edits a listing would
+    from config import app, db
+    from models.home import Home
+
+    rng = random.Random(0)
+    while True:
+        time.sleep(interval)
+        try:
+            with app.app_context():
+                home = db.session.get(Home, rng.randint(1, homes))
+                if home is not None and home.price_per_night is not None:
+                    home.price_per_night = round(home.price_per_night * rng.uniform(0.9, 1.1), 2)
+                    db.session.commit()
+        except Exception:
+            app.logger.exception("Benchmark home write failed")
+
+
+def serve(port, mode, io_delay, write_interval, homes):
+    import logging
+    import threading
+
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    if io_delay:
+        # time.sleep is cooperative once gevent has patched it, as a socket wait on Postgres would be
+        @event.listens_for(Engine, "before_cursor_execute")
+        def simulated_latency(*_):
+            time.sleep(io_delay / 1000)
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    if write_interval:
+        import app as _  # noqa: F401 (finish importing before the writer does)
+
+        # A greenlet in gevent mode, since threading is patched
+        threading.Thread(target=_write_homes, args=(write_interval, homes), daemon=True).start()
+    if mode == "gevent":
+        import serve as gevent_server
+
+        os.environ["HOST"], os.environ["PORT"] = "127.0.0.1", str(port)
+        gevent_server.main()
+    else:
+        from werkzeug.serving import make_server
+
+        from app import app
+
+        make_server("127.0.0.1", port, app, threaded=True).serve_forever()
+
+
+def start_server(port, mode, args, timeout=60):
+    command = [sys.executable, os.path.abspath(__file__), "--serve", str(port), "--mode", mode]
+    command += ["--scale", args.scale, "--io-delay", str(args.io_delay), "--write-interval", str(args.write_interval)]
+    process = subprocess.Popen(command, start_new_session=True)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            status, _ = asyncio.run(_fetch_once("127.0.0.1", port, "/homes/1"))
+            if status:
+                return process
+        except OSError:
+            if process.poll() is not None:
+                sys.exit("Server process exited during startup.")
+            time.sleep(0.2)
+    stop_server(process)
+    sys.exit("Server did not start in time.")
+
+
+def stop_server(process):
+    os.killpg(process.pid, signal.SIGTERM)
+    process.wait()
+
+
+def server_memory(pid):
+    # Peak resident set (MB) and thread count, from /proc (Linux only)
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f)
+    except OSError:
+        return None, None
+    return int(fields["VmHWM"].split()[0]) / 1024, int(fields["Threads"])
+
+
+# Client
+async def _read_response(reader):
+    # -> (status, keep_alive); handles Content-Length and chunked bodies
+    head = await reader.readuntil(b"\r\n\r\n")
+    status_line, *lines = head.decode("latin-1").split("\r\n")
+    version, status = status_line.split(" ", 2)[:2]
+    headers = {name.strip().lower(): value.strip() for name, value in (line.split(":", 1) for line in lines if line)}
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        while size := int((await reader.readuntil(b"\r\n")).split(b";")[0], 16):
+            await reader.readexactly(size + 2)
+        await reader.readuntil(b"\r\n")
+    elif "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    else:
+        await reader.read()
+        return int(status), False
+    connection = headers.get("connection", "").lower()
+    keep_alive = connection != "close" and (version == "HTTP/1.1" or connection == "keep-alive")
+    return int(status), keep_alive
+
+
+async def _fetch_once(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+        return await asyncio.wait_for(_read_response(reader), READ_TIMEOUT)
+    finally:
+        writer.close()
+
+
+async def _connection(index, host, port, homes, recording_from, deadline, results):
+    rng = random.Random(index)
+    reader = writer = None
+    loop = asyncio.get_running_loop()
+    while (now := loop.time()) < deadline:
+        path = f"/homes/{rng.randint(1, homes)}"
+        began = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+            status, keep_alive = await asyncio.wait_for(_read_response(reader), READ_TIMEOUT)
+            failed = status >= 400
+        except (OSError, ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError):
+            failed, keep_alive = True, False
+        elapsed = time.perf_counter() - began
+        if not keep_alive and writer is not None:
+            writer.close()
+            reader = writer = None
+        if now >= recording_from:
+            results["latencies"].append(elapsed)
+            results["errors"] += failed
+        if failed:
+            # Don't spin on a refused connection
+            await asyncio.sleep(0.05)
+    if writer is not None:
+        writer.close()
+
+
+async def _sample_server(pid, results):
+    # The threaded server starts a thread per connection, so count them while they are open
+    while True:
+        _, threads = server_memory(pid)
+        results["threads"] = max(results["threads"], threads or 0)
+        await asyncio.sleep(0.5)
+
+
+async def _drive(host, port, homes, connections, duration, warmup, pid):
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    results = {"latencies": [], "errors": 0, "threads": 0}
+    sampler = asyncio.create_task(_sample_server(pid, results))
+    await asyncio.gather(
+        *(
+            _connection(index, host, port, homes, start + warmup, start + warmup + duration, results)
+            for index in range(connections)
+        )
+    )
+    sampler.cancel()
+    return results
+
+
+def run_level(host, port, homes, connections, duration, warmup, pid):
+    results = asyncio.run(_drive(host, port, homes, connections, duration, warmup, pid))
+    latencies = sorted(results["latencies"])
+    succeeded = len(latencies) - results["errors"]
+    return {
+        "connections": connections,
+        "requests": len(latencies),
+        "errors": results["errors"],
+        "throughput_rps": succeeded / duration,
+        "p50_ms": _percentile(latencies, 0.50) * 1000 if latencies else None,
+        "p99_ms": _percentile(latencies, 0.99) * 1000 if latencies else None,
+        "peak_mb": server_memory(pid)[0],
+        "threads": results["threads"] or None,
+    }
+
+
+# Reporting
+def _format(value, spec):
+    return format(value, spec) if value is not None else "-"
+
+
+def print_results(results):
+    # peak MB is the server's high-water mark so far, so it only grows across the levels of a mode
+    print(f"{'mode':<10}{'conns':>7}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}{'peak MB':>9}{'threads':>9}")
+    for mode, levels in results.items():
+        for level in levels:
+            print(
+                f"{mode:<10}{level['connections']:>7}{level['throughput_rps']:>10.1f}{_format(level['p50_ms'], '>10.1f')}"
+                f"{_format(level['p99_ms'], '>10.1f')}{level['errors']:>8}{_format(level['peak_mb'], '>9.0f')}"
+                f"{_format(level['threads'], '>9')}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare concurrent connections per process: threaded vs gevent.")
+    parser.add_argument("--scale", choices=SCALES, default="1k")
+    parser.add_argument("--database", help="SQLAlchemy URL (default: the load test's SQLite file for the scale)")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--connections", type=int, nargs="+", default=[10, 100, 500, 1000])
+    parser.add_argument("--io-delay", type=float, default=50, help="simulated ms of I/O wait per SQL statement")
+    parser.add_argument("--write-interval", type=float, default=0.5, help="seconds between Home writes (0: none)")
+    parser.add_argument("--db-pool", type=int, default=100, help="database connections per server process")
+    parser.add_argument("--duration", type=float, default=10, help="measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=2, help="unmeasured seconds per level")
+    parser.add_argument("--port", type=int, default=5598)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--serve", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    homes, users = SCALES[args.scale]
+    database = args.database or f"sqlite:///{os.path.join(tempfile.gettempdir(), f'dreamhome-load-{args.scale}.db')}"
+    os.environ["DATABASE_URI"] = database
+    # Both servers get the same pool, so the database is never what runs out first
+    os.environ["DB_POOL_SIZE"], os.environ["DB_MAX_OVERFLOW"] = str(args.db_pool), "0"
+    if args.serve:
+        return serve(args.serve, args.mode, args.io_delay, args.write_interval, homes)
+
+    import app as _  # noqa: F401 (registers every model before create_all)
+    from config import app, db
+    from models.home import Home
+    from models.similarHomeFit import SimilarHomeFit
+    from similar_homes import build_similar_homes
+
+    with app.app_context():
+        if not (db.inspect(db.engine).has_table("homes") and db.session.query(Home.id).count() >= homes):
+            print(f"Seeding {homes:,} homes and {users:,} users into {database} ...")
+            seed(homes, users)
+        db.create_all()
+        if args.write_interval and not db.session.query(SimilarHomeFit.id).first():
+            # Without a build there is nothing for a Home write to refresh
+            print("Building similar homes ...")
+            build_similar_homes()
+
+    # One descriptor per client connection, plus the server's when it shares the limit
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    results = {}
+    for mode in args.modes:
+        results[mode] = []
+        server = start_server(args.port, mode, args)
+        try:
+            for connections in args.connections:
+                print(f"Running {mode} with {connections} connections ...", flush=True)
+                results[mode].append(run_level("127.0.0.1", args.port, homes, connections, args.duration, args.warmup, server.pid))
+        finally:
+            stop_server(server)
+
+    print()
+    print_results(results)
+    report = {
+        "meta": {
+            "revision": _git_revision(),
+            "scale": args.scale,
+            "database": database.split("://")[0],
+            "io_delay_ms": args.io_delay,
+            "write_interval": args.write_interval,
+            "db_pool": args.db_pool,
+            "duration": args.duration,
+            "python": platform.python_version(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+# Seeds a synthetic catalog, serves the app from a separate process and drives each API resource
+# with concurrent keep-alive clients, reporting throughput, latency percentiles and queries/request:
+#   python benchmarks/load_test.py --scale 100k --concurrency 16 --duration 10 --output before.json
+#   python benchmarks/load_test.py --scale 100k --concurrency 16 --duration 10 --compare before.json
+# --database takes any SQLAlchemy URL (e.g. a local Postgres); --url targets an already running server.
+
+import argparse
+import http.client
+import itertools
+import json
+import os
+import platform
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SESSION_SECRET", "benchmark")
+
+# homes, users; every user gets COLLECTIONS x FAVORITES favorites and REVIEWS reviews
+SCALES = {"1k": (1_000, 100), "100k": (100_000, 10_000), "1m": (1_000_000, 100_000)}
+COLLECTIONS, FAVORITES, REVIEWS = 2, 5, 3
+PASSWORD = "benchmark-password"
+CHUNK_SIZE = 10000
+
+
+# Seeding
+def _insert_chunks(connection, table, rows):
+    rows = iter(rows)
+    while chunk := list(itertools.islice(rows, CHUNK_SIZE)):
+        connection.execute(table.insert(), chunk)
+
+
+def seed(homes, users):
+    from config import db
+    from importer import import_homes, synthetic_rows
+    from models.favoritesCollection import FavoriteCollection
+    from models.homeFavorite import HomeFavorite
+    from models.review import Review
+    from models.user import User
+    from passwords import hash_password
+    from ratings import rebuild_rating_aggregates
+
+    rng = random.Random(1)
+    db.drop_all()
+    db.create_all()
+    # Every account shares one hash: seeding 100k users shouldn't take 100k bcrypt rounds
+    password_hash = hash_password(PASSWORD)
+    with db.engine.begin() as connection:
+        _insert_chunks(
+            connection,
+            User.__table__,
+            (
+                {"username": f"user{i}", "email": f"user{i}@example.com", "_password_hash": password_hash}
+                for i in range(1, users + 1)
+            ),
+        )
+    import_homes(synthetic_rows(homes), CHUNK_SIZE)
+
+    with db.engine.begin() as connection:
+        _insert_chunks(
+            connection,
+            FavoriteCollection.__table__,
+            ({"name": f"Trip ideas {c + 1}", "user_id": user_id} for user_id in range(1, users + 1) for c in range(COLLECTIONS)),
+        )
+        collections = FavoriteCollection.__table__
+        collection_ids = [id for (id,) in connection.execute(db.select(collections.c.id))]
+        _insert_chunks(
+            connection,
+            HomeFavorite.__table__,
+            (
+                {"favorite_collection_id": collection_id, "home_id": home_id}
+                for collection_id in collection_ids
+                for home_id in rng.sample(range(1, homes + 1), FAVORITES)
+            ),
+        )
+        _insert_chunks(
+            connection,
+            Review.__table__,
+            (
+                {"rating": rng.randint(1, 5), "review": "A lovely stay.", "home_id": home_id, "user_id": user_id}
+                for user_id in range(1, users + 1)
+                for home_id in rng.sample(range(1, homes + 1), REVIEWS)
+            ),
+        )
+        # Bulk inserts skip the Review events, so aggregates are rebuilt in one pass
+        rebuild_rating_aggregates(connection)
+
+
+# Server
+def serve(port):
+    import logging
+
+    from werkzeug.serving import make_server
+
+    from app import app
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    # Exit normally on SIGTERM so the bcrypt pool is shut down cleanly
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    make_server("127.0.0.1", port, app, threaded=True).serve_forever()
+
+
+def start_server(port, timeout=60):
+    # Own process group, so stopping it also stops the bcrypt pool workers it spawns
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", str(port)], start_new_session=True)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            connection.request("GET", "/homes?limit=1")
+            connection.getresponse().read()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                sys.exit("Server process exited during startup.")
+            time.sleep(0.2)
+    stop_server(process)
+    sys.exit("Server did not start in time.")
+
+
+def stop_server(process):
+    os.killpg(process.pid, signal.SIGTERM)
+    process.wait()
+
+
+# Client
+class Client:
+    # One keep-alive connection with a cookie jar, used by a single load generator thread
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.cookies = {}
+        self.connection = None
+
+    def request(self, method, path, form=None, json_body=None):
+        headers = {}
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        elif json_body is not None:
+            body = json.dumps(json_body)
+            headers["Content-Type"] = "application/json"
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{key}={value}" for key, value in self.cookies.items())
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            raise
+        for header in response.headers.get_all("Set-Cookie") or ():
+            cookie = SimpleCookie(header)
+            for key, morsel in cookie.items():
+                self.cookies[key] = morsel.value
+        return response
+
+    def login(self, user_id):
+        self.request("POST", "/login", form={"email": f"user{user_id}@example.com", "_password_hash": PASSWORD})
+
+
+# Scenarios: (needs_login, request(client, rng, user_id) -> (method, path, form, json))
+_signups = itertools.count(1)
+_signup_prefix = f"lt{random.randrange(16 ** 4):04x}"
+
+
+def _signup(client, rng, user_id, homes, users):
+    username = f"{_signup_prefix}{next(_signups)}"
+    return "POST", "/signup", {"username": username, "email": f"{username}@example.com", "_password_hash": PASSWORD}, None
+
+
+def _login(client, rng, user_id, homes, users):
+    email = f"user{rng.randint(1, users)}@example.com"
+    return "POST", "/login", {"email": email, "_password_hash": PASSWORD}, None
+
+
+def _homes(client, rng, user_id, homes, users):
+    filters = rng.choice(
+        [
+            {},
+            {"sort": "price_asc"},
+            {"bedrooms": f"{rng.randint(1, 4)}+", "max_price": rng.randrange(200, 1500)},
+            {"location": rng.choice(["Chicago", "Miami", "Denver", "Boston"]), "sort": "price_desc"},
+            {"home_type": rng.choice(["house", "apartment", "condo", "cabin"]), "guests": 2},
+        ]
+    )
+    return "GET", f"/homes?{urlencode(filters)}", None, None
+
+
+def _add_favorite(client, rng, user_id, homes, users):
+    body = {"favorite_collection_id": (user_id - 1) * COLLECTIONS + 1, "home_id": rng.randint(1, homes)}
+    return "POST", f"/{user_id}/add_favorite", None, body
+
+
+def _sync_favorites(client, rng, user_id, homes, users):
+    # A 500-home wishlist written in one request
+    home_ids = rng.sample(range(1, homes + 1), min(500, homes))
+    body = {"operations": [{"op": "replace", "collection_id": (user_id - 1) * COLLECTIONS + 2, "home_ids": home_ids}]}
+    return "POST", f"/users/{user_id}/favorites/batch", None, body
+
+
+SCENARIOS = {
+    "signup": (False, _signup),
+    "login": (False, _login),
+    "me": (True, lambda client, rng, user_id, homes, users: ("GET", "/me", None, None)),
+    "user_by_id": (True, lambda client, rng, user_id, homes, users: ("GET", f"/users/{user_id}", None, None)),
+    "favorites": (True, lambda client, rng, user_id, homes, users: ("GET", f"/users/{user_id}/favorites", None, None)),
+    "add_favorite": (True, _add_favorite),
+    "sync_favorites": (True, _sync_favorites),
+    "homes": (False, _homes),
+    "home_by_id": (False, lambda client, rng, user_id, homes, users: ("GET", f"/homes/{rng.randint(1, homes)}", None, None)),
+}
+
+
+def _percentile(ordered, q):
+    return ordered[min(int(round(q * (len(ordered) - 1))), len(ordered) - 1)] if ordered else None
+
+
+def run_scenario(name, host, port, homes, users, concurrency, duration, warmup):
+    needs_login, build = SCENARIOS[name]
+    latencies, queries, errors = [], [], [0]
+    lock = threading.Lock()
+
+    def worker(index):
+        rng = random.Random(index)
+        client = Client(host, port)
+        user_id = rng.randint(1, users)
+        if needs_login:
+            client.login(user_id)
+        own_latencies, own_queries, own_errors = [], [], 0
+        start = time.monotonic()
+        recording_from, deadline = start + warmup, start + warmup + duration
+        while (now := time.monotonic()) < deadline:
+            method, path, form, json_body = build(client, rng, user_id, homes, users)
+            began = time.perf_counter()
+            try:
+                response = client.request(method, path, form, json_body)
+                failed = response.status >= 400
+            except (OSError, http.client.HTTPException):
+                response, failed = None, True
+            elapsed = time.perf_counter() - began
+            if now < recording_from:
+                continue
+            own_latencies.append(elapsed)
+            own_errors += failed
+            if response is not None and (count := response.getheader("X-Query-Count")):
+                own_queries.append(int(count))
+        with lock:
+            latencies.extend(own_latencies)
+            queries.extend(own_queries)
+            errors[0] += own_errors
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "throughput_rps": len(latencies) / duration,
+        "p50_ms": _percentile(latencies, 0.50) * 1000 if latencies else None,
+        "p90_ms": _percentile(latencies, 0.90) * 1000 if latencies else None,
+        "p99_ms": _percentile(latencies, 0.99) * 1000 if latencies else None,
+        "max_ms": latencies[-1] * 1000 if latencies else None,
+        "queries_per_request": sum(queries) / len(queries) if queries else None,
+    }
+
+
+# Reporting
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _format(value, spec):
+    return format(value, spec) if value is not None else "-"
+
+
+def print_results(results):
+    print(f"{'scenario':<14}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'queries':>9}{'errors':>8}")
+    for name, result in results.items():
+        print(
+            f"{name:<14}{result['throughput_rps']:>10.1f}{_format(result['p50_ms'], '>10.2f')}"
+            f"{_format(result['p99_ms'], '>10.2f')}{_format(result['queries_per_request'], '>9.1f')}{result['errors']:>8}"
+        )
+
+
+def compare(results, baseline, threshold):
+    # Regression: throughput down, or p99 latency / queries per request up, by more than threshold
+    print(f"\nvs {baseline['meta'].get('revision') or 'baseline'}:")
+    regressions = []
+    for name, result in results.items():
+        before = baseline["results"].get(name)
+        if not before or not result["requests"] or not before["requests"]:
+            continue
+        changes = {
+            "req/s": (before["throughput_rps"], result["throughput_rps"], -1),
+            "p99": (before["p99_ms"], result["p99_ms"], 1),
+            "queries": (before["queries_per_request"], result["queries_per_request"], 1),
+        }
+        cells = []
+        for label, (old, new, worse) in changes.items():
+            if not old or new is None:
+                continue
+            delta = (new - old) / old
+            cells.append(f"{label} {delta:+.0%}")
+            if delta * worse > threshold:
+                regressions.append(f"{name} {label}")
+        print(f"  {name:<14}{'   '.join(cells)}")
+    if regressions:
+        print(f"\nRegressions beyond {threshold:.0%}: {', '.join(regressions)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the API resources.")
+    parser.add_argument("--scale", choices=SCALES, default="1k")
+    parser.add_argument("--database", help="SQLAlchemy URL (default: a SQLite file per scale in the temp dir)")
+    parser.add_argument("--reseed", action="store_true", help="rebuild the database even if it exists")
+    parser.add_argument("--url", help="load an already running server instead of starting one")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10, help="measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=1, help="unmeasured seconds per scenario")
+    parser.add_argument("--port", type=int, default=5599)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="relative change counted as a regression")
+    parser.add_argument("--serve", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args.serve)
+
+    homes, users = SCALES[args.scale]
+    database = args.database or f"sqlite:///{os.path.join(tempfile.gettempdir(), f'dreamhome-load-{args.scale}.db')}"
+    os.environ["DATABASE_URI"] = database
+    import app as _  # noqa: F401 (registers every model before create_all)
+    from config import app, db
+    from models.home import Home
+
+    with app.app_context():
+        seeded = db.inspect(db.engine).has_table("homes") and db.session.query(Home.id).count() >= homes
+        if args.reseed or not seeded:
+            print(f"Seeding {homes:,} homes and {users:,} users into {database} ...")
+            started = time.perf_counter()
+            seed(homes, users)
+            print(f"Seeded in {time.perf_counter() - started:.1f}s.")
+
+    server = None
+    if args.url:
+        target = urlsplit(args.url)
+        host, port = target.hostname, target.port or 80
+    else:
+        host, port = "127.0.0.1", args.port
+        server = start_server(port)
+
+    results = {}
+    try:
+        for name in args.scenarios:
+            print(f"Running {name} ...", flush=True)
+            results[name] = run_scenario(name, host, port, homes, users, args.concurrency, args.duration, args.warmup)
+    finally:
+        if server:
+            stop_server(server)
+
+    print()
+    print_results(results)
+    report = {
+        "meta": {
+            "revision": _git_revision(),
+            "scale": args.scale,
+            "database": database.split("://")[0],
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "python": platform.python_version(),
+            "target": args.url or "werkzeug threaded",
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(results, json.load(f), args.threshold):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# Compares SerializerMixin.to_dict() + json with the compiled serializers on the hot payloads:
+#   python benchmarks/serializer_benchmark.py --users 50 --homes 200 --repeat 20
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URI", "sqlite://")
+os.environ.setdefault("SESSION_SECRET", "benchmark")
+
+from config import app, db
+from models.user import User
+from models.home import Home
+from models.review import Review
+from models.favoritesCollection import FavoriteCollection
+from models.homeFavorite import HomeFavorite
+from serializers import dumps, to_dict, to_dicts, warm_plans
+
+
+def seed(users, homes, collections, favorites, reviews):
+    random.seed(1)
+    people = []
+    for i in range(users):
+        user = User(username=f"user{i:04d}", email=f"user{i}@example.com")
+        user._password_hash = "x" * 60
+        people.append(user)
+    db.session.add_all(people)
+    db.session.commit()
+
+    listings = [
+        Home(
+            title=f"Listing number {i}",
+            description="A bright place with a view and plenty of room.",
+            home_type=random.choice(["house", "apartment", "condo", "cabin"]),
+            max_guests=random.randint(1, 8),
+            total_bedrooms=random.randint(1, 5),
+            total_bathrooms=random.randint(1, 3),
+            location=random.choice(["Chicago", "Miami", "Denver"]),
+            amenities="wifi, parking",
+            price_per_night=float(random.randint(50, 500)),
+            host_id=random.choice(people).id,
+        )
+        for i in range(homes)
+    ]
+    db.session.add_all(listings)
+    db.session.commit()
+
+    for user in people:
+        for c in range(collections):
+            collection = FavoriteCollection(name=f"List {c}", user_id=user.id)
+            db.session.add(collection)
+            db.session.flush()
+            for home in random.sample(listings, favorites):
+                db.session.add(HomeFavorite(favorite_collection_id=collection.id, home_id=home.id))
+        for home in random.sample(listings, reviews):
+            db.session.add(Review(rating=random.randint(1, 5), review="Lovely stay.", home_id=home.id, user_id=user.id))
+    db.session.commit()
+
+
+def timed(label, repeat, baseline, compiled):
+    for fn in (baseline, compiled):
+        fn()  # warm caches and lazy loads so only serialization is measured
+    results = []
+    for fn in (baseline, compiled):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        results.append((time.perf_counter() - start) / repeat)
+    before, after = results
+    print(f"{label:<32} to_dict {before * 1000:8.2f} ms   compiled {after * 1000:8.2f} ms   x{before / after:5.1f}")
+    return {"payload": label, "to_dict_ms": before * 1000, "compiled_ms": after * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--homes", type=int, default=200)
+    parser.add_argument("--collections", type=int, default=3)
+    parser.add_argument("--favorites", type=int, default=10)
+    parser.add_argument("--reviews", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        seed(args.users, args.homes, args.collections, args.favorites, args.reviews)
+        warm_plans(User, Home, Review, FavoriteCollection, HomeFavorite)
+        users = User.query.all()
+        homes = Home.query.all()
+
+        payloads = {
+            "users/<id>, /me": (lambda: [u.to_dict() for u in users], lambda: to_dicts(users)),
+            "users/<id>/favorites": (
+                lambda: [[c.to_dict() for c in u.favorite_collections] for u in users],
+                lambda: [to_dicts(u.favorite_collections) for u in users],
+            ),
+            "homes": (lambda: [h.to_dict() for h in homes], lambda: to_dicts(homes)),
+        }
+
+        for label, (baseline, compiled) in payloads.items():
+            if baseline() != compiled():
+                sys.exit(f"Output mismatch for {label}")
+        print(f"Outputs identical for {len(users)} users and {len(homes)} homes.\n")
+
+        results = []
+        for label, (baseline, compiled) in payloads.items():
+            results.append(timed(label, args.repeat, baseline, compiled))
+            results.append(
+                timed(
+                    f"{label} + encode",
+                    args.repeat,
+                    lambda: json.dumps(baseline()).encode("utf-8"),
+                    lambda: dumps(compiled()),
+                )
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import click
+
+from config import app, db
+from gazetteer import geocode
+from geo import encode_geohash
+from importer import CHUNK_SIZE, import_homes, read_csv, sync_homes, synthetic_rows
+from market import rebuild_market
+from models.home import Home
+from models.user import User
+from purge import purge_user
+from ratings import rebuild_rating_aggregates
+from recommendations import build_recommendations
+from similar_homes import build_similar_homes, np
+
+
+@app.cli.command("geocode-homes")
+def geocode_homes():
+    """Fill latitude, longitude and geohash for homes from the offline gazetteer."""
+    locations = [
+        location
+        for (location,) in db.session.query(Home.location).filter(Home.latitude.is_(None)).distinct()
+    ]
+    updated, unknown = 0, []
+    for location in locations:
+        if not (coordinates := geocode(location)):
+            unknown.append(location)
+            continue
+        latitude, longitude = coordinates
+        # One set-based UPDATE per location rather than a row-by-row ORM pass
+        updated += (
+            Home.query.filter(Home.location == location, Home.latitude.is_(None))
+            .update(
+                {
+                    "latitude": latitude,
+                    "longitude": longitude,
+                    "geohash": encode_geohash(latitude, longitude),
+                    # Bulk updates bypass version_id_col, so bump the row version explicitly
+                    "version": Home.version + 1,
+                },
+                synchronize_session=False,
+            )
+        )
+    db.session.commit()
+    click.echo(f"Geocoded {updated} homes.")
+    if unknown:
+        click.echo(f"No gazetteer entry for: {', '.join(sorted(filter(None, unknown)))}")
+
+
+@app.cli.command("backfill-ratings")
+def backfill_ratings():
+    """Recompute every home's rating count, average and star histogram from reviews."""
+    with db.engine.begin() as connection:
+        rated = rebuild_rating_aggregates(connection)
+    click.echo(f"Rebuilt rating aggregates ({rated} homes with reviews).")
+
+
+@app.cli.command("import-homes")
+@click.argument("path", default="homes.csv")
+@click.option("--synthetic", type=int, default=0, help="Import N generated homes instead of reading PATH.")
+@click.option("--chunk-size", type=int, default=CHUNK_SIZE, show_default=True, help="Rows per INSERT batch.")
+def import_homes_command(path, synthetic, chunk_size):
+    """Bulk-load homes from a homes.csv-style file."""
+    rows = synthetic_rows(synthetic) if synthetic else read_csv(path)
+    stats = import_homes(
+        rows,
+        chunk_size,
+        progress=lambda stats: click.echo(f"  {stats.inserted:,} homes ({stats.rows_per_second:,.0f} rows/s)"),
+    )
+    click.echo(
+        f"Imported {stats.inserted:,} homes in {stats.seconds:.1f}s ({stats.rows_per_second:,.0f} rows/s), "
+        f"skipped {stats.skipped:,}."
+    )
+    for error in stats.errors:
+        click.echo(f"  {error}")
+
+
+@app.cli.command("sync-homes")
+@click.argument("path", default="homes.csv")
+@click.option("--chunk-size", type=int, default=CHUNK_SIZE, show_default=True, help="Feed rows per transaction.")
+@click.option("--keep-missing", is_flag=True, help="Don't soft-delete homes that are absent from the feed.")
+def sync_homes_command(path, chunk_size, keep_missing):
+    """Apply a full listing feed incrementally: insert, update and soft-delete by property_id."""
+    stats = sync_homes(read_csv(path), chunk_size, delete_missing=not keep_missing)
+    click.echo(
+        f"Synced {stats.processed:,} feed rows in {stats.seconds:.1f}s ({stats.rows_per_second:,.0f} rows/s): "
+        f"{stats.inserted:,} inserted, {stats.updated:,} updated, {stats.deleted:,} deleted, "
+        f"{stats.unchanged:,} unchanged, {stats.skipped:,} skipped."
+    )
+    for error in stats.errors:
+        click.echo(f"  {error}")
+
+
+@app.cli.command("build-similar-homes")
+@click.option("--k", type=int, default=None, help="Neighbours per home (defaults to SIMILAR_HOMES_K).")
+def build_similar_homes_command(k):
+    """Rebuild the similar_homes lookup table from home feature vectors."""
+    if np is None:
+        raise click.ClickException("NumPy is required to build similar homes.")
+    homes = build_similar_homes(k, progress=lambda done, total: click.echo(f"  {done:,}/{total:,} homes"))
+    click.echo(f"Built similar homes for {homes:,} homes.")
+
+
+@app.cli.command("build-recommendations")
+@click.option("--per-user", type=int, default=None, help="Homes stored per user (defaults to RECOMMENDATIONS_PER_USER).")
+@click.option("--review-weight", type=float, default=None, help="Weight of a 5-star review relative to a favorite; 0 ignores reviews.")
+def build_recommendations_command(per_user, review_weight):
+    """Rebuild per-user recommendations from favorite (and review) co-occurrence."""
+    if np is None:
+        raise click.ClickException("NumPy is required to build recommendations.")
+    stats = build_recommendations(per_user, review_weight, progress=lambda message: click.echo(f"  {message}"))
+    click.echo(
+        f"Stored {stats['recommendations']:,} recommendations for {stats['users']:,} users from "
+        f"{stats['interactions']:,} interactions over {stats['homes']:,} homes in {stats['seconds']:.1f}s."
+    )
+
+
+@app.cli.command("rebuild-market-analytics")
+def rebuild_market_analytics():
+    """Recompute the per-location price and home mix summary from the live homes."""
+    stats = rebuild_market(progress=lambda message: click.echo(f"  {message}"))
+    click.echo(f"Rebuilt market analytics for {stats['homes']:,} homes ({stats['buckets']:,} buckets) in {stats['seconds']:.1f}s.")
+
+@app.cli.command("purge-deleted-users")
+@click.option("--batch-size", type=int, default=None, help="Rows per transaction (defaults to USER_PURGE_BATCH_SIZE).")
+def purge_deleted_users(batch_size):
+    """Finish purging users marked deleted whose background purge did not complete."""
+    user_ids = [user_id for (user_id,) in db.session.query(User.id).filter(User.deleted_at.isnot(None)).order_by(User.id)]
+    db.session.rollback()
+    for user_id in user_ids:
+        counts = purge_user(user_id, batch_size)
+        click.echo(f"  User {user_id}: " + ", ".join(f"{count:,} {name.replace('_', ' ')}" for name, count in counts.items()))
+    click.echo(f"Purged {len(user_ids):,} users.")
@@ -0,0 +1,83 @@
+import zlib
+
+from flask import current_app, request
+
+# brotli is optional; without it only gzip is offered
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = {"application/json", "text/html", "text/plain", "text/css", "application/javascript"}
+
+
+def choose_encoding(accept_encodings):
+    if brotli is not None and accept_encodings["br"]:
+        return "br"
+    if accept_encodings["gzip"]:
+        return "gzip"
+    return None
+
+
+def _compressor(encoding):
+    config = current_app.config
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=config["COMPRESS_BROTLI_QUALITY"])
+        return compressor.process, compressor.finish
+    # wbits 31: zlib's deflate with a gzip header and trailer
+    compressor = zlib.compressobj(config["COMPRESS_GZIP_LEVEL"], zlib.DEFLATED, 31)
+    return compressor.compress, compressor.flush
+
+
+def compress(data, encoding):
+    process, finish = _compressor(encoding)
+    return process(data) + finish()
+
+
+def _compress_stream(chunks, encoding):
+    # Not a generator itself, so the compressor is created while the app context is active
+    process, finish = _compressor(encoding)
+
+    def generate():
+        try:
+            for chunk in chunks:
+                if data := process(chunk):
+                    yield data
+            yield finish()
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+
+    return generate()
+
+
+def compress_response(response):
+    # after_request hook: buffered bodies are compressed once they reach COMPRESS_MIN_SIZE,
+    # streamed bodies are always compressed chunk by chunk
+    if (
+        response.status_code < 200
+        or response.status_code in (204, 304)
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    if not (encoding := choose_encoding(request.accept_encodings)):
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < current_app.config["COMPRESS_MIN_SIZE"]:
+            return response
+        response.set_data(compress(data, encoding))
+
+    response.headers["Content-Encoding"] = encoding
+    # The encoded bytes differ from the identity representation, so strong validators become weak
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
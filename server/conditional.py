@@ -0,0 +1,100 @@
+import hashlib
+from datetime import timezone
+
+from flask import current_app, request
+from sqlalchemy import literal, select, union_all
+
+from config import db
+from models.favoritesCollection import FavoriteCollection
+from models.home import Home
+from models.homeFavorite import HomeFavorite
+from models.review import Review
+from models.user import User
+
+# Columns that determine a serialized home: the row version covers ORM edits, the rating
+# aggregates cover the in-place updates made by the Review events (which leave the version alone)
+HOME_STATE = ("id", "version", "rating_count", "rating_sum", "rating_1", "rating_2", "rating_3", "rating_4", "rating_5")
+
+
+# Tokens
+def make_etag(*parts):
+    return hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=12).hexdigest()
+
+
+def homes_etag(ids, *parts):
+    # For a page of home ids, read from the state columns alone, so a 304 never loads full rows.
+    # Homes gone from the feed since the ids were found are left out, as hydration drops them.
+    homes = Home.__table__
+    states = {}
+    if ids:
+        rows = db.session.execute(
+            select(*[homes.c[key] for key in HOME_STATE]).where(homes.c.id.in_(ids), homes.c.deleted_at.is_(None))
+        )
+        states = {row[0]: tuple(row) for row in rows}
+    return make_etag("homes", *parts, [states[home_id] for home_id in ids if home_id in states])
+
+
+def _padded(kind, *columns, width):
+    # union_all needs branches of equal width; the padding keeps every row sortable
+    return select(literal(kind), *columns, *[literal(0)] * (width - len(columns)))
+
+
+def home_etag(home_id):
+    # (etag, last_modified) for one home, or None when it does not exist (or was removed from the feed)
+    homes = Home.__table__
+    last_modified = db.func.coalesce(homes.c.updated_at, homes.c.created_at)
+    row = db.session.execute(
+        select(*[homes.c[key] for key in HOME_STATE], last_modified).where(
+            homes.c.id == home_id, homes.c.deleted_at.is_(None)
+        )
+    ).first()
+    if row is None:
+        return None
+    return make_etag("home", *row[:-1]), row[-1]
+
+
+def user_etag(user_id, representation):
+    # One round trip over the rows behind the user and favorites payloads: the user, their
+    # collections and reviews (by version) and every favorited home (by state); None when
+    # the user does not exist or is being deleted
+    users, collections, reviews = User.__table__, FavoriteCollection.__table__, Review.__table__
+    favorites, homes = HomeFavorite.__table__, Home.__table__
+    width = len(HOME_STATE) + 1
+    rows = db.session.execute(
+        union_all(
+            _padded(0, users.c.id, users.c.version, width=width).where(users.c.id == user_id, users.c.deleted_at.is_(None)),
+            _padded(1, collections.c.id, collections.c.version, width=width).where(collections.c.user_id == user_id),
+            _padded(2, reviews.c.id, reviews.c.version, width=width).where(reviews.c.user_id == user_id),
+            _padded(3, favorites.c.favorite_collection_id, *[homes.c[key] for key in HOME_STATE], width=width)
+            .join_from(favorites, collections, favorites.c.favorite_collection_id == collections.c.id)
+            .join(homes, favorites.c.home_id == homes.c.id)
+            .where(collections.c.user_id == user_id),
+        )
+    ).all()
+    if not any(row[0] == 0 for row in rows):
+        return None
+    return make_etag(representation, user_id, sorted(tuple(row) for row in rows))
+
+
+# Responses
+def set_validators(response, etag, last_modified=None, private=False):
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    # Cacheable, but always revalidated with If-None-Match
+    response.headers["Cache-Control"] = "private, no-cache" if private else "no-cache"
+    return response
+
+
+def not_modified(etag, last_modified=None, private=False):
+    # A 304 response when the client's copy is current, otherwise None. If-None-Match wins
+    # over If-Modified-Since (RFC 9110 13.2.2)
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag)
+    elif last_modified is not None and request.if_modified_since:
+        fresh = last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= request.if_modified_since
+    else:
+        fresh = False
+    if fresh:
+        return set_validators(current_app.response_class(status=304), etag, last_modified, private)
+    return None
@@ -1,5 +1,6 @@
 # Standard library imports
 import os
+import sqlite3
 
 # Remote library imports
 from flask import Flask
@@ -8,8 +9,12 @@ from flask_migrate import Migrate
 from flask_restful import Api
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
-from flask_session import Session
+from session_store import CachedSession
 from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from routing import RoutingSession
+from green import monkey_patched, patch_psycopg
 
 # Load environment variables
 load_dotenv()
@@ -23,16 +28,106 @@ app = Flask(
 )
 
 # Database configuration
+def engine_options(uri):
+    options = {
+        "pool_pre_ping": os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true",
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+    }
+    url = make_url(uri)
+    # In-memory SQLite shares one static connection, which takes no queue settings
+    if not (url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")):
+        options["pool_size"] = int(os.environ.get("DB_POOL_SIZE", 5))
+        options["max_overflow"] = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+        options["pool_timeout"] = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+    return options
+
+
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URI")
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+if app.config["SQLALCHEMY_DATABASE_URI"]:
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
+
+# Read replica: GET requests read from it unless the client wrote within REPLICA_STICKY_SECONDS
+app.config["SQLALCHEMY_BINDS"] = {}
+if replica_uri := os.environ.get("DATABASE_REPLICA_URI"):
+    app.config["SQLALCHEMY_BINDS"]["replica"] = {"url": replica_uri, **engine_options(replica_uri)}
+app.config["REPLICA_STICKY_SECONDS"] = int(os.environ.get("REPLICA_STICKY_SECONDS", 5))
+app.config["FK_VALIDATION_MODE"] = os.environ.get("FK_VALIDATION_MODE", "immediate")
+
+# Search configuration
+app.config["HOME_FILTER_ENGINE"] = os.environ.get("HOME_FILTER_ENGINE", "false").lower() == "true"
+app.config["HOME_TEXT_INDEX"] = os.environ.get("HOME_TEXT_INDEX", "false").lower() == "true"
+
+# Similar homes (top-k neighbours per home, refreshed in the background as homes change)
+app.config["SIMILAR_HOMES_K"] = int(os.environ.get("SIMILAR_HOMES_K", 10))
+app.config["SIMILAR_HOMES_REFRESH"] = os.environ.get("SIMILAR_HOMES_REFRESH", "true").lower() == "true"
+app.config["SIMILAR_HOMES_REFRESH_DELAY"] = float(os.environ.get("SIMILAR_HOMES_REFRESH_DELAY", 1.0))
+
+# Recommendations (collaborative filtering over favorites, rebuilt by `flask build-recommendations`)
+app.config["RECOMMENDATIONS_PER_USER"] = int(os.environ.get("RECOMMENDATIONS_PER_USER", 20))
+app.config["RECOMMENDATION_REVIEW_WEIGHT"] = float(os.environ.get("RECOMMENDATION_REVIEW_WEIGHT", 0.5))
+
+# Background jobs and image uploads
+app.config["JOB_WORKERS"] = int(os.environ.get("JOB_WORKERS", 4))
+app.config["JOBS_EAGER"] = os.environ.get("JOBS_EAGER", "false").lower() == "true"
+app.config["USER_PURGE_BATCH_SIZE"] = int(os.environ.get("USER_PURGE_BATCH_SIZE", 1000))
+app.config["IMAGE_UPLOAD_BACKEND"] = os.environ.get("IMAGE_UPLOAD_BACKEND", "cloudinary")
+app.config["IMAGE_UPLOAD_DIR"] = os.environ.get("IMAGE_UPLOAD_DIR", os.path.join(app.instance_path, "uploads"))
+
+# Password hashing
+app.config["BCRYPT_LOG_ROUNDS"] = int(os.environ.get("BCRYPT_LOG_ROUNDS", 12))
+app.config["BCRYPT_POOL_WORKERS"] = int(os.environ.get("BCRYPT_POOL_WORKERS", max((os.cpu_count() or 2) // 2, 1)))
+app.config["BCRYPT_QUEUE_DEPTH"] = int(os.environ.get("BCRYPT_QUEUE_DEPTH", 0))
+app.config["BCRYPT_QUEUE_TIMEOUT"] = float(os.environ.get("BCRYPT_QUEUE_TIMEOUT", 2))
+
+# Response compression
+app.config["COMPRESS_MIN_SIZE"] = int(os.environ.get("COMPRESS_MIN_SIZE", 1024))
+app.config["COMPRESS_GZIP_LEVEL"] = int(os.environ.get("COMPRESS_GZIP_LEVEL", 6))
+app.config["COMPRESS_BROTLI_QUALITY"] = int(os.environ.get("COMPRESS_BROTLI_QUALITY", 5))
+
+# Instrumentation (served at /metrics)
+app.config["SLOW_QUERY_SECONDS"] = float(os.environ.get("SLOW_QUERY_SECONDS", 0.25))
+app.config["SLOW_REQUEST_SECONDS"] = float(os.environ.get("SLOW_REQUEST_SECONDS", 1.0))
+app.config["PROFILE_SAMPLE_RATE"] = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+app.config["PROFILE_DIR"] = os.environ.get("PROFILE_DIR", os.path.join(app.instance_path, "profiles"))
+# /metrics wants "Authorization: Bearer <METRICS_TOKEN>"; with no token set it is only served in
+# debug mode, or when METRICS_PUBLIC=true (a scraper on a private network, say)
+app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN")
+app.config["METRICS_PUBLIC"] = os.environ.get("METRICS_PUBLIC", "false").lower() == "true"
 
 # Session configuration
 app.secret_key = os.environ.get("SESSION_SECRET")
 app.config["SESSION_TYPE"] = "sqlalchemy"
 app.config["SESSION_SQLALCHEMY_TABLE"] = "sessions"
+app.config["SESSION_CACHE_SIZE"] = int(os.environ.get("SESSION_CACHE_SIZE", 10000))
+app.config["SESSION_CACHE_TTL"] = int(os.environ.get("SESSION_CACHE_TTL", 30))
+app.config["SESSION_WRITE_BACK_INTERVAL"] = int(os.environ.get("SESSION_WRITE_BACK_INTERVAL", 300))
+app.config["SESSION_PURGE_INTERVAL"] = int(os.environ.get("SESSION_PURGE_INTERVAL", 3600))
+# How often each worker checks for sessions destroyed or rewritten by other workers
+app.config["SESSION_INVALIDATION_POLL"] = float(os.environ.get("SESSION_INVALIDATION_POLL", 1))
+app.config["SESSION_INVALIDATION_TABLE"] = "session_invalidations"
+
+# Serving (serve.py); gunicorn.conf.py takes the equivalent GUNICORN_* settings
+app.config["GEVENT_MAX_CONNECTIONS"] = int(os.environ.get("GEVENT_MAX_CONNECTIONS", 1000))
 
 # SQLAlchemy setup
-db = SQLAlchemy(app)
+# Sessions are scoped to the app context, which lives in a context variable: under gevent every
+# greenlet (one per request) gets its own session, as every thread does under the threaded server
+if monkey_patched():
+    patch_psycopg()
+db = SQLAlchemy(app, session_options={"class_": RoutingSession})
+
+
+# SQLite only enforces foreign keys when asked to, which the ON DELETE CASCADE / SET NULL
+# constraints and FK_VALIDATION_MODE=database rely on
+@event.listens_for(Engine, "connect")
+def enable_sqlite_foreign_keys(dbapi_connection, _):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+
 app.config["SESSION_SQLALCHEMY"] = db
 migrate = Migrate(app, db)
 
@@ -40,10 +135,10 @@ migrate = Migrate(app, db)
 api = Api(app)
 
 # CORS setup
-CORS(app)
+CORS(app, expose_headers=["X-Next-Cursor", "X-Upload-Job", "Content-Encoding"])
 
 # Bcrypt setup
 flask_bcrypt = Bcrypt(app)
 
 # Session setup
-session = Session(app)
+session = CachedSession(app)
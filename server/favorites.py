@@ -0,0 +1,175 @@
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from config import db
+from models.favoritesCollection import FavoriteCollection
+from models.home import Home
+from models.homeFavorite import HomeFavorite
+
+OPERATIONS = ("add", "remove", "move", "replace")
+MAX_BATCH_HOMES = 1000
+
+
+# Parsing
+def _ids(value, name):
+    if not isinstance(value, list) or not all(isinstance(id, int) and not isinstance(id, bool) for id in value):
+        raise ValueError(f"{name} must be a list of integers.")
+    return list(dict.fromkeys(value))
+
+
+def parse_operations(data):
+    # {"operations": [{"op": "add", "collection_id": 1, "home_ids": [...]},
+    #                 {"op": "move", "from_collection_id": 1, "to_collection_id": 2, "home_ids": [...]}, ...]}
+    operations = (data or {}).get("operations")
+    if not isinstance(operations, list) or not operations:
+        raise ValueError("operations must be a non-empty list.")
+    parsed, total = [], 0
+    for operation in operations:
+        if not isinstance(operation, dict) or operation.get("op") not in OPERATIONS:
+            raise ValueError(f"Each operation needs an op: one of {', '.join(OPERATIONS)}.")
+        keys = ("from_collection_id", "to_collection_id") if operation["op"] == "move" else ("collection_id",)
+        for key in keys:
+            if not isinstance(operation.get(key), int):
+                raise ValueError(f"{operation['op']} needs an integer {key}.")
+        home_ids = _ids(operation.get("home_ids"), "home_ids")
+        total += len(home_ids)
+        parsed.append({"op": operation["op"], "home_ids": home_ids, **{key: operation[key] for key in keys}})
+    if total > MAX_BATCH_HOMES:
+        raise ValueError(f"A batch can touch at most {MAX_BATCH_HOMES} homes.")
+    return parsed
+
+
+# Statements
+def _insert_ignoring_duplicates(collection_id, home_ids):
+    # One multi-row INSERT ... ON CONFLICT DO NOTHING; returns the home ids actually inserted
+    if not home_ids:
+        return []
+    favorites = HomeFavorite.__table__
+    rows = [{"favorite_collection_id": collection_id, "home_id": home_id} for home_id in home_ids]
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        statement = (postgresql.insert if dialect == "postgresql" else sqlite.insert)(favorites).values(rows)
+        statement = statement.on_conflict_do_nothing().returning(favorites.c.home_id)
+        return db.session.execute(statement).scalars().all()
+    # Other databases: skip the rows already present, then a plain multi-row INSERT
+    present = set(
+        db.session.execute(
+            select(favorites.c.home_id).where(
+                favorites.c.favorite_collection_id == collection_id, favorites.c.home_id.in_(home_ids)
+            )
+        ).scalars()
+    )
+    rows = [row for row in rows if row["home_id"] not in present]
+    if rows:
+        db.session.execute(insert(favorites).values(rows))
+    return [row["home_id"] for row in rows]
+
+
+def _delete(collection_id, condition):
+    # DELETE ... RETURNING; returns the home ids actually removed
+    favorites = HomeFavorite.__table__
+    matching = (favorites.c.favorite_collection_id == collection_id, condition)
+    if db.session.get_bind().dialect.delete_returning:
+        statement = delete(favorites).where(*matching).returning(favorites.c.home_id)
+        return db.session.execute(statement).scalars().all()
+    # Other databases: read the matching rows, then delete exactly those
+    home_ids = db.session.execute(select(favorites.c.home_id).where(*matching)).scalars().all()
+    if home_ids:
+        db.session.execute(
+            delete(favorites).where(favorites.c.favorite_collection_id == collection_id, favorites.c.home_id.in_(home_ids))
+        )
+    return home_ids
+
+
+# Batches
+def apply_operations(user_id, operations):
+    # Applies the operations in order, in the caller's transaction, with set-based statements
+    # (validation is two queries for the whole batch instead of the per-row validators).
+    # Returns the net change per collection.
+    collection_ids = {
+        operation[key]
+        for operation in operations
+        for key in ("collection_id", "from_collection_id", "to_collection_id")
+        if key in operation
+    }
+    owned = set(
+        db.session.execute(
+            select(FavoriteCollection.id).where(
+                FavoriteCollection.user_id == user_id, FavoriteCollection.id.in_(collection_ids)
+            )
+        ).scalars()
+    )
+    if missing := sorted(collection_ids - owned):
+        raise LookupError(f"Favorite collections not found: {', '.join(map(str, missing))}.")
+
+    # Homes being added anywhere must exist and still be listed
+    adding = {home_id for operation in operations if operation["op"] != "remove" for home_id in operation["home_ids"]}
+    if adding:
+        listed = set(db.session.execute(select(Home.id).where(Home.id.in_(adding), Home.deleted_at.is_(None))).scalars())
+        if missing := sorted(adding - listed):
+            raise LookupError(f"Homes not found: {', '.join(map(str, missing))}.")
+
+    favorites = HomeFavorite.__table__
+    added = {collection_id: set() for collection_id in collection_ids}
+    removed = {collection_id: set() for collection_id in collection_ids}
+
+    def record(collection_id, inserted=(), deleted=()):
+        # Keeps the diff net: a home removed and re-added in one batch is no change at all
+        for home_id in inserted:
+            if home_id in removed[collection_id]:
+                removed[collection_id].discard(home_id)
+            else:
+                added[collection_id].add(home_id)
+        for home_id in deleted:
+            if home_id in added[collection_id]:
+                added[collection_id].discard(home_id)
+            else:
+                removed[collection_id].add(home_id)
+
+    for operation in operations:
+        home_ids = operation["home_ids"]
+        if operation["op"] == "add":
+            record(operation["collection_id"], inserted=_insert_ignoring_duplicates(operation["collection_id"], home_ids))
+        elif operation["op"] == "remove" and home_ids:
+            record(operation["collection_id"], deleted=_delete(operation["collection_id"], favorites.c.home_id.in_(home_ids)))
+        elif operation["op"] == "replace":
+            collection_id = operation["collection_id"]
+            record(collection_id, deleted=_delete(collection_id, favorites.c.home_id.not_in(home_ids)))
+            record(collection_id, inserted=_insert_ignoring_duplicates(collection_id, home_ids))
+        elif operation["op"] == "move" and home_ids:
+            source, target = operation["from_collection_id"], operation["to_collection_id"]
+            if source != target:
+                record(source, deleted=_delete(source, favorites.c.home_id.in_(home_ids)))
+                record(target, inserted=_insert_ignoring_duplicates(target, home_ids))
+
+    changed = sorted(collection_id for collection_id in collection_ids if added[collection_id] or removed[collection_id])
+    if changed:
+        # Bulk statements bypass version_id_col, so bump the collections' row versions explicitly
+        collections = FavoriteCollection.__table__
+        db.session.execute(
+            update(collections)
+            .where(collections.c.id.in_(changed))
+            .values(version=collections.c.version + 1, updated_at=func.now())
+        )
+    return {
+        "collections": [
+            {
+                "favorite_collection_id": collection_id,
+                "added": sorted(added[collection_id]),
+                "removed": sorted(removed[collection_id]),
+            }
+            for collection_id in changed
+        ],
+        "added": sum(len(added[collection_id]) for collection_id in changed),
+        "removed": sum(len(removed[collection_id]) for collection_id in changed),
+    }
+
+
+def default_collection(user_id, name="My Stack"):
+    # The user's first collection, created on demand
+    collection = FavoriteCollection.query.filter_by(user_id=user_id).order_by(FavoriteCollection.id).first()
+    if collection is None:
+        collection = FavoriteCollection(name=name, user_id=user_id)
+        db.session.add(collection)
+        db.session.flush()
+    return collection
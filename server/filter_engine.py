@@ -0,0 +1,228 @@
+import math
+import threading
+
+from flask import current_app
+
+from config import db
+from green import run_native
+from models.home import Home
+from model_events import on_commit
+from pagination import encode_cursor
+import geo
+
+# NumPy is optional: without it (or with HOME_FILTER_ENGINE off) /homes is served from SQL
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class HomeFilterEngine:
+    NUMERIC = {
+        "price_per_night": "price_per_night",
+        "bedrooms": "total_bedrooms",
+        "bathrooms": "total_bathrooms",
+        "max_guests": "max_guests",
+        "latitude": "latitude",
+        "longitude": "longitude",
+    }
+    CODED = ("home_type", "location")
+
+    def __init__(self, capacity=1024):
+        self.lock = threading.RLock()
+        self.loaded = False
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self.size = 0
+        self.rows = {}
+        self.codes = {name: {} for name in self.CODED}
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.numeric = {name: np.full(capacity, np.nan) for name in self.NUMERIC}
+        self.coded = {name: np.full(capacity, -1, dtype=np.int32) for name in self.CODED}
+
+    def _grow(self):
+        # Amortised doubling so inserts stay O(1)
+        old_ids, old_alive, old_numeric, old_coded = self.ids, self.alive, self.numeric, self.coded
+        self._allocate(len(old_ids) * 2)
+        self.ids[: self.size] = old_ids[: self.size]
+        self.alive[: self.size] = old_alive[: self.size]
+        for name in self.NUMERIC:
+            self.numeric[name][: self.size] = old_numeric[name][: self.size]
+        for name in self.CODED:
+            self.coded[name][: self.size] = old_coded[name][: self.size]
+
+    def _code(self, name, value):
+        codes = self.codes[name]
+        if value not in codes:
+            codes[value] = len(codes)
+        return codes[value]
+
+    # Maintenance
+    def load(self, session, batch_size=10000):
+        columns = [Home.id] + [getattr(Home, column) for column in self.NUMERIC.values()]
+        columns += [getattr(Home, name) for name in self.CODED]
+        keys = ["id"] + list(self.NUMERIC.values()) + list(self.CODED)
+        with self.lock:
+            for row in session.query(*columns).filter(Home.deleted_at.is_(None)).yield_per(batch_size):
+                self.upsert(row[0], dict(zip(keys, row)))
+            # Replay the commits that landed during the scan, in order: the scan may have read
+            # rows before or after each of them
+            with self._pending_lock:
+                for upserts, deleted in self._pending:
+                    self._apply(upserts, deleted)
+                self._pending = None
+                self.loaded = True
+
+    def upsert(self, home_id, values):
+        with self.lock:
+            row = self.rows.get(home_id)
+            if row is None:
+                if self.size == len(self.ids):
+                    self._grow()
+                row = self.rows[home_id] = self.size
+                self.size += 1
+                self.ids[row] = home_id
+            self.alive[row] = True
+            for name, column in self.NUMERIC.items():
+                value = values.get(column)
+                self.numeric[name][row] = np.nan if value is None else value
+            for name in self.CODED:
+                value = values.get(name)
+                self.coded[name][row] = -1 if value is None else self._code(name, value)
+
+    def remove(self, home_id):
+        with self.lock:
+            if (row := self.rows.pop(home_id, None)) is not None:
+                self.alive[row] = False
+
+    def _apply(self, upserts, deleted):
+        for home_id, values in upserts.items():
+            self.upsert(home_id, values)
+        for home_id in deleted:
+            self.remove(home_id)
+
+    def apply_changes(self, upserts, deleted):
+        with self._pending_lock:
+            if not self.loaded:
+                self._pending.append((upserts, deleted))
+                return
+        with self.lock:
+            self._apply(upserts, deleted)
+
+    # Queries
+    def _mask(self, filters):
+        n = self.size
+        mask = self.alive[:n].copy()
+        for name in self.CODED:
+            if name in filters:
+                code = self.codes[name].get(filters[name])
+                if code is None:
+                    return np.zeros(n, dtype=bool)
+                mask &= self.coded[name][:n] == code
+        bounds = (
+            ("min_price", "price_per_night", np.greater_equal),
+            ("max_price", "price_per_night", np.less_equal),
+            ("min_bedrooms", "bedrooms", np.greater_equal),
+            ("max_bedrooms", "bedrooms", np.less_equal),
+            ("min_bathrooms", "bathrooms", np.greater_equal),
+            ("min_guests", "max_guests", np.greater_equal),
+        )
+        for key, name, compare in bounds:
+            if key in filters:
+                # NaN (NULL) never satisfies a comparison, matching SQL semantics
+                mask &= compare(self.numeric[name][:n], filters[key])
+        latitude, longitude = self.numeric["latitude"][:n], self.numeric["longitude"][:n]
+        if "bbox" in filters:
+            south, west, north, east = filters["bbox"]
+            mask &= (latitude >= south) & (latitude <= north) & (longitude >= west) & (longitude <= east)
+        if "near" in filters:
+            # Same equirectangular approximation as geo.within_radius
+            center_lat, center_lon, radius_km = filters["near"]
+            d_lat = latitude - center_lat
+            d_lon = (longitude - center_lon) * math.cos(math.radians(center_lat))
+            mask &= d_lat * d_lat + d_lon * d_lon <= (radius_km / geo.KM_PER_DEGREE) ** 2
+        return mask
+
+    def search(self, filters, sort="id", cursor=None, limit=24):
+        with self.lock:
+            n = self.size
+            mask = self._mask(filters)
+            ids = self.ids[:n]
+            if sort == "id":
+                keys = ids.astype(np.float64)
+            else:
+                price = self.numeric["price_per_night"][:n]
+                mask &= ~np.isnan(price)
+                keys = price if sort == "price_asc" else -price
+            if cursor:
+                try:
+                    if sort == "id":
+                        (last_id,) = cursor
+                        mask &= ids > int(last_id)
+                    else:
+                        last_price, last_id = cursor
+                        last_key = float(last_price) if sort == "price_asc" else -float(last_price)
+                        mask &= (keys > last_key) | ((keys == last_key) & (ids > int(last_id)))
+                except (TypeError, ValueError):
+                    raise ValueError("Invalid cursor.")
+
+            rows = np.flatnonzero(mask)
+            if len(rows) > limit + 1:
+                # Only the rows tied with or ahead of the (limit + 1)th key need a full sort
+                kth = np.partition(keys[rows], limit)[limit]
+                rows = rows[keys[rows] <= kth]
+            rows = rows[np.lexsort((ids[rows], keys[rows]))][: limit + 1]
+
+            page = [int(home_id) for home_id in ids[rows[:limit]]]
+            next_cursor = None
+            if len(rows) > limit:
+                last = rows[limit - 1]
+                if sort == "id":
+                    next_cursor = encode_cursor(int(ids[last]))
+                else:
+                    next_cursor = encode_cursor(float(self.numeric["price_per_night"][last]), int(ids[last]))
+            return page, next_cursor
+
+
+def _load(app, engine):
+    # Runs on a native thread under gevent (see green.run_native), so it needs its own app context
+    with app.app_context():
+        engine.load(db.session)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    global _engine
+    if np is None or not current_app.config.get("HOME_FILTER_ENGINE"):
+        return None
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = HomeFilterEngine()
+                on_commit(Home, engine.apply_changes)
+                run_native(_load, current_app._get_current_object(), engine)
+                _engine = engine
+    return _engine
+
+
+def hydrate_homes(ids):
+    if not ids:
+        return []
+    # The in-process indexes only hear about commits made in this process, so a home soft-deleted
+    # elsewhere (a CLI feed sync, another worker) can still be in them: drop it here. The page
+    # comes back short, but the cursor still points past it.
+    homes = {home.id: home for home in Home.query.filter(Home.id.in_(ids), Home.deleted_at.is_(None))}
+    return [homes[home_id] for home_id in ids if home_id in homes]
+
+
+def iter_homes(ids, chunk_size=500):
+    # Lazily hydrates a long id list, one IN query per chunk
+    for start in range(0, len(ids), chunk_size):
+        yield from hydrate_homes(ids[start : start + chunk_size])
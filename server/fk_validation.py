@@ -0,0 +1,70 @@
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from config import db
+
+# FK_VALIDATION_MODE
+#   immediate - look the id up on assignment (cached for the rest of the transaction)
+#   deferred  - collect ids and check them per model with one IN query at flush
+#   database  - rely on the database's foreign key constraints
+MODES = ("immediate", "deferred", "database")
+CHUNK_SIZE = 500
+
+
+def _mode():
+    if not has_app_context():
+        return "immediate"
+    return current_app.config.get("FK_VALIDATION_MODE", "immediate")
+
+
+def _known_ids(session, model):
+    return session.info.setdefault("fk_known_ids", {}).setdefault(model, set())
+
+
+def require_existing(model, id, message):
+    known = _known_ids(db.session, model)
+    if id in known:
+        return
+    mode = _mode()
+    if mode == "immediate":
+        if not db.session.get(model, id):
+            raise ValueError(message)
+        known.add(id)
+    elif mode == "deferred":
+        db.session.info.setdefault("fk_pending", {}).setdefault(model, {}).setdefault(id, message)
+
+
+# Deferred Checks
+@event.listens_for(Session, "before_flush")
+def _check_pending_ids(session, flush_context, instances):
+    pending = session.info.pop("fk_pending", None)
+    for model, messages in (pending or {}).items():
+        known = _known_ids(session, model)
+        missing = [id for id in messages if id not in known]
+        with session.no_autoflush:
+            for start in range(0, len(missing), CHUNK_SIZE):
+                chunk = missing[start : start + CHUNK_SIZE]
+                known.update(id for (id,) in session.query(model.id).filter(model.id.in_(chunk)))
+        for id in missing:
+            if id not in known:
+                raise ValueError(messages[id])
+
+
+@event.listens_for(Session, "after_flush")
+def _forget_deleted_ids(session, flush_context):
+    # A parent deleted earlier in the transaction is no longer a valid target
+    known = session.info.get("fk_known_ids")
+    if not known:
+        return
+    for obj in session.deleted:
+        if (ids := known.get(type(obj))) is not None:
+            ids.discard(obj.id)
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _forget_ids(session):
+    # Known ids are only trusted for the unit of work that saw them
+    session.info.pop("fk_known_ids", None)
+    session.info.pop("fk_pending", None)
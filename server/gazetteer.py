@@ -0,0 +1,53 @@
+# Offline gazetteer: city-level coordinates for the locations in homes.csv and other major US markets
+CITIES = {
+    "albuquerque": (35.0844, -106.6504),
+    "atlanta": (33.7490, -84.3880),
+    "austin": (30.2672, -97.7431),
+    "baltimore": (39.2904, -76.6122),
+    "boston": (42.3601, -71.0589),
+    "charleston": (32.7765, -79.9311),
+    "charlotte": (35.2271, -80.8431),
+    "chicago": (41.8781, -87.6298),
+    "cleveland": (41.4993, -81.6944),
+    "columbus": (39.9612, -82.9988),
+    "dallas": (32.7767, -96.7970),
+    "denver": (39.7392, -104.9903),
+    "detroit": (42.3314, -83.0458),
+    "honolulu": (21.3069, -157.8583),
+    "houston": (29.7604, -95.3698),
+    "indianapolis": (39.7684, -86.1581),
+    "jacksonville": (30.3322, -81.6557),
+    "kansas city": (39.0997, -94.5786),
+    "las vegas": (36.1699, -115.1398),
+    "los angeles": (34.0522, -118.2437),
+    "miami": (25.7617, -80.1918),
+    "milwaukee": (43.0389, -87.9065),
+    "minneapolis": (44.9778, -93.2650),
+    "nashville": (36.1627, -86.7816),
+    "new orleans": (29.9511, -90.0715),
+    "new york": (40.7128, -74.0060),
+    "oklahoma city": (35.4676, -97.5164),
+    "orlando": (28.5383, -81.3792),
+    "philadelphia": (39.9526, -75.1652),
+    "phoenix": (33.4484, -112.0740),
+    "pittsburgh": (40.4406, -79.9959),
+    "portland": (45.5152, -122.6784),
+    "raleigh": (35.7796, -78.6382),
+    "sacramento": (38.5816, -121.4944),
+    "salt lake city": (40.7608, -111.8910),
+    "san antonio": (29.4241, -98.4936),
+    "san diego": (32.7157, -117.1611),
+    "san francisco": (37.7749, -122.4194),
+    "san jose": (37.3382, -121.8863),
+    "seattle": (47.6062, -122.3321),
+    "st. louis": (38.6270, -90.1994),
+    "tampa": (27.9506, -82.4572),
+    "tucson": (32.2226, -110.9747),
+    "washington": (38.9072, -77.0369),
+}
+
+
+def geocode(location):
+    if not location:
+        return None
+    return CITIES.get(location.strip().lower())
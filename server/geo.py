@@ -0,0 +1,116 @@
+import math
+
+from sqlalchemy import and_, or_
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9
+MAX_COVER_CELLS = 16
+KM_PER_DEGREE = 111.32
+
+
+# Geohash
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        bounds, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (bounds[0] + bounds[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def cell_size(precision):
+    lat_bits = 5 * precision // 2
+    lon_bits = 5 * precision - lat_bits
+    return 180.0 / 2**lat_bits, 360.0 / 2**lon_bits
+
+
+def cover_bbox(south, west, north, east):
+    # Smallest set of geohash prefixes (at one precision) that covers the box
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_step, lon_step = cell_size(precision)
+        rows = math.floor(north / lat_step) - math.floor(south / lat_step) + 1
+        columns = math.floor(east / lon_step) - math.floor(west / lon_step) + 1
+        if rows * columns <= MAX_COVER_CELLS:
+            break
+    prefixes = set()
+    lat = math.floor(south / lat_step) * lat_step
+    while lat <= north:
+        lon = math.floor(west / lon_step) * lon_step
+        while lon <= east:
+            center_lat = min(max(lat + lat_step / 2, -90.0), 90.0)
+            center_lon = min(max(lon + lon_step / 2, -180.0), 180.0)
+            prefixes.add(encode_geohash(center_lat, center_lon, precision))
+            lon += lon_step
+        lat += lat_step
+    return sorted(prefixes)
+
+
+# Distances
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi, d_lambda = phi2 - phi1, math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(a))
+
+
+def radius_bbox(latitude, longitude, radius_km):
+    d_lat = radius_km / KM_PER_DEGREE
+    d_lon = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+    return (
+        max(latitude - d_lat, -90.0),
+        max(longitude - d_lon, -180.0),
+        min(latitude + d_lat, 90.0),
+        min(longitude + d_lon, 180.0),
+    )
+
+
+# Parsing
+def parse_near(near, radius_km):
+    try:
+        latitude, longitude = (float(part) for part in near.split(","))
+        radius_km = float(radius_km)
+    except (TypeError, ValueError):
+        raise ValueError("near must be 'lat,lon' and radius_km a number.")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180) or radius_km <= 0:
+        raise ValueError("near must be a valid coordinate and radius_km positive.")
+    return latitude, longitude, radius_km
+
+
+def parse_bbox(bbox):
+    # Map viewport order: west,south,east,north
+    try:
+        west, south, east, north = (float(part) for part in bbox.split(","))
+    except (TypeError, ValueError):
+        raise ValueError("bbox must be 'west,south,east,north'.")
+    if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+        raise ValueError("bbox must be a valid west,south,east,north box.")
+    return south, west, north, east
+
+
+# SQL
+def within_bbox(model, south, west, north, east):
+    # Geohash prefix ranges hit the geohash index; the lat/lon bounds then trim the cell edges
+    prefixes = or_(*(and_(model.geohash >= prefix, model.geohash < prefix + "{") for prefix in cover_bbox(south, west, north, east)))
+    return and_(prefixes, model.latitude.between(south, north), model.longitude.between(west, east))
+
+
+def within_radius(model, latitude, longitude, radius_km):
+    # Equirectangular distance keeps the predicate plain arithmetic so every backend can evaluate it
+    scale = math.cos(math.radians(latitude))
+    d_lat = model.latitude - latitude
+    d_lon = (model.longitude - longitude) * scale
+    return and_(
+        within_bbox(model, *radius_bbox(latitude, longitude, radius_km)),
+        d_lat * d_lat + d_lon * d_lon <= (radius_km / KM_PER_DEGREE) ** 2,
+    )
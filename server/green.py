@@ -0,0 +1,59 @@
+# Cooperative I/O for the gevent serving mode (serve.py, or gunicorn's gevent worker): once the
+# standard library is monkey-patched, sockets, sleeps, locks and threads yield to other
+# greenlets; C database drivers need a hook of their own.
+
+
+def monkey_patched():
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("socket")
+
+
+def patch_psycopg():
+    # psycopg2 waits for Postgres inside C by default, stalling every greenlet in the process;
+    # with a wait callback it polls the connection and parks only the calling greenlet
+    try:
+        import psycopg2
+        from psycopg2 import extensions
+    except ImportError:
+        return
+    from gevent.socket import wait_read, wait_write
+
+    def wait(connection, timeout=None):
+        while True:
+            state = connection.poll()
+            if state == extensions.POLL_OK:
+                return
+            elif state == extensions.POLL_READ:
+                wait_read(connection.fileno(), timeout=timeout)
+            elif state == extensions.POLL_WRITE:
+                wait_write(connection.fileno(), timeout=timeout)
+            else:
+                raise psycopg2.OperationalError(f"Bad result from poll: {state!r}")
+
+    extensions.set_wait_callback(wait)
+
+
+def run_native(func, *args):
+    # CPU-bound work (index loads, similar-homes refreshes) never yields, so under gevent it would
+    # stall every connection in the process: run it on the hub's pool of real OS threads and park
+    # only the calling greenlet. Without gevent this is a plain call.
+    if not monkey_patched():
+        return func(*args)
+    import gevent
+
+    return gevent.get_hub().threadpool.apply(func, args)
+
+
+def thread_pool_executor(**kwargs):
+    # A concurrent.futures executor whose workers are real OS threads even when threading is patched
+    if monkey_patched():
+        from gevent.threadpool import ThreadPoolExecutor
+
+        kwargs.pop("thread_name_prefix", None)
+        return ThreadPoolExecutor(**kwargs)
+    from concurrent.futures import ThreadPoolExecutor
+
+    return ThreadPoolExecutor(**kwargs)
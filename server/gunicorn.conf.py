@@ -0,0 +1,15 @@
+# gunicorn -c gunicorn.conf.py (from server/): gevent workers, each serving up to
+# worker_connections requests concurrently. GUNICORN_WORKER_CLASS=gthread (or sync) falls back
+# to threads; the app must not be preloaded, so that the worker patches before app.py is imported.
+import multiprocessing
+import os
+
+wsgi_app = "app:app"
+bind = os.environ.get("GUNICORN_BIND", f"0.0.0.0:{os.environ.get('PORT', 5555)}")
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gevent")
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+worker_connections = int(os.environ.get("GEVENT_MAX_CONNECTIONS", 1000))
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+preload_app = False
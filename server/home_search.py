@@ -0,0 +1,225 @@
+import re
+
+from sqlalchemy import and_, or_
+
+from models.home import Home
+from pagination import encode_cursor, decode_cursor
+from config import db
+import filter_engine
+import geo
+import text_index
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+STREAM_MAX_PAGE_SIZE = 10000
+SORTS = ("id", "price_asc", "price_desc")
+
+
+# Filter Parsing
+def parse_price_range(price_range):
+    # Accepts the Browse.js labels ("$100,000 - $200,000") as well as "100-200" and "400+"
+    numbers = [float(n.replace(",", "")) for n in re.findall(r"\d[\d,]*(?:\.\d+)?", price_range)]
+    if len(numbers) == 2:
+        return min(numbers), max(numbers)
+    elif len(numbers) == 1 and "+" in price_range:
+        return numbers[0], None
+    raise ValueError("Invalid price range.")
+
+
+def parse_bedrooms(bedrooms):
+    # Accepts the Browse.js labels ("2 Bedrooms", "4+ Bedrooms") as well as bare numbers
+    match = re.match(r"\s*(\d+)\s*(\+)?", bedrooms)
+    if not match:
+        raise ValueError("Invalid bedrooms filter.")
+    count = int(match.group(1))
+    return count, None if match.group(2) else count
+
+
+def _number(value, name, cast=float):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number.")
+
+
+def parse_home_filters(args):
+    filters = {}
+    if (q := args.get("q", "").strip()):
+        filters["q"] = q
+    if location := args.get("location"):
+        filters["location"] = location
+    if home_type := args.get("home_type"):
+        filters["home_type"] = home_type.lower()
+    if price_range := args.get("price_range"):
+        filters["min_price"], filters["max_price"] = parse_price_range(price_range)
+    for key in ("min_price", "max_price"):
+        if args.get(key):
+            filters[key] = _number(args[key], key)
+    if bedrooms := args.get("bedrooms"):
+        filters["min_bedrooms"], filters["max_bedrooms"] = parse_bedrooms(bedrooms)
+    if args.get("min_bathrooms"):
+        filters["min_bathrooms"] = _number(args["min_bathrooms"], "min_bathrooms", int)
+    if args.get("guests"):
+        filters["min_guests"] = _number(args["guests"], "guests", int)
+    if near := args.get("near"):
+        filters["near"] = geo.parse_near(near, args.get("radius_km", 10))
+    if bbox := args.get("bbox"):
+        filters["bbox"] = geo.parse_bbox(bbox)
+    return {key: value for key, value in filters.items() if value is not None}
+
+
+def parse_page(args, max_limit=MAX_PAGE_SIZE):
+    sort = args.get("sort", "id")
+    if sort not in SORTS:
+        raise ValueError(f"Sort must be one of: {', '.join(SORTS)}.")
+    limit = _number(args.get("limit", DEFAULT_PAGE_SIZE), "limit", int)
+    if not 1 <= limit <= max_limit:
+        raise ValueError(f"Limit must be between 1 and {max_limit}.")
+    cursor = decode_cursor(args.get("cursor"))
+    return sort, cursor, limit
+
+
+# SQL Search
+def filter_homes(query, filters):
+    query = query.filter(Home.deleted_at.is_(None))
+    if "location" in filters:
+        query = query.filter(Home.location == filters["location"])
+    if "home_type" in filters:
+        query = query.filter(Home.home_type == filters["home_type"])
+    if "min_price" in filters:
+        query = query.filter(Home.price_per_night >= filters["min_price"])
+    if "max_price" in filters:
+        query = query.filter(Home.price_per_night <= filters["max_price"])
+    if "min_bedrooms" in filters:
+        query = query.filter(Home.total_bedrooms >= filters["min_bedrooms"])
+    if "max_bedrooms" in filters:
+        query = query.filter(Home.total_bedrooms <= filters["max_bedrooms"])
+    if "min_bathrooms" in filters:
+        query = query.filter(Home.total_bathrooms >= filters["min_bathrooms"])
+    if "min_guests" in filters:
+        query = query.filter(Home.max_guests >= filters["min_guests"])
+    if "near" in filters:
+        query = query.filter(geo.within_radius(Home, *filters["near"]))
+    if "bbox" in filters:
+        query = query.filter(geo.within_bbox(Home, *filters["bbox"]))
+    return query
+
+
+def _after_cursor(sort, cursor):
+    # Keyset predicates: each page starts strictly after the last row of the previous one
+    if sort == "id":
+        (last_id,) = cursor
+        return Home.id > last_id
+    last_price, last_id = cursor
+    if sort == "price_asc":
+        return or_(
+            Home.price_per_night > last_price,
+            and_(Home.price_per_night == last_price, Home.id > last_id),
+        )
+    return or_(
+        Home.price_per_night < last_price,
+        and_(Home.price_per_night == last_price, Home.id > last_id),
+    )
+
+
+def _cursor_for(sort, home):
+    if sort == "id":
+        return encode_cursor(home.id)
+    return encode_cursor(home.price_per_night, home.id)
+
+
+def _matching_ids(ids, filters):
+    if not any(key != "q" for key in filters):
+        return set(ids)
+    query = filter_homes(db.session.query(Home.id).filter(Home.id.in_(ids)), filters)
+    return {home_id for (home_id,) in query}
+
+
+def _search_text_sql(filters, cursor, limit):
+    # Without the text index (HOME_TEXT_INDEX off) keyword search is the LIKE scan it replaces:
+    # every term has to appear in the title, description or amenities, in id order
+    terms = text_index.tokenize(filters["q"])
+    if not terms:
+        return [], None
+    columns = (Home.title, Home.description, Home.amenities)
+    matches = and_(*(or_(*(column.ilike(f"%{term}%") for column in columns)) for term in terms))
+    rows = _ordered(db.session.query(Home.id), filters, "id", cursor).filter(matches).limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1].id) if len(rows) > limit else None
+    return [row.id for row in rows[:limit]], next_cursor
+
+
+def search_text_ids(filters, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    # Relevance-ordered results; the cursor is the (score, id) of the last row served plus the
+    # statistics the first page was scored with. Ranked candidates are pulled in chunks and
+    # checked against the other filters in one query each.
+    index = text_index.get_index()
+    if index is None:
+        return _search_text_sql(filters, cursor, limit)
+    try:
+        if cursor:
+            score, last_id, average_length, idfs = cursor
+            after, statistics = (float(score), int(last_id)), (float(average_length), [float(idf) for idf in idfs])
+        else:
+            after, statistics = None, index.statistics(filters["q"])
+    except (TypeError, ValueError):
+        raise ValueError("Invalid cursor.")
+
+    page, chunk = [], max(limit * 4, 100)
+    while len(page) <= limit:
+        ranked = index.search(filters["q"], chunk, after, statistics)
+        if not ranked:
+            break
+        allowed = _matching_ids([home_id for _, home_id in ranked], filters)
+        page += [(score, home_id) for score, home_id in ranked if home_id in allowed]
+        after = ranked[-1]
+        if len(ranked) < chunk:
+            break
+
+    next_cursor = encode_cursor(*page[limit - 1], *statistics) if len(page) > limit else None
+    return [home_id for _, home_id in page[:limit]], next_cursor
+
+
+def search_text(filters, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    ids, next_cursor = search_text_ids(filters, cursor, limit)
+    return filter_engine.hydrate_homes(ids), next_cursor
+
+
+def _ordered(query, filters, sort, cursor):
+    query = filter_homes(query, filters)
+    if sort == "id":
+        query = query.order_by(Home.id)
+    else:
+        query = query.filter(Home.price_per_night.isnot(None))
+        price = Home.price_per_night.asc() if sort == "price_asc" else Home.price_per_night.desc()
+        query = query.order_by(price, Home.id)
+    if cursor:
+        try:
+            query = query.filter(_after_cursor(sort, cursor))
+        except ValueError:
+            raise ValueError("Invalid cursor.")
+    return query
+
+
+def search_homes(filters, sort="id", cursor=None, limit=DEFAULT_PAGE_SIZE):
+    if "q" in filters:
+        return search_text(filters, cursor, limit)
+    if engine := filter_engine.get_engine():
+        ids, next_cursor = engine.search(filters, sort, cursor, limit)
+        return filter_engine.hydrate_homes(ids), next_cursor
+
+    homes = _ordered(Home.query, filters, sort, cursor).limit(limit + 1).all()
+    next_cursor = _cursor_for(sort, homes[limit - 1]) if len(homes) > limit else None
+    return homes[:limit], next_cursor
+
+
+def search_home_ids(filters, sort="id", cursor=None, limit=DEFAULT_PAGE_SIZE):
+    # Same pages as search_homes, as ids only: the SQL path reads just the keyset columns,
+    # so large (streamed) pages are hydrated in chunks instead of held in memory
+    if "q" in filters:
+        return search_text_ids(filters, cursor, limit)
+    if engine := filter_engine.get_engine():
+        return engine.search(filters, sort, cursor, limit)
+
+    rows = _ordered(db.session.query(Home.id, Home.price_per_night), filters, sort, cursor).limit(limit + 1).all()
+    next_cursor = _cursor_for(sort, rows[limit - 1]) if len(rows) > limit else None
+    return [row.id for row in rows[:limit]], next_cursor
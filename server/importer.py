@@ -0,0 +1,312 @@
+import csv
+import hashlib
+import random
+import time
+from itertools import islice
+
+from sqlalchemy import bindparam, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from config import db
+from gazetteer import CITIES, geocode
+from geo import encode_geohash
+from model_events import notify_changes
+from models.home import Home
+
+CHUNK_SIZE = 5000
+
+# homes.csv carries sale prices, Home.price_per_night a nightly rate: a listing is priced at this
+# fraction of its sale price per night (a $500,000 home at $250). Bump FEED_MAPPING_VERSION when a
+# mapping like this changes, so the next sync rewrites every row instead of skipping it as unchanged.
+NIGHTLY_RATE_PER_SALE_PRICE = 0.0005
+FEED_MAPPING_VERSION = "2"
+
+# The homes.csv columns; a row's content hash covers all of them
+FEED_COLUMNS = (
+    "property_id",
+    "property_type",
+    "location",
+    "price",
+    "square_footage",
+    "bedrooms",
+    "bathrooms",
+    "description",
+    "link",
+)
+
+# homes.csv property types -> Home.home_type
+HOME_TYPES = {
+    "house": "house",
+    "single family home": "house",
+    "craftsman house": "house",
+    "tudor style home": "house",
+    "farmhouse": "house",
+    "ranch": "house",
+    "mansion": "house",
+    "villa": "house",
+    "townhouse": "house",
+    "modern townhome": "house",
+    "apartment": "apartment",
+    "studio": "apartment",
+    "loft": "apartment",
+    "duplex": "apartment",
+    "triplex": "apartment",
+    "condo": "condo",
+    "penthouse": "condo",
+    "cabin": "cabin",
+    "cottage": "cabin",
+    "bungalow": "cabin",
+    "riverfront retreat": "cabin",
+}
+
+# Columns checked with the model's own validators (bulk inserts skip the ORM, and with it @validates)
+VALIDATED = ("title", "description", "home_type", "max_guests", "price_per_night")
+
+# Columns a feed update may rewrite (host assignments are left alone)
+SYNCED = (
+    "title",
+    "description",
+    "home_type",
+    "max_guests",
+    "total_bedrooms",
+    "total_bathrooms",
+    "location",
+    "price_per_night",
+    "latitude",
+    "longitude",
+    "geohash",
+    "content_hash",
+)
+
+
+class ImportStats:
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.deleted = 0
+        self.skipped = 0
+        self.errors = []
+        self.started = time.perf_counter()
+
+    @property
+    def processed(self):
+        return self.inserted + self.updated + self.unchanged + self.skipped
+
+    @property
+    def seconds(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.processed / self.seconds if self.seconds else 0.0
+
+    def skip(self, line, error):
+        self.skipped += 1
+        if len(self.errors) < 20:
+            self.errors.append(f"row {line}: {error}")
+
+
+# Row Conversion
+_coordinates = {}
+
+
+def _locate(location):
+    # (latitude, longitude, geohash), computed once per distinct location
+    if location not in _coordinates:
+        coordinates = geocode(location)
+        _coordinates[location] = (*coordinates, encode_geohash(*coordinates)) if coordinates else (None, None, None)
+    return _coordinates[location]
+
+
+def content_hash(row):
+    raw = "\x1f".join([FEED_MAPPING_VERSION, *((row.get(column) or "").strip() for column in FEED_COLUMNS)])
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def nightly_rate(sale_price):
+    return round(float(sale_price) * NIGHTLY_RATE_PER_SALE_PRICE, 2)
+
+
+def home_values(row, host_ids=None):
+    # One homes.csv row -> insert parameters for the homes table; raises ValueError for bad rows.
+    # Does what the ORM would otherwise do on insert: validation and the set_coordinates listener.
+    home_type = HOME_TYPES.get(row["property_type"].strip().lower())
+    if home_type is None:
+        raise ValueError(f"Unknown property type {row['property_type']!r}.")
+    location = row["location"].strip()
+    bedrooms = int(row["bedrooms"])
+    values = {
+        "title": f"{row['property_type'].strip().title()} in {location}"[:50],
+        "description": row["description"].strip(),
+        "home_type": home_type,
+        "max_guests": max(bedrooms * 2, 1),
+        "total_bedrooms": bedrooms,
+        "total_bathrooms": int(float(row["bathrooms"])),
+        "location": location,
+        "price_per_night": nightly_rate(row["price"]),
+        "host_id": random.choice(host_ids) if host_ids else None,
+        "property_id": (row.get("property_id") or "").strip() or None,
+        "content_hash": content_hash(row),
+    }
+    for key in VALIDATED:
+        values[key] = getattr(Home, f"validate_{key}")(None, key, values[key])
+    values["latitude"], values["longitude"], values["geohash"] = _locate(location)
+    return values
+
+
+# Sources
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8") as csvfile:
+        yield from csv.DictReader(csvfile)
+
+
+def synthetic_rows(count, seed=0):
+    # Rows in the homes.csv schema with locations from the gazetteer, so every home is geocoded
+    rng = random.Random(seed)
+    cities = [city.title() for city in CITIES]
+    types = [home_type.title() for home_type in HOME_TYPES]
+    for n in range(1, count + 1):
+        bedrooms = rng.randint(1, 6)
+        yield {
+            # Own namespace, so generated homes never collide with a real feed's ids
+            "property_id": f"synthetic-{n}",
+            "property_type": rng.choice(types),
+            "location": rng.choice(cities),
+            # Sale prices that map to nightly rates of $50-$1,500
+            "price": str(round(rng.randrange(50, 1500) / NIGHTLY_RATE_PER_SALE_PRICE)),
+            "square_footage": str(bedrooms * rng.randint(350, 700)),
+            "bedrooms": str(bedrooms),
+            "bathrooms": str(rng.randint(1, bedrooms)),
+            "description": f"Synthetic listing {n} with {bedrooms} bedrooms and plenty of natural light.",
+            "link": f"https://example.com/property/synthetic-{n}",
+        }
+
+
+# Import
+def _insert_new_homes(connection, values):
+    # Multi-row INSERT that leaves homes whose property_id is already stored alone;
+    # returns the (id, property_id) of the rows actually inserted
+    homes = Home.__table__
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        statement = (postgresql.insert if dialect == "postgresql" else sqlite.insert)(homes)
+        statement = statement.on_conflict_do_nothing(index_elements=["property_id"])
+        return connection.execute(statement.returning(homes.c.id, homes.c.property_id), values).all()
+    # Other databases: skip the property_ids already present, then a plain INSERT
+    property_ids = [row["property_id"] for row in values if row["property_id"]]
+    present = set(connection.execute(select(homes.c.property_id).where(homes.c.property_id.in_(property_ids))).scalars())
+    values = [row for row in values if row["property_id"] not in present]
+    if not values:
+        return []
+    return connection.execute(insert(homes).returning(homes.c.id, homes.c.property_id), values).all()
+
+
+def import_homes(rows, chunk_size=CHUNK_SIZE, host_ids=None, progress=None):
+    # Streams rows into the homes table: one executemany INSERT and one commit per chunk,
+    # so memory stays flat and a failure only loses the chunk in flight. Each committed chunk is
+    # announced like an ORM commit, so in-process indexes and the market summary pick it up.
+    # Rows whose property_id is already stored (a re-run, or the same feed twice) are skipped.
+    stats = ImportStats()
+    rows = iter(rows)
+    while chunk := list(islice(rows, chunk_size)):
+        values, lines = [], {}
+        for line, row in enumerate(chunk, start=stats.processed + 1):
+            try:
+                row_values = home_values(row, host_ids)
+                if (property_id := row_values["property_id"]) in lines:
+                    raise ValueError(f"Duplicate property_id {property_id!r}.")
+                if property_id:
+                    lines[property_id] = line
+                values.append(row_values)
+            except (KeyError, TypeError, ValueError) as e:
+                stats.skip(line, e)
+        if values:
+            with db.engine.begin() as connection:
+                inserted = _insert_new_homes(connection, values)
+            stats.inserted += len(inserted)
+            stored = lines.keys() - {property_id for _, property_id in inserted}
+            for property_id in sorted(stored, key=lines.get):
+                stats.skip(lines[property_id], f"property_id {property_id!r} was already imported.")
+            notify_changes(Home, [home_id for home_id, _ in inserted])
+        if progress:
+            progress(stats)
+    return stats
+
+
+# Feed Sync
+def sync_homes(rows, chunk_size=CHUNK_SIZE, delete_missing=True, progress=None):
+    # Diffs a full feed against the stored content hashes: each chunk costs one lookup by
+    # property_id plus batched INSERT/UPDATEs for the rows that actually changed, in one
+    # transaction. Homes whose property_id is absent from the feed are soft-deleted at the end.
+    stats = ImportStats()
+    homes = Home.__table__
+    insert_statement = homes.insert().returning(homes.c.id)
+    update_statement = (
+        update(homes)
+        .where(homes.c.id == bindparam("home_id"))
+        .values({homes.c[key]: bindparam(f"new_{key}") for key in SYNCED})
+        .values(deleted_at=None, version=homes.c.version + 1)
+    )
+    seen = set()
+    rows = iter(rows)
+    while chunk := list(islice(rows, chunk_size)):
+        incoming = {}
+        for line, row in enumerate(chunk, start=stats.processed + 1):
+            try:
+                values = home_values(row)
+                if not values["property_id"]:
+                    raise ValueError("Missing property_id.")
+                incoming[values["property_id"]] = values
+            except (KeyError, TypeError, ValueError) as e:
+                stats.skip(line, e)
+        seen.update(incoming)
+
+        changed = []
+        with db.engine.begin() as connection:
+            existing = connection.execute(
+                select(homes.c.property_id, homes.c.id, homes.c.content_hash, homes.c.deleted_at).where(
+                    homes.c.property_id.in_(list(incoming))
+                )
+            )
+            updates = []
+            for property_id, home_id, stored_hash, deleted_at in existing:
+                values = incoming.pop(property_id)
+                if stored_hash == values["content_hash"] and deleted_at is None:
+                    stats.unchanged += 1
+                    continue
+                updates.append({"home_id": home_id, **{f"new_{key}": values[key] for key in SYNCED}})
+                changed.append(home_id)
+            if updates:
+                connection.execute(update_statement, updates)
+                stats.updated += len(updates)
+            # Whatever is left in incoming is new
+            if incoming:
+                changed += connection.execute(insert_statement, list(incoming.values())).scalars().all()
+                stats.inserted += len(incoming)
+        notify_changes(Home, changed)
+        if progress:
+            progress(stats)
+
+    if delete_missing:
+        stats.deleted = _soft_delete_missing(seen, chunk_size)
+    return stats
+
+
+def _soft_delete_missing(seen, chunk_size):
+    homes = Home.__table__
+    with db.engine.connect() as connection:
+        live = connection.execution_options(yield_per=chunk_size).execute(
+            select(homes.c.id, homes.c.property_id).where(homes.c.property_id.isnot(None), homes.c.deleted_at.is_(None))
+        )
+        missing = [home_id for home_id, property_id in live if property_id not in seen]
+    for start in range(0, len(missing), chunk_size):
+        batch = missing[start : start + chunk_size]
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(homes)
+                .where(homes.c.id.in_(batch))
+                .values(deleted_at=func.now(), version=homes.c.version + 1)
+            )
+        notify_changes(Home, batch)
+    return len(missing)
@@ -0,0 +1,62 @@
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from config import app, db
+from green import thread_pool_executor
+from models.job import Job
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # Jobs are CPU-heavy batch work, so they get real threads under gevent too
+                _executor = thread_pool_executor(max_workers=app.config["JOB_WORKERS"], thread_name_prefix="jobs")
+    return _executor
+
+
+def _run(job_id, func, args):
+    # Each job gets its own app context and therefore its own database session
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        job.status = "running"
+        db.session.commit()
+        try:
+            result = func(*args)
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(Job, job_id)
+            job.status, job.error = "failed", str(e)
+            app.logger.exception("Job %s (%s) failed", job_id, job.kind)
+        else:
+            job.status, job.result = "succeeded", result
+        db.session.commit()
+
+
+def create_job(kind, func, *args, user_id=None):
+    # The job row is written with the caller's transaction and only handed to a worker once it commits
+    job = Job(kind=kind, user_id=user_id)
+    db.session.add(job)
+    db.session.flush()
+    db.session.info.setdefault("queued_jobs", []).append((job.id, func, args))
+    return job
+
+
+@event.listens_for(Session, "after_commit")
+def _start_queued_jobs(session):
+    for job_id, func, args in session.info.pop("queued_jobs", ()):
+        if app.config["JOBS_EAGER"]:
+            _run(job_id, func, args)
+        else:
+            _get_executor().submit(_run, job_id, func, args)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_queued_jobs(session):
+    session.info.pop("queued_jobs", None)
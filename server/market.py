@@ -0,0 +1,343 @@
+import bisect
+import math
+import time
+from collections import Counter, defaultdict
+
+from sqlalchemy import delete, func, insert, select, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from config import app, db
+from models.home import Home
+from models.marketBucket import MarketBucket
+from models.marketHome import MarketHome
+from model_events import on_commit
+
+# NumPy is optional: it only speeds up the full rebuild
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Prices are counted in log-scale buckets 2% wide (the DDSketch layout), so any percentile
+# read back is within 1% of the exact value and bucket counts from any segments simply add
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+UNPRICED = -1
+UNKNOWN_BEDROOMS = -1
+KEY = ("location", "home_type", "bedrooms", "price_bucket")
+
+PERCENTILES = (10, 25, 50, 75, 90)
+HISTOGRAM_BINS = 10
+DEFAULT_LOCATIONS = 20
+MAX_LOCATIONS = 100
+MAX_PRICE_EDGES = 50
+CHUNK_SIZE = 1000
+
+
+# Buckets
+def price_bucket(price):
+    # Bucket i holds prices in (GAMMA ** (i - 1), GAMMA ** i]
+    if price is None or not price > 0:
+        return UNPRICED
+    return max(math.ceil(math.log(price) / LOG_GAMMA), 0)
+
+
+def bucket_price(bucket):
+    # The value within RELATIVE_ACCURACY of every price in the bucket
+    return 2 * GAMMA**bucket / (GAMMA + 1)
+
+
+def contribution(home):
+    # A homes row (as a mapping) -> its market_homes row
+    bedrooms, price = home["total_bedrooms"], home["price_per_night"]
+    bucket = price_bucket(price)
+    return {
+        "home_id": home["id"],
+        "location": home["location"] or "",
+        "home_type": home["home_type"] or "",
+        "bedrooms": UNKNOWN_BEDROOMS if bedrooms is None else bedrooms,
+        "price_bucket": bucket,
+        "price": None if bucket == UNPRICED else price,
+    }
+
+
+def _chunks(rows, size=CHUNK_SIZE):
+    for start in range(0, len(rows), size):
+        yield rows[start : start + size]
+
+
+def _add_to_buckets(connection, deltas):
+    # deltas = {key: [count, price_sum]}; one upsert per chunk, then drops the buckets that emptied
+    rows = [dict(zip(KEY, key), count=count, price_sum=total) for key, (count, total) in deltas.items() if count or total]
+    if not rows:
+        return
+    buckets = MarketBucket.__table__
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        statement = (postgresql.insert if dialect == "postgresql" else sqlite.insert)(buckets)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(KEY),
+            set_={
+                "count": buckets.c.count + statement.excluded["count"],
+                "price_sum": buckets.c.price_sum + statement.excluded.price_sum,
+            },
+        )
+        for chunk in _chunks(rows):
+            connection.execute(statement, chunk)
+    else:
+        for row in rows:
+            updated = connection.execute(
+                update(buckets)
+                .where(*(buckets.c[key] == row[key] for key in KEY))
+                .values(count=buckets.c.count + row["count"], price_sum=buckets.c.price_sum + row["price_sum"])
+            )
+            if not updated.rowcount:
+                connection.execute(insert(buckets).values(row))
+    shrunk = [tuple(row[key] for key in KEY) for row in rows if row["count"] < 0]
+    for chunk in _chunks(shrunk):
+        connection.execute(
+            delete(buckets).where(tuple_(*(buckets.c[key] for key in KEY)).in_(chunk), buckets.c.count <= 0)
+        )
+
+
+# Incremental Updates
+def apply_home_changes(upserts, deleted):
+    # on_commit handler: moves each changed home's contribution from its old bucket to its new
+    # one. A failure only leaves the summary stale until `flask rebuild-market-analytics`.
+    contributions = MarketHome.__table__
+    try:
+        for chunk in _chunks(sorted(set(upserts) | set(deleted))):
+            with db.engine.begin() as connection:
+                old = {
+                    row["home_id"]: dict(row)
+                    for row in connection.execute(
+                        select(contributions).where(contributions.c.home_id.in_(chunk)).with_for_update()
+                    ).mappings()
+                }
+                new = {home_id: contribution(upserts[home_id]) for home_id in chunk if home_id in upserts}
+                changed = [home_id for home_id in chunk if old.get(home_id) != new.get(home_id)]
+                if not changed:
+                    continue
+                deltas = defaultdict(lambda: [0, 0.0])
+                for rows, sign in ((old, -1), (new, 1)):
+                    for home_id in changed:
+                        if row := rows.get(home_id):
+                            delta = deltas[tuple(row[key] for key in KEY)]
+                            delta[0] += sign
+                            delta[1] += sign * (row["price"] or 0)
+                connection.execute(delete(contributions).where(contributions.c.home_id.in_(changed)))
+                if inserted := [new[home_id] for home_id in changed if home_id in new]:
+                    connection.execute(insert(contributions), inserted)
+                _add_to_buckets(connection, deltas)
+    except Exception:
+        app.logger.exception("Market analytics update failed")
+
+
+on_commit(Home, apply_home_changes)
+
+
+# Full Rebuild
+def _aggregate(rows):
+    # rows of (id, location, home_type, total_bedrooms, price_per_night) ->
+    # (market_homes rows, {key: [count, price_sum]})
+    columns = ("id", "location", "home_type", "total_bedrooms", "price_per_night")
+    if np is None or not rows:
+        contributions = [contribution(dict(zip(columns, row))) for row in rows]
+        deltas = defaultdict(lambda: [0, 0.0])
+        for row in contributions:
+            delta = deltas[tuple(row[key] for key in KEY)]
+            delta[0] += 1
+            delta[1] += row["price"] or 0
+        return contributions, deltas
+
+    ids, locations, home_types, bedrooms, prices = zip(*rows)
+    prices = np.array([np.nan if price is None else price for price in prices], dtype=np.float64)
+    priced = prices > 0
+    buckets = np.full(len(rows), UNPRICED, dtype=np.int64)
+    buckets[priced] = np.maximum(np.ceil(np.log(prices[priced]) / LOG_GAMMA), 0)
+    bedrooms = np.array([UNKNOWN_BEDROOMS if value is None else value for value in bedrooms], dtype=np.int64)
+    location_names, location_codes = np.unique(np.array([value or "" for value in locations], dtype=object), return_inverse=True)
+    type_names, type_codes = np.unique(np.array([value or "" for value in home_types], dtype=object), return_inverse=True)
+
+    # One pass of np.unique groups every home into its bucket; bincount sums each group
+    keys = np.stack([location_codes.ravel(), type_codes.ravel(), bedrooms, buckets], axis=1)
+    groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    prices = np.where(priced, prices, 0)
+    counts = np.bincount(inverse, minlength=len(groups))
+    sums = np.bincount(inverse, weights=prices, minlength=len(groups))
+    deltas = {
+        (str(location_names[location]), str(type_names[home_type]), int(beds), int(bucket)): [int(count), float(total)]
+        for (location, home_type, beds, bucket), count, total in zip(groups.tolist(), counts.tolist(), sums.tolist())
+    }
+    contributions = [
+        {
+            "home_id": home_id,
+            "location": locations[row] or "",
+            "home_type": home_types[row] or "",
+            "bedrooms": beds,
+            "price_bucket": bucket,
+            "price": price if bucket != UNPRICED else None,
+        }
+        for row, (home_id, beds, bucket, price) in enumerate(zip(ids, bedrooms.tolist(), buckets.tolist(), prices.tolist()))
+    ]
+    return contributions, deltas
+
+
+def rebuild_market(progress=None):
+    # Recomputes both tables from the live homes in one transaction
+    started = time.perf_counter()
+    homes = Home.__table__
+    with db.engine.connect() as connection:
+        rows = connection.execute(
+            select(homes.c.id, homes.c.location, homes.c.home_type, homes.c.total_bedrooms, homes.c.price_per_night)
+            .where(homes.c.deleted_at.is_(None))
+        ).all()
+    contributions, deltas = _aggregate(rows)
+    if progress:
+        progress(f"Bucketed {len(rows):,} homes into {len(deltas):,} buckets")
+
+    with db.engine.begin() as connection:
+        connection.execute(delete(MarketBucket.__table__))
+        connection.execute(delete(MarketHome.__table__))
+        for chunk in _chunks(contributions):
+            connection.execute(insert(MarketHome.__table__), chunk)
+        for chunk in _chunks(list(deltas.items())):
+            connection.execute(
+                insert(MarketBucket.__table__),
+                [dict(zip(KEY, key), count=count, price_sum=total) for key, (count, total) in chunk],
+            )
+    return {"homes": len(rows), "buckets": len(deltas), "seconds": time.perf_counter() - started}
+
+
+# Queries
+def _bedrooms_range(value):
+    # "3" -> (3, 3); "4+" -> (4, None)
+    try:
+        low = int(value[:-1] if value.endswith("+") else value)
+    except ValueError:
+        raise ValueError("bedrooms must be a number, optionally followed by +.")
+    return low, None if value.endswith("+") else low
+
+
+def _price_edges(value):
+    try:
+        edges = [float(edge) for edge in value.split(",")]
+    except ValueError:
+        raise ValueError("price_edges must be a comma-separated list of numbers.")
+    if not 1 <= len(edges) <= MAX_PRICE_EDGES or any(low >= high for low, high in zip(edges, edges[1:])):
+        raise ValueError(f"price_edges must be 1 to {MAX_PRICE_EDGES} increasing numbers.")
+    return edges
+
+
+def parse_market_query(args):
+    locations = list(dict.fromkeys(location.strip() for location in args.getlist("location") if location.strip()))
+    try:
+        limit = int(args.get("limit", DEFAULT_LOCATIONS))
+    except (TypeError, ValueError):
+        raise ValueError("limit must be a number.")
+    if not 1 <= limit <= MAX_LOCATIONS or len(locations) > MAX_LOCATIONS:
+        raise ValueError(f"At most {MAX_LOCATIONS} locations can be compared at once.")
+    return {
+        "locations": locations,
+        "home_type": args.get("home_type") or None,
+        "bedrooms": _bedrooms_range(args["bedrooms"].strip()) if args.get("bedrooms") else None,
+        "limit": limit,
+        "price_edges": _price_edges(args["price_edges"]) if args.get("price_edges") else None,
+    }
+
+
+def _quantile(ordered, total, q):
+    # ordered = [(bucket, count)] ascending
+    rank, seen = q * (total - 1), 0
+    for bucket, count in ordered:
+        seen += count
+        if seen > rank:
+            return round(bucket_price(bucket), 2)
+
+
+def _default_edges(prices):
+    # About HISTOGRAM_BINS bins of a round width (1, 2 or 5 x 10^n) over the prices present
+    low, high = min(prices), max(prices)
+    if high <= low:
+        return [math.floor(low)]
+    rough = (high - low) / HISTOGRAM_BINS
+    magnitude = 10 ** math.floor(math.log10(rough))
+    step = next(step * magnitude for step in (1, 2, 5, 10) if step * magnitude >= rough)
+    start = math.floor(low / step) * step
+    return [start + step * bin for bin in range(int((high - start) // step) + 1)]
+
+
+def _histogram(ordered, edges):
+    # Bins [edge, next edge), the last one open-ended; prices below the first edge count in the
+    # first bin. Each bucket falls in the bin of its representative price, so counts are exact
+    # except for prices within 1% of an edge.
+    counts = [0] * len(edges)
+    for bucket, count in ordered:
+        counts[max(bisect.bisect_right(edges, bucket_price(bucket)) - 1, 0)] += count
+    return [
+        {"min": edge, "max": edges[bin + 1] if bin + 1 < len(edges) else None, "count": counts[bin]}
+        for bin, edge in enumerate(edges)
+    ]
+
+
+def _summarize(location, rows, edges):
+    prices, bedrooms, home_types = Counter(), Counter(), Counter()
+    price_sum = 0.0
+    for row in rows:
+        bedrooms[row.bedrooms] += row.count
+        home_types[row.home_type] += row.count
+        if row.price_bucket != UNPRICED:
+            prices[row.price_bucket] += row.count
+            price_sum += row.price_sum
+    ordered = sorted(prices.items())
+    priced = sum(prices.values())
+    return {
+        "location": location or None,
+        "count": sum(bedrooms.values()),
+        "price_per_night": {
+            "count": priced,
+            "mean": round(price_sum / priced, 2) if priced else None,
+            "min": round(bucket_price(ordered[0][0]), 2) if ordered else None,
+            "max": round(bucket_price(ordered[-1][0]), 2) if ordered else None,
+            "percentiles": {f"p{percentile}": _quantile(ordered, priced, percentile / 100) for percentile in PERCENTILES},
+            "histogram": _histogram(ordered, edges),
+        },
+        "bedrooms": {
+            "unknown" if beds == UNKNOWN_BEDROOMS else str(beds): count for beds, count in sorted(bedrooms.items())
+        },
+        "home_types": dict(home_types.most_common()),
+    }
+
+
+def market_summary(locations=(), home_type=None, bedrooms=None, limit=DEFAULT_LOCATIONS, price_edges=None):
+    # Price distribution and bedroom / home type mix per location, from the summary table
+    # alone: the busiest locations unless some are named, two queries either way
+    buckets = MarketBucket.__table__
+    conditions = []
+    if home_type:
+        conditions.append(buckets.c.home_type == home_type)
+    if bedrooms:
+        low, high = bedrooms
+        conditions.append(buckets.c.bedrooms >= low)
+        if high is not None:
+            conditions.append(buckets.c.bedrooms <= high)
+    if not locations:
+        locations = db.session.execute(
+            select(buckets.c.location)
+            .where(*conditions)
+            .group_by(buckets.c.location)
+            .order_by(func.sum(buckets.c.count).desc(), buckets.c.location)
+            .limit(limit)
+        ).scalars().all()
+
+    by_location = defaultdict(list)
+    for row in db.session.execute(select(buckets).where(buckets.c.location.in_(locations), *conditions)):
+        by_location[row.location].append(row)
+
+    if price_edges is None:
+        # One set of edges for every location so their histograms line up
+        present = [bucket_price(row.price_bucket) for rows in by_location.values() for row in rows if row.price_bucket != UNPRICED]
+        price_edges = _default_edges(present) if present else [0]
+    return [_summarize(location, by_location[location], price_edges) for location in locations]
@@ -0,0 +1,235 @@
+import bisect
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from query_budget import query_count
+
+# Metrics live in process memory: under a multi-worker server each worker reports its own
+# series, and Prometheus aggregates them across scrape targets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+# Slow statements are logged normalised: bind-parameter lists collapsed, then cut to this length
+LOGGED_STATEMENT_CHARS = 1000
+_PARAMETER = r"\s*(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)\s*"
+_PARAMETER_LIST = re.compile(rf"\(({_PARAMETER})(?:,{_PARAMETER}){{3,}}\)")
+
+
+# Registry
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.series = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            for key, value in sorted(self.series.items()):
+                lines += self._render_series(key, value)
+        return lines
+
+    def _render_series(self, key, value):
+        return [f"{self.name}{_labels(self.labelnames, key)} {value}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def set_total(self, value, **labels):
+        # For monotonic totals counted elsewhere and copied in at scrape time
+        with self.lock:
+            self.series[self._key(labels)] = value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.series[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            # [per-bucket counts..., sum]; cumulated only when rendered
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_series(self, key, series):
+        lines, total = [], 0
+        for bound, count in zip((*self.buckets, "+Inf"), series[:-1]):
+            total += count
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', bound)])} {total}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {series[-1]}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {total}")
+        return lines
+
+
+REGISTRY = []
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency, including streamed bodies.", ("endpoint", "method")
+)
+REQUESTS = Counter("http_requests_total", "Requests by endpoint and status.", ("endpoint", "method", "status"))
+REQUEST_STATEMENTS = Histogram(
+    "http_request_sql_statements", "SQL statements issued per request.", ("endpoint",), STATEMENT_BUCKETS
+)
+SQL_SECONDS = Counter("db_statement_seconds_total", "Time spent executing SQL, by endpoint.", ("endpoint",))
+SQL_STATEMENTS = Counter("db_statements_total", "SQL statements executed, by endpoint.", ("endpoint",))
+SLOW_STATEMENTS = Counter("db_slow_statements_total", "Statements slower than SLOW_QUERY_SECONDS.", ("endpoint",))
+PASSWORD_SECONDS = Histogram("password_hash_duration_seconds", "bcrypt time, including pool queueing.", ("operation",))
+UPLOAD_SECONDS = Histogram("image_upload_duration_seconds", "Profile image upload time by backend.", ("backend",))
+SESSION_CACHE = Gauge("session_cache", "Server-side session cache size and hit rate.", ("stat",))
+SESSION_CACHE_EVENTS = Counter(
+    "session_cache_events_total", "Server-side session cache hits, misses, writes and evictions.", ("event",)
+)
+
+
+# SQL Timing
+def loggable_statement(statement):
+    # "IN (?, ?, ... 500 of them)" -> "IN (? x500)"; a multi-row VALUES list is left to the cut
+    statement = " ".join(statement.split())
+    statement = _PARAMETER_LIST.sub(lambda match: f"({match.group(1).strip()} x{match.group(0).count(',') + 1})", statement)
+    if len(statement) > LOGGED_STATEMENT_CHARS:
+        statement = f"{statement[:LOGGED_STATEMENT_CHARS]}... ({len(statement):,} chars)"
+    return statement
+
+
+def _endpoint():
+    return (request.endpoint or "unmatched") if has_request_context() else "background"
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_statement(conn, cursor, statement, parameters, context, executemany):
+    conn.info["statement_started"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _finish_statement(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info.pop("statement_started")
+    endpoint = _endpoint()
+    SQL_SECONDS.inc(elapsed, endpoint=endpoint)
+    SQL_STATEMENTS.inc(endpoint=endpoint)
+    if has_request_context():
+        g.sql_seconds = g.get("sql_seconds", 0.0) + elapsed
+    threshold = current_app.config["SLOW_QUERY_SECONDS"] if has_app_context() else None
+    if threshold and elapsed >= threshold:
+        SLOW_STATEMENTS.inc(endpoint=endpoint)
+        current_app.logger.warning(
+            "Slow query (%.0f ms) in %s: %s", elapsed * 1000, endpoint, loggable_statement(statement)
+        )
+
+
+# Request Timing
+def start_request():
+    g.request_started = time.perf_counter()
+    rate = current_app.config["PROFILE_SAMPLE_RATE"]
+    if rate and random.random() < rate:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active in this thread
+            return
+        g.profiler = profiler
+
+
+def record_status(response):
+    g.response_status = response.status_code
+    return response
+
+
+def finish_request(error=None):
+    # teardown_request: runs after a streamed body has been sent, so its rows and queries count too
+    started = g.pop("request_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    endpoint, method = request.endpoint or "unmatched", request.method
+    REQUEST_LATENCY.observe(elapsed, endpoint=endpoint, method=method)
+    REQUESTS.inc(endpoint=endpoint, method=method, status=g.get("response_status", 500))
+    REQUEST_STATEMENTS.observe(query_count(), endpoint=endpoint)
+
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.disable()
+    slow = current_app.config["SLOW_REQUEST_SECONDS"]
+    if slow and elapsed >= slow:
+        message = "Slow request (%.0f ms, %d queries, %.0f ms SQL): %s %s"
+        args = [elapsed * 1000, query_count(), g.get("sql_seconds", 0.0) * 1000, method, request.full_path]
+        if profiler is not None:
+            message += " - profile saved to %s"
+            args.append(_dump_profile(profiler, endpoint, elapsed))
+        current_app.logger.warning(message, *args)
+
+
+def _dump_profile(profiler, endpoint, elapsed):
+    directory = current_app.config["PROFILE_DIR"]
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{elapsed * 1000:.0f}ms-{random.getrandbits(24):06x}.prof")
+    profiler.dump_stats(path)
+    return path
+
+
+# Exposition
+def render_metrics():
+    if stats := getattr(current_app.session_interface, "cache_stats", None):
+        for stat, value in stats().items():
+            if stat in ("size", "hit_rate"):
+                SESSION_CACHE.set(value, stat=stat)
+            else:
+                SESSION_CACHE_EVENTS.set_total(value, event=stat)
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,57 @@
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from config import db
+
+# In-process indexes subscribe here to hear about rows once their transaction commits.
+# Changed ids are collected at flush time; after commit the rows are re-read in one
+# query per model so handlers always see complete, committed column values.
+_handlers = {}
+
+
+def on_commit(model, handler):
+    # handler(upserts, deleted_ids) with upserts = {id: {column: value}}
+    _handlers.setdefault(model, []).append(handler)
+
+
+def fetch_rows(model, ids):
+    # Soft-deleted rows are left out, so handlers see them as deleted
+    table = model.__table__
+    query = select(table).where(table.c.id.in_(ids))
+    if "deleted_at" in table.c:
+        query = query.where(table.c.deleted_at.is_(None))
+    with db.engine.connect() as connection:
+        return {row.id: dict(row._mapping) for row in connection.execute(query)}
+
+
+def notify_changes(model, ids):
+    # For bulk writers that bypass the ORM: call after their transaction commits
+    if not ids or not _handlers.get(model):
+        return
+    ids = set(ids)
+    upserts = fetch_rows(model, ids)
+    deleted = ids - upserts.keys()
+    for handler in _handlers[model]:
+        handler(upserts, deleted)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, _):
+    if not _handlers:
+        return
+    pending = session.info.setdefault("committed_changes", {})
+    for obj in session.new | session.dirty | session.deleted:
+        if type(obj) in _handlers:
+            pending.setdefault(type(obj), set()).add(obj.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_changes(session):
+    pending = session.info.pop("committed_changes", None)
+    for model, ids in (pending or {}).items():
+        notify_changes(model, ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("committed_changes", None)
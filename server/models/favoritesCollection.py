@@ -1,5 +1,6 @@
 from . import SerializerMixin, validates, re, db
 from sqlalchemy.ext.associationproxy import association_proxy
+from fk_validation import require_existing
 
 class FavoriteCollection(db.Model, SerializerMixin):
     __tablename__ = 'favorite_collections'
@@ -8,14 +9,17 @@ class FavoriteCollection(db.Model, SerializerMixin):
     name = db.Column(db.String(50), nullable=False)
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     updated_at = db.Column(db.DateTime, onupdate=db.func.now())
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'))
+    version = db.Column(db.Integer, nullable=False, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
 
     # Relationship
-    home_favorites = db.relationship('HomeFavorite', back_populates='favorite_collection', cascade="all, delete-orphan")
+    home_favorites = db.relationship('HomeFavorite', back_populates='favorite_collection', cascade="all, delete-orphan", passive_deletes=True)
     user = db.relationship('User', back_populates='favorite_collections')
 
     # Serialize
-    serialize_rules = ('-home_favorites.favorite_collection', '-user.favorite_collections',)
+    serialize_rules = ('-home_favorites.favorite_collection', '-user.favorite_collections', '-version',)
 
     # Association Proxy
     homes = association_proxy('home_favorites', 'home')
@@ -45,6 +49,5 @@ class FavoriteCollection(db.Model, SerializerMixin):
         elif user_id < 1:
             raise ValueError("User id has to be a positive integer.")
         from models.user import User
-        if not db.session.get(User, user_id):
-            raise ValueError("User id has to correspond to an existing user.")
+        require_existing(User, user_id, "User id has to correspond to an existing user.")
         return user_id
@@ -1,4 +1,8 @@
 from . import SerializerMixin, validates, re, db
+from fk_validation import require_existing
+from sqlalchemy import inspect
+from gazetteer import geocode
+from geo import encode_geohash
 
 class Home(db.Model, SerializerMixin):
     __tablename__ = "homes"
@@ -15,7 +19,43 @@ class Home(db.Model, SerializerMixin):
     amenities = db.Column(db.String)
     price_per_night = db.Column(db.Float)
     image = db.Column(db.String)
-    host_id = db.Column(db.Integer, db.ForeignKey("users.id"))
+    host_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="SET NULL"))
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geohash = db.Column(db.String(12))
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    updated_at = db.Column(db.DateTime, onupdate=db.func.now())
+    version = db.Column(db.Integer, nullable=False, server_default="1")
+
+    # Listing feed sync: source key, hash of the last synced feed row, soft-delete marker
+    property_id = db.Column(db.String)
+    content_hash = db.Column(db.String(32))
+    deleted_at = db.Column(db.DateTime)
+
+    # Review aggregates (maintained by the Review mapper events)
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_avg = db.Column(db.Float)
+    rating_1 = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_2 = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_3 = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_4 = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_5 = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    # Indexes (equality columns first, then the price range, then id for keyset pagination)
+    __table_args__ = (
+        db.Index("ix_homes_location_bedrooms_price", "location", "total_bedrooms", "price_per_night", "id"),
+        db.Index("ix_homes_bedrooms_price", "total_bedrooms", "price_per_night", "id"),
+        db.Index("ix_homes_type_price", "home_type", "price_per_night", "id"),
+        db.Index("ix_homes_price", "price_per_night", "id"),
+        db.Index("ix_homes_geohash", "geohash", "id"),
+        db.Index("ix_homes_property_id", "property_id", unique=True),
+        # Lets the similar homes refresh find homes changed by other processes
+        db.Index("ix_homes_updated_at", "updated_at"),
+    )
+
+    # Row version (bumped on every ORM update; used for optimistic locking and ETags)
+    __mapper_args__ = {"version_id_col": version}
 
     # Relationship
     host = db.relationship("User", back_populates="homes")
@@ -37,9 +77,17 @@ class Home(db.Model, SerializerMixin):
         "price_per_night",
         "image",
         "host_id",
-        "reviews.rating",
+        "latitude",
+        "longitude",
+        "rating_avg",
+        "rating_count",
+        "rating_histogram",
     )
 
+    @property
+    def rating_histogram(self):
+        return {str(star): getattr(self, f"rating_{star}") or 0 for star in range(1, 6)}
+
     # Representation
     def __repr__(self):
         return f""" 
@@ -56,6 +104,8 @@ class Home(db.Model, SerializerMixin):
                 price_per_night: {self.price_per_night}
                 image: {self.image}
                 host_id: {self.host_id}
+                latitude: {self.latitude}
+                longitude: {self.longitude}
                 />
         """
 
@@ -107,6 +157,41 @@ class Home(db.Model, SerializerMixin):
         elif host_id < 1:
             raise ValueError("Host id has to be a positive integer.")
         from models.user import User
-        if not db.session.get(User, host_id):
-            raise ValueError("Host id has to correspond to an existing user.")
+        require_existing(User, host_id, "Host id has to correspond to an existing user.")
         return host_id
+
+    @validates("latitude")
+    def validate_latitude(self, _, latitude):
+        if latitude is None:
+            return latitude
+        elif not isinstance(latitude, (int, float)):
+            raise TypeError("Latitude must be a number.")
+        elif not -90 <= latitude <= 90:
+            raise ValueError("Latitude must be between -90 and 90.")
+        return float(latitude)
+
+    @validates("longitude")
+    def validate_longitude(self, _, longitude):
+        if longitude is None:
+            return longitude
+        elif not isinstance(longitude, (int, float)):
+            raise TypeError("Longitude must be a number.")
+        elif not -180 <= longitude <= 180:
+            raise ValueError("Longitude must be between -180 and 180.")
+        return float(longitude)
+
+
+# Geocoding
+@db.event.listens_for(Home, "before_insert")
+@db.event.listens_for(Home, "before_update")
+def set_coordinates(mapper, connection, home):
+    attrs = inspect(home).attrs
+    moved = attrs.location.history.has_changes() and not (
+        attrs.latitude.history.has_changes() or attrs.longitude.history.has_changes()
+    )
+    if moved or home.latitude is None or home.longitude is None:
+        home.latitude, home.longitude = geocode(home.location) or (None, None)
+    if home.latitude is not None and home.longitude is not None:
+        home.geohash = encode_geohash(home.latitude, home.longitude)
+    else:
+        home.geohash = None
@@ -1,9 +1,10 @@
 from . import SerializerMixin, validates, re, db
+from fk_validation import require_existing
 
 class HomeFavorite(db.Model, SerializerMixin):
     __tablename__ = 'home_favorites'
 
-    favorite_collection_id = db.Column(db.Integer, db.ForeignKey('favorite_collections.id'), primary_key=True, index=True)
+    favorite_collection_id = db.Column(db.Integer, db.ForeignKey('favorite_collections.id', ondelete='CASCADE'), primary_key=True, index=True)
     home_id = db.Column(db.Integer, db.ForeignKey('homes.id'), primary_key=True, index=True)
 
     # Relationship
@@ -30,8 +31,11 @@ class HomeFavorite(db.Model, SerializerMixin):
         elif favorite_collection_id < 1:
             raise ValueError("FavoriteCollection id has to be a positive integer.")
         from models.favoritesCollection import FavoriteCollection
-        if not db.session.get(FavoriteCollection, favorite_collection_id):
-            raise ValueError("FavoriteCollection id has to correspond to an existing favorite collection.")
+        require_existing(
+            FavoriteCollection,
+            favorite_collection_id,
+            "FavoriteCollection id has to correspond to an existing favorite collection.",
+        )
         return favorite_collection_id
     
     @validates("home_id")
@@ -41,6 +45,5 @@ class HomeFavorite(db.Model, SerializerMixin):
         elif home_id < 1:
             raise ValueError("Home id has to be a positive integer.")
         from models.home import Home
-        if not db.session.get(Home, home_id):
-            raise ValueError("Home id has to correspond to an existing home.")
+        require_existing(Home, home_id, "Home id has to correspond to an existing home.")
         return home_id
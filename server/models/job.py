@@ -0,0 +1,33 @@
+import uuid
+
+from . import SerializerMixin, validates, re, db
+
+
+class Job(db.Model, SerializerMixin):
+    __tablename__ = "jobs"
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="pending")
+    result = db.Column(db.JSON)
+    error = db.Column(db.String)
+    user_id = db.Column(db.Integer, index=True)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    updated_at = db.Column(db.DateTime, onupdate=db.func.now())
+
+    # Representation
+    def __repr__(self):
+        return f"""
+            <Job {self.id}
+                kind: {self.kind}
+                status: {self.status}
+                user_id: {self.user_id}
+                />
+        """
+
+    # Validations
+    @validates("status")
+    def validate_status(self, _, status):
+        if status not in {"pending", "running", "succeeded", "failed"}:
+            raise ValueError("Invalid job status.")
+        return status
@@ -0,0 +1,28 @@
+from . import SerializerMixin, validates, re, db
+
+class MarketBucket(db.Model, SerializerMixin):
+    __tablename__ = "market_buckets"
+
+    # Home counts per segment and log-scale price bucket, maintained by market.py; summing
+    # rows merges segments, so any location / home_type / bedrooms slice reads from here
+    location = db.Column(db.String, primary_key=True)
+    home_type = db.Column(db.String, primary_key=True)
+    bedrooms = db.Column(db.Integer, primary_key=True)
+    price_bucket = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    price_sum = db.Column(db.Float, nullable=False, default=0)
+
+    # Serialize
+    serialize_only = ("location", "home_type", "bedrooms", "price_bucket", "count")
+
+    # Representation
+    def __repr__(self):
+        return f"""
+            <MarketBucket
+                location: {self.location}
+                home_type: {self.home_type}
+                bedrooms: {self.bedrooms}
+                price_bucket: {self.price_bucket}
+                count: {self.count}
+                />
+        """
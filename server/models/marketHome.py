@@ -0,0 +1,27 @@
+from . import SerializerMixin, validates, re, db
+
+class MarketHome(db.Model, SerializerMixin):
+    __tablename__ = "market_homes"
+
+    # What each live home currently contributes to market_buckets, so a change can be
+    # subtracted exactly; no foreign key, the row has to outlive a deleted home until it is applied
+    home_id = db.Column(db.Integer, primary_key=True)
+    location = db.Column(db.String, nullable=False)
+    home_type = db.Column(db.String, nullable=False)
+    bedrooms = db.Column(db.Integer, nullable=False)
+    price_bucket = db.Column(db.Integer, nullable=False)
+    price = db.Column(db.Float)
+
+    # Serialize
+    serialize_only = ("home_id", "location", "home_type", "bedrooms", "price_bucket", "price")
+
+    # Representation
+    def __repr__(self):
+        return f"""
+            <MarketHome {self.home_id}
+                location: {self.location}
+                home_type: {self.home_type}
+                bedrooms: {self.bedrooms}
+                price_bucket: {self.price_bucket}
+                />
+        """
@@ -1,15 +1,28 @@
 from . import SerializerMixin, validates, re, db
+from fk_validation import require_existing
+from sqlalchemy import inspect
+from ratings import apply_rating_delta
 
 class Review(db.Model, SerializerMixin):
     __tablename__ = 'reviews'
 
     id = db.Column(db.Integer, primary_key=True)
-    rating = db.Column(db.Integer)
+    # active_history keeps the previous values available to the aggregate events below
+    rating = db.column_property(db.Column(db.Integer), active_history=True)
     review = db.Column(db.String)
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     updated_at = db.Column(db.DateTime, onupdate=db.func.now())
-    home_id = db.Column(db.Integer, db.ForeignKey('homes.id'))
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    home_id = db.column_property(db.Column(db.Integer, db.ForeignKey('homes.id')), active_history=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'))
+    version = db.Column(db.Integer, nullable=False, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
+
+    # Indexes (the review feed: one per sort, each scanned from the home_id prefix)
+    __table_args__ = (
+        db.Index("ix_reviews_home_created", "home_id", "created_at", "id"),
+        db.Index("ix_reviews_home_rating", "home_id", "rating", "created_at", "id"),
+    )
 
     # Relationship
     home = db.relationship('Home', back_populates='reviews')
@@ -53,10 +66,7 @@ class Review(db.Model, SerializerMixin):
         elif home_id < 1:
             raise ValueError(f"{home_id} has to be a positive integer.")
         from models.home import Home
-        if not db.session.get(Home, home_id):
-            raise ValueError(
-                f"{home_id} has to correspond to an existing home."
-            )
+        require_existing(Home, home_id, f"{home_id} has to correspond to an existing home.")
         return home_id
     
     @validates("user_id")
@@ -66,8 +76,27 @@ class Review(db.Model, SerializerMixin):
         elif user_id < 1:
             raise ValueError(f"{user_id} has to be a positive integer.")
         from models.user import User
-        if not db.session.get(User, user_id):
-            raise ValueError(
-                f"{user_id} has to correspond to an existing user."
-            )
+        require_existing(User, user_id, f"{user_id} has to correspond to an existing user.")
         return user_id
+
+
+# Home rating aggregates
+@db.event.listens_for(Review, "after_insert")
+def add_rating(mapper, connection, review):
+    apply_rating_delta(connection, review.home_id, review.rating, 1)
+
+
+@db.event.listens_for(Review, "after_delete")
+def remove_rating(mapper, connection, review):
+    apply_rating_delta(connection, review.home_id, review.rating, -1)
+
+
+@db.event.listens_for(Review, "after_update")
+def move_rating(mapper, connection, review):
+    attrs = inspect(review).attrs
+    if not (attrs.rating.history.has_changes() or attrs.home_id.history.has_changes()):
+        return
+    old_rating = (attrs.rating.history.deleted or [review.rating])[0]
+    old_home_id = (attrs.home_id.history.deleted or [review.home_id])[0]
+    apply_rating_delta(connection, old_home_id, old_rating, -1)
+    apply_rating_delta(connection, review.home_id, review.rating, 1)
@@ -0,0 +1,30 @@
+from . import SerializerMixin, validates, re, db
+
+class SimilarHome(db.Model, SerializerMixin):
+    __tablename__ = "similar_homes"
+
+    # Precomputed top-k neighbours, rebuilt by similar_homes.py (rank 0 is the closest)
+    home_id = db.Column(db.Integer, db.ForeignKey("homes.id", ondelete="CASCADE"), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    similar_home_id = db.Column(db.Integer, db.ForeignKey("homes.id", ondelete="CASCADE"), nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)
+
+    # The refresh reads the lowest k-th score of any list from here
+    __table_args__ = (db.Index("ix_similar_homes_rank_score", "rank", "score"),)
+
+    # Relationship
+    similar_home = db.relationship("Home", foreign_keys=[similar_home_id])
+
+    # Serialize
+    serialize_only = ("similar_home_id", "score")
+
+    # Representation
+    def __repr__(self):
+        return f"""
+            <SimilarHome
+                home_id: {self.home_id}
+                rank: {self.rank}
+                similar_home_id: {self.similar_home_id}
+                score: {self.score}
+                />
+        """
@@ -0,0 +1,23 @@
+from . import SerializerMixin, validates, re, db
+
+class SimilarHomeFit(db.Model, SerializerMixin):
+    __tablename__ = "similar_home_fits"
+
+    # The feature transform (vocabularies, column statistics, k) of the last full build, so
+    # incremental refreshes score homes exactly as the stored lists were scored
+    id = db.Column(db.Integer, primary_key=True)
+    k = db.Column(db.Integer, nullable=False)
+    params = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+
+    # Serialize
+    serialize_only = ("id", "k", "created_at")
+
+    # Representation
+    def __repr__(self):
+        return f"""
+            <SimilarHomeFit {self.id}
+                k: {self.k}
+                created_at: {self.created_at}
+                />
+        """
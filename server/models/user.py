@@ -1,6 +1,6 @@
 from . import SerializerMixin, validates, re, db
 from sqlalchemy.ext.hybrid import hybrid_property
-from config import flask_bcrypt
+from passwords import check_password, hash_password, needs_rehash
 
 class User(db.Model, SerializerMixin):
     __tablename__ = "users"
@@ -10,20 +10,30 @@ class User(db.Model, SerializerMixin):
     email = db.Column(db.String, unique=True, nullable=False)
     _password_hash = db.Column(db.String, nullable=False)
     profile_image = db.Column(db.String)
+    profile_image_status = db.Column(db.String(20))
     created_at = db.Column(db.DateTime, server_default=db.func.now())
+    version = db.Column(db.Integer, nullable=False, server_default="1")
+    # Set when an account is deleted; purge.py removes the row and its data in the background
+    deleted_at = db.Column(db.DateTime)
+
+    __mapper_args__ = {"version_id_col": version}
 
     # Relationship
     favorite_collections = db.relationship(
-        "FavoriteCollection", back_populates="user", cascade="all, delete-orphan"
+        "FavoriteCollection", back_populates="user", cascade="all, delete-orphan", passive_deletes=True
     )
     reviews = db.relationship(
-        "Review", back_populates="user", cascade="all, delete-orphan"
+        "Review", back_populates="user", cascade="all, delete-orphan", passive_deletes=True
     )
+    homes = db.relationship("Home", back_populates="host", passive_deletes=True)
 
     # Serialize
     serialize_rules = (
         "-favorite_collections.user",
         "-reviews.user",
+        "-homes",
+        "-deleted_at",
+        "-version",
     )
 
     # Representation
@@ -65,7 +75,14 @@ class User(db.Model, SerializerMixin):
             raise TypeError("Password must be a string.")
         elif not 8 <= len(password) <= 50:
             raise ValueError("Password must be between 8 and 50 characters.")
-        self._password_hash = flask_bcrypt.generate_password_hash(password).decode('utf-8')
+        self._password_hash = hash_password(password)
     
     def authenticate(self, password):
-        return flask_bcrypt.check_password_hash(self._password_hash, password)
+        return check_password(self._password_hash, password)
+
+    def rehash_if_needed(self, password):
+        # Called after a successful login: upgrades hashes made with an outdated BCRYPT_LOG_ROUNDS
+        if needs_rehash(self._password_hash):
+            self._password_hash = hash_password(password)
+            return True
+        return False
@@ -0,0 +1,27 @@
+from . import SerializerMixin, validates, re, db
+
+class UserRecommendation(db.Model, SerializerMixin):
+    __tablename__ = "user_recommendations"
+
+    # Per-user top-N homes, rebuilt by recommendations.py (rank 0 is the strongest)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    home_id = db.Column(db.Integer, db.ForeignKey("homes.id", ondelete="CASCADE"), nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)
+
+    # Relationship
+    home = db.relationship("Home")
+
+    # Serialize
+    serialize_only = ("home_id", "score")
+
+    # Representation
+    def __repr__(self):
+        return f"""
+            <UserRecommendation
+                user_id: {self.user_id}
+                rank: {self.rank}
+                home_id: {self.home_id}
+                score: {self.score}
+                />
+        """
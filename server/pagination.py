@@ -0,0 +1,29 @@
+import base64
+import json
+
+
+TRUE_VALUES = ("1", "true", "yes")
+
+
+# Cursors
+def encode_cursor(*values):
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor.")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor.")
+    return values
+
+
+# Streaming
+def wants_stream(args):
+    return args.get("stream", "").lower() in TRUE_VALUES
@@ -0,0 +1,81 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+from flask import current_app
+
+from metrics import PASSWORD_SECONDS
+
+
+class PasswordPoolBusy(RuntimeError):
+    pass
+
+
+# Worker functions (run in the pool's processes)
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def _check(password_hash, password):
+    return bcrypt.checkpw(password.encode("utf-8"), password_hash.encode("utf-8"))
+
+
+# Pool
+_pool = None
+_slots = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool, _slots
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = current_app.config["BCRYPT_POOL_WORKERS"]
+                _slots = threading.BoundedSemaphore(current_app.config["BCRYPT_QUEUE_DEPTH"] or workers * 4)
+                # spawn: forking a multi-threaded server process is not safe
+                _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _submit(func, *args):
+    # Bounded hand-off: once BCRYPT_QUEUE_DEPTH hashes are in flight, callers are
+    # turned away (PasswordPoolBusy) instead of queueing behind them
+    if not current_app.config["BCRYPT_POOL_WORKERS"]:
+        return func(*args)
+    pool = _get_pool()
+    if not _slots.acquire(timeout=current_app.config["BCRYPT_QUEUE_TIMEOUT"]):
+        raise PasswordPoolBusy("Too many password operations in progress. Please try again.")
+    try:
+        return pool.submit(func, *args).result()
+    finally:
+        _slots.release()
+
+
+# Public API
+def hash_password(password, rounds=None):
+    with PASSWORD_SECONDS.time(operation="hash"):
+        return _submit(_hash, password, rounds or current_app.config["BCRYPT_LOG_ROUNDS"])
+
+
+def check_password(password_hash, password):
+    with PASSWORD_SECONDS.time(operation="check"):
+        return _submit(_check, password_hash, password)
+
+
+def hash_passwords(passwords, rounds=None):
+    # Bulk hashing for imports and seeding: fans the whole batch out over the pool
+    rounds = rounds or current_app.config["BCRYPT_LOG_ROUNDS"]
+    if not current_app.config["BCRYPT_POOL_WORKERS"]:
+        return [_hash(password, rounds) for password in passwords]
+    return list(_get_pool().map(_hash, passwords, [rounds] * len(passwords), chunksize=8))
+
+
+def hash_cost(password_hash):
+    # "$2b$12$..." -> 12
+    return int(password_hash.split("$")[2])
+
+
+def needs_rehash(password_hash):
+    return hash_cost(password_hash) != current_app.config["BCRYPT_LOG_ROUNDS"]
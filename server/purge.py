@@ -0,0 +1,95 @@
+from sqlalchemy import delete, func, select, update
+
+from config import app, db
+from model_events import notify_changes
+from models.favoritesCollection import FavoriteCollection
+from models.home import Home
+from models.homeFavorite import HomeFavorite
+from models.review import Review
+from models.user import User
+from models.userRecommendation import UserRecommendation
+from ratings import rebuild_rating_aggregates
+
+
+# Batches
+def _purge_favorites(user_id, batch_size):
+    collections, favorites = FavoriteCollection.__table__, HomeFavorite.__table__
+    owned = select(collections.c.id).where(collections.c.user_id == user_id)
+    purged = 0
+    while True:
+        with db.engine.begin() as connection:
+            batch = connection.execute(
+                select(favorites.c.favorite_collection_id, favorites.c.home_id)
+                .where(favorites.c.favorite_collection_id.in_(owned))
+                .limit(batch_size)
+            ).all()
+            for collection_id in {collection_id for collection_id, _ in batch}:
+                connection.execute(
+                    delete(favorites).where(
+                        favorites.c.favorite_collection_id == collection_id,
+                        favorites.c.home_id.in_([home_id for owner, home_id in batch if owner == collection_id]),
+                    )
+                )
+        purged += len(batch)
+        if len(batch) < batch_size:
+            break
+    with db.engine.begin() as connection:
+        connection.execute(delete(collections).where(collections.c.user_id == user_id))
+    return purged
+
+
+def _purge_reviews(user_id, batch_size):
+    # Deleting reviews with SQL skips the Review events, so each batch rebuilds the rating
+    # aggregates of the homes it touched in the same transaction
+    reviews = Review.__table__
+    purged = 0
+    while True:
+        with db.engine.begin() as connection:
+            batch = connection.execute(
+                select(reviews.c.id, reviews.c.home_id).where(reviews.c.user_id == user_id).limit(batch_size)
+            ).all()
+            if batch:
+                connection.execute(delete(reviews).where(reviews.c.id.in_([id for id, _ in batch])))
+                rebuild_rating_aggregates(connection, sorted({home_id for _, home_id in batch if home_id is not None}))
+        purged += len(batch)
+        if len(batch) < batch_size:
+            return purged
+
+
+def _release_homes(user_id, batch_size):
+    # A deleted host's listings come off the feed (soft-deleted, as a feed sync would) and lose their host
+    homes = Home.__table__
+    released = 0
+    while True:
+        with db.engine.begin() as connection:
+            batch = connection.execute(select(homes.c.id).where(homes.c.host_id == user_id).limit(batch_size)).scalars().all()
+            if batch:
+                connection.execute(
+                    update(homes)
+                    .where(homes.c.id.in_(batch))
+                    .values(
+                        host_id=None,
+                        deleted_at=func.coalesce(homes.c.deleted_at, func.now()),
+                        version=homes.c.version + 1,
+                    )
+                )
+        notify_changes(Home, batch)
+        released += len(batch)
+        if len(batch) < batch_size:
+            return released
+
+
+# Accounts
+def purge_user(user_id, batch_size=None):
+    # Background job: removes a user marked deleted in bounded batches, one short transaction
+    # each, then the user row itself (whose ON DELETE CASCADE constraints catch any stragglers)
+    batch_size = batch_size or app.config["USER_PURGE_BATCH_SIZE"]
+    result = {
+        "favorites": _purge_favorites(user_id, batch_size),
+        "reviews": _purge_reviews(user_id, batch_size),
+        "homes_released": _release_homes(user_id, batch_size),
+    }
+    with db.engine.begin() as connection:
+        connection.execute(delete(UserRecommendation.__table__).where(UserRecommendation.user_id == user_id))
+        connection.execute(delete(User.__table__).where(User.__table__.c.id == user_id))
+    return result
@@ -0,0 +1,42 @@
+from functools import wraps
+
+from flask import current_app, g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+# SQL Counting
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get("query_count", 0) + 1
+
+
+def query_count():
+    return g.get("query_count", 0)
+
+
+# Route Budgets
+def query_budget(limit):
+    # Fails loudly (QUERY_BUDGET_STRICT, on by default under app.testing) or logs when a
+    # handler issues more than `limit` statements, catching lazy-load regressions early
+    def decorator(func):
+        @wraps(func)
+        def decorated_function(*args, **kwargs):
+            before = query_count()
+            response = func(*args, **kwargs)
+            used = query_count() - before
+            if used > limit:
+                message = f"{func.__qualname__} issued {used} queries (budget {limit})."
+                if current_app.config.get("QUERY_BUDGET_STRICT", current_app.testing):
+                    raise QueryBudgetExceeded(message)
+                current_app.logger.warning(message)
+            return response
+
+        return decorated_function
+
+    return decorator
@@ -0,0 +1,83 @@
+from collections import defaultdict
+
+from sqlalchemy import Float, bindparam, case, cast, func, select, update
+
+from models.home import Home
+
+STARS = range(1, 6)
+
+
+def apply_rating_delta(connection, home_id, rating, sign):
+    # Atomic in-place increment; SET expressions read the pre-update row, so the
+    # average is computed from the new count and sum in the same statement
+    if home_id is None or rating is None:
+        return
+    homes = Home.__table__
+    count = homes.c.rating_count + sign
+    total = homes.c.rating_sum + sign * rating
+    connection.execute(
+        update(homes)
+        .where(homes.c.id == home_id)
+        .values(
+            {
+                homes.c.rating_count: count,
+                homes.c.rating_sum: total,
+                homes.c.rating_avg: case((count > 0, cast(total, Float) / count), else_=None),
+                homes.c[f"rating_{rating}"]: homes.c[f"rating_{rating}"] + sign,
+                homes.c.updated_at: func.now(),
+            }
+        )
+    )
+
+
+def rebuild_rating_aggregates(connection, home_ids=None, batch_size=1000):
+    # Recomputes aggregates from the reviews table; all homes when home_ids is None
+    from models.review import Review
+
+    reviews = Review.__table__
+    homes = Home.__table__
+    query = select(reviews.c.home_id, reviews.c.rating, func.count()).where(
+        reviews.c.home_id.isnot(None), reviews.c.rating.isnot(None)
+    )
+    reset = update(homes)
+    if home_ids is not None:
+        query = query.where(reviews.c.home_id.in_(home_ids))
+        reset = reset.where(homes.c.id.in_(home_ids))
+
+    histograms = defaultdict(lambda: dict.fromkeys(STARS, 0))
+    for home_id, rating, count in connection.execute(query.group_by(reviews.c.home_id, reviews.c.rating)):
+        histograms[home_id][rating] = count
+
+    connection.execute(
+        reset.values(rating_count=0, rating_sum=0, rating_avg=None, updated_at=func.now(), **{f"rating_{star}": 0 for star in STARS})
+    )
+    statement = (
+        update(homes)
+        .where(homes.c.id == bindparam("home_id"))
+        .values(
+            rating_count=bindparam("count"),
+            rating_sum=bindparam("total"),
+            rating_avg=bindparam("average"),
+            updated_at=func.now(),
+            **{f"rating_{star}": bindparam(f"stars_{star}") for star in STARS},
+        )
+    )
+    rows = []
+    for home_id, histogram in histograms.items():
+        count = sum(histogram.values())
+        total = sum(star * n for star, n in histogram.items())
+        rows.append(
+            {
+                "home_id": home_id,
+                "count": count,
+                "total": total,
+                "average": total / count if count else None,
+                **{f"stars_{star}": histogram[star] for star in STARS},
+            }
+        )
+        if len(rows) == batch_size:
+            connection.execute(statement, rows)
+            rows = []
+    if rows:
+        connection.execute(statement, rows)
+    return len(histograms)
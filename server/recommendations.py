@@ -0,0 +1,264 @@
+import time
+
+from sqlalchemy import delete, exists, select
+
+from config import app, db
+from models.favoritesCollection import FavoriteCollection
+from models.home import Home
+from models.homeFavorite import HomeFavorite
+from models.review import Review
+from models.userRecommendation import UserRecommendation
+
+# NumPy is optional: without it the recommendations table is not built, and
+# /users/<id>/recommendations serves whatever it already holds
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Item-item neighbours kept per home, and the damping applied to pairs with little support
+NEIGHBOURS = 50
+SHRINKAGE = 5.0
+# Users with more interactions than this are sampled down: a user's items pair up quadratically
+MAX_USER_ITEMS = 500
+# Upper bound on expanded (row, item) pairs held in memory by one pass; sets peak memory
+MAX_PAIRS = 4_000_000
+READ_BATCH = 50_000
+
+
+class Interactions:
+    # Implicit feedback as a sparse user x home matrix, stored twice: CSR by user and CSR by item.
+    # Ids are mapped to dense codes; weights are float32 and indices int32/int64 to stay compact.
+    def __init__(self, users, items, weights, user_ids, home_ids):
+        self.user_ids = user_ids
+        self.home_ids = home_ids
+        self.n_users, self.n_items = len(user_ids), len(home_ids)
+
+        # By user (users/items/weights arrive sorted by user)
+        self.user_items = items
+        self.user_weights = weights
+        self.user_ptr = np.concatenate(([0], np.cumsum(np.bincount(users, minlength=self.n_users))))
+
+        # By item
+        order = np.argsort(items, kind="stable")
+        self.item_users = users[order]
+        self.item_weights = weights[order]
+        self.item_ptr = np.concatenate(([0], np.cumsum(np.bincount(items, minlength=self.n_items))))
+        self.item_norms = np.sqrt(np.bincount(items, weights=weights.astype(np.float64) ** 2, minlength=self.n_items))
+
+    def __len__(self):
+        return len(self.user_items)
+
+    @classmethod
+    def load(cls, connection, review_weight=0.0):
+        # Favorites count 1.0; a review counts review_weight scaled by its rating above 2 stars
+        # (low ratings are not a positive signal). Read in batches and kept as numpy arrays.
+        collections, favorites, homes = FavoriteCollection.__table__, HomeFavorite.__table__, Home.__table__
+        live_home = exists().where(homes.c.id == favorites.c.home_id, homes.c.deleted_at.is_(None))
+        queries = [
+            select(collections.c.user_id, favorites.c.home_id)
+            .join_from(favorites, collections, favorites.c.favorite_collection_id == collections.c.id)
+            .where(collections.c.user_id.isnot(None), live_home)
+        ]
+        if review_weight:
+            reviews = Review.__table__
+            queries.append(
+                select(reviews.c.user_id, reviews.c.home_id, reviews.c.rating).where(
+                    reviews.c.user_id.isnot(None),
+                    reviews.c.rating > 2,
+                    exists().where(homes.c.id == reviews.c.home_id, homes.c.deleted_at.is_(None)),
+                )
+            )
+
+        users, items, weights = [], [], []
+        for query in queries:
+            result = connection.execution_options(yield_per=READ_BATCH).execute(query)
+            for partition in result.partitions():
+                block = np.array(partition, dtype=np.int64)
+                users.append(block[:, 0])
+                items.append(block[:, 1])
+                if block.shape[1] == 3:
+                    weights.append((review_weight * (block[:, 2] - 2) / 3).astype(np.float32))
+                else:
+                    weights.append(np.ones(len(block), dtype=np.float32))
+        if not users:
+            empty = np.zeros(0, dtype=np.int64)
+            return cls(empty, empty, np.zeros(0, dtype=np.float32), empty, empty)
+
+        user_ids, users = np.unique(np.concatenate(users), return_inverse=True)
+        home_ids, items = np.unique(np.concatenate(items), return_inverse=True)
+        weights = np.concatenate(weights)
+
+        # One entry per (user, home): the strongest signal wins (a home saved to two collections
+        # and also reviewed is still one interaction)
+        keys = users.astype(np.int64) * len(home_ids) + items
+        order = np.lexsort((-weights, keys))
+        keys, weights = keys[order], weights[order]
+        first = np.concatenate(([True], keys[1:] != keys[:-1]))
+        keys, weights = keys[first], weights[first]
+        users, items = keys // len(home_ids), keys % len(home_ids)
+
+        # Sample heavy users down to MAX_USER_ITEMS with a fixed seed, so rebuilds are repeatable
+        counts = np.bincount(users, minlength=len(user_ids))
+        if counts.max() > MAX_USER_ITEMS:
+            shuffle = np.random.default_rng(0).random(len(users))
+            order = np.lexsort((shuffle, users))
+            users, items, weights = users[order], items[order], weights[order]
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            keep = np.arange(len(users)) - starts[users] < MAX_USER_ITEMS
+            users, items, weights = users[keep], items[keep], weights[keep]
+        return cls(users.astype(np.int32), items.astype(np.int32), weights, user_ids, home_ids)
+
+
+# Vectorised Helpers
+def _expand(starts, lengths):
+    # Concatenation of arange(start, start + length) for each pair, without a Python loop
+    total = int(lengths.sum())
+    offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+    return offsets + np.arange(total)
+
+
+def _chunks(costs, budget):
+    # Splits rows into consecutive [start, stop) ranges whose summed cost stays under budget
+    # (a single row over budget gets a range of its own)
+    cumulative = np.cumsum(costs)
+    start = 0
+    while start < len(costs):
+        base = cumulative[start - 1] if start else 0
+        stop = max(int(np.searchsorted(cumulative, base + budget, side="right")), start + 1)
+        yield start, stop
+        start = stop
+
+
+def _sum_by_key(keys, values):
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return unique, np.bincount(inverse, weights=values), np.bincount(inverse)
+
+
+def _top_per_row(rows, columns, scores, n):
+    # Keeps the n best (column, score) per row; returns them sorted by row, best first
+    order = np.lexsort((columns, -scores, rows))
+    rows, columns, scores = rows[order], columns[order], scores[order]
+    starts = np.searchsorted(rows, rows, side="left")
+    keep = np.arange(len(rows)) - starts < n
+    return rows[keep], columns[keep], scores[keep]
+
+
+# Item-Item Similarity
+def item_neighbours(interactions, neighbours=NEIGHBOURS, max_pairs=MAX_PAIRS):
+    # Shrunk cosine similarity between homes that share users, computed in passes over item
+    # ranges sized so the expanded co-occurrence pairs of one pass fit in max_pairs. Returns the
+    # top neighbours of every item as CSR arrays (ptr, item, score).
+    m = interactions
+    degrees = np.diff(m.user_ptr)
+    pair_costs = np.bincount(
+        np.repeat(np.arange(m.n_items), np.diff(m.item_ptr)), weights=degrees[m.item_users], minlength=m.n_items
+    )
+    parts = []
+    for first, last in _chunks(pair_costs, max_pairs):
+        entries = np.arange(m.item_ptr[first], m.item_ptr[last])
+        left = np.repeat(np.arange(first, last), np.diff(m.item_ptr[first : last + 1]))
+        users = m.item_users[entries]
+        lengths = degrees[users]
+        positions = _expand(m.user_ptr[users], lengths)
+        i = np.repeat(left, lengths)
+        j = m.user_items[positions]
+        products = np.repeat(m.item_weights[entries], lengths) * m.user_weights[positions]
+        other = i != j
+        keys, dots, support = _sum_by_key((i[other] - first).astype(np.int64) * m.n_items + j[other], products[other])
+        i, j = keys // m.n_items + first, keys % m.n_items
+        scores = dots / (m.item_norms[i] * m.item_norms[j]) * support / (support + SHRINKAGE)
+        parts.append(_top_per_row(i, j, scores, neighbours))
+
+    if not parts:
+        return np.zeros(m.n_items + 1, dtype=np.int64), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+    rows = np.concatenate([part[0] for part in parts])
+    ptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=m.n_items))))
+    return ptr, np.concatenate([part[1] for part in parts]).astype(np.int32), np.concatenate([part[2] for part in parts]).astype(np.float32)
+
+
+# User Recommendations
+def user_scores(interactions, neighbours, first, last):
+    # Item-based scores for users [first, last): each interaction's weight times its home's
+    # neighbour similarities, summed per (user, home), minus homes the user already has
+    m = interactions
+    ptr, neighbour_items, neighbour_scores = neighbours
+    entries = np.arange(m.user_ptr[first], m.user_ptr[last])
+    users = np.repeat(np.arange(first, last), np.diff(m.user_ptr[first : last + 1]))
+    items = m.user_items[entries]
+    lengths = np.diff(ptr)[items]
+    positions = _expand(ptr[items], lengths)
+    u = np.repeat(users, lengths).astype(np.int64)
+    j = neighbour_items[positions]
+    keys, scores, _ = _sum_by_key(
+        (u - first) * m.n_items + j, np.repeat(m.user_weights[entries], lengths) * neighbour_scores[positions]
+    )
+    seen = (users.astype(np.int64) - first) * m.n_items + items
+    fresh = ~np.isin(keys, seen)
+    return keys[fresh] // m.n_items + first, keys[fresh] % m.n_items, scores[fresh]
+
+
+def build_recommendations(per_user=None, review_weight=None, progress=None):
+    # Full batch rebuild of user_recommendations; memory is bounded by MAX_PAIRS per pass rather
+    # than by the number of favorites, and each user chunk is written in its own transaction
+    per_user = per_user or app.config["RECOMMENDATIONS_PER_USER"]
+    review_weight = app.config["RECOMMENDATION_REVIEW_WEIGHT"] if review_weight is None else review_weight
+    stats = {"interactions": 0, "users": 0, "homes": 0, "recommendations": 0}
+    started = time.perf_counter()
+
+    with db.engine.connect() as connection:
+        interactions = Interactions.load(connection, review_weight)
+    stats.update(interactions=len(interactions), users=interactions.n_users, homes=interactions.n_items)
+    neighbours = item_neighbours(interactions)
+    if progress:
+        progress(f"Item neighbours for {interactions.n_items:,} homes ({time.perf_counter() - started:.1f}s)")
+
+    table = UserRecommendation.__table__
+    with db.engine.begin() as connection:
+        # Users without any interactions left get no recommendations
+        stored = np.array(connection.execute(select(table.c.user_id).distinct()).scalars().all(), dtype=np.int64)
+        inactive = stored[~np.isin(stored, interactions.user_ids)].tolist()
+        for start in range(0, len(inactive), READ_BATCH):
+            connection.execute(delete(table).where(table.c.user_id.in_(inactive[start : start + READ_BATCH])))
+
+    user_costs = np.bincount(
+        np.repeat(np.arange(interactions.n_users), np.diff(interactions.user_ptr)),
+        weights=np.diff(neighbours[0])[interactions.user_items],
+        minlength=interactions.n_users,
+    )
+    for first, last in _chunks(user_costs, MAX_PAIRS):
+        users, items, scores = _top_per_row(*user_scores(interactions, neighbours, first, last), per_user)
+        user_ids = interactions.user_ids[first:last].tolist()
+        starts = np.searchsorted(users, users, side="left")
+        values = [
+            {"user_id": int(interactions.user_ids[user]), "rank": int(rank), "home_id": int(interactions.home_ids[item]), "score": float(score)}
+            for user, rank, item, score in zip(users, np.arange(len(users)) - starts, items, scores)
+        ]
+        with db.engine.begin() as connection:
+            connection.execute(delete(table).where(table.c.user_id.in_(user_ids)))
+            if values:
+                connection.execute(table.insert(), values)
+        stats["recommendations"] += len(values)
+        if progress:
+            progress(f"{last:,}/{interactions.n_users:,} users ({time.perf_counter() - started:.1f}s)")
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+
+# Queries
+def recommended_homes(user_id, limit):
+    # [(home, score)] strongest first, leaving out homes the user has favorited since the last build
+    collections, favorites = FavoriteCollection.__table__, HomeFavorite.__table__
+    already_saved = (
+        exists()
+        .where(favorites.c.home_id == UserRecommendation.home_id)
+        .where(favorites.c.favorite_collection_id == collections.c.id, collections.c.user_id == user_id)
+    )
+    rows = db.session.execute(
+        select(Home, UserRecommendation.score)
+        .join(UserRecommendation, UserRecommendation.home_id == Home.id)
+        .where(UserRecommendation.user_id == user_id, Home.deleted_at.is_(None), ~already_saved)
+        .order_by(UserRecommendation.rank)
+        .limit(limit)
+    ).all()
+    return [(home, score) for home, score in rows]
@@ -0,0 +1,95 @@
+from sqlalchemy import String, literal, select, tuple_, type_coerce
+
+from config import db
+from models.review import Review
+from models.user import User
+from pagination import decode_cursor, encode_cursor
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Sort -> (keyset columns, descending); every order is one scan of a (home_id, ...) index on
+# reviews, forwards or backwards, so a page costs O(limit) however many reviews the home has
+SORTS = {
+    "newest": ((Review.created_at, Review.id), True),
+    "highest": ((Review.rating, Review.created_at, Review.id), True),
+    "lowest": ((Review.rating, Review.created_at, Review.id), False),
+}
+
+
+def parse_review_page(args):
+    sort = args.get("sort", "newest")
+    if sort not in SORTS:
+        raise ValueError(f"Sort must be one of: {', '.join(SORTS)}.")
+    try:
+        limit = int(args.get("limit", DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        raise ValueError("limit must be a number.")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"Limit must be between 1 and {MAX_PAGE_SIZE}.")
+    return sort, decode_cursor(args.get("cursor")), limit
+
+
+# created_at as the database stores it: SQLite keeps server_default timestamps as text without
+# microseconds, which a bound datetime (always rendered with them) would not compare equal to
+CREATED_KEY = type_coerce(Review.created_at, String).label("created_key")
+
+
+def _cursor_values(sort, cursor):
+    # The cursor holds the keyset of the last review served: [rating,] created_at, id
+    columns, _ = SORTS[sort]
+    try:
+        if len(cursor) != len(columns):
+            raise ValueError
+        *head, created_at, review_id = cursor
+        if not isinstance(created_at, str):
+            raise ValueError
+        return [*(int(value) for value in head), literal(created_at, String), int(review_id)]
+    except (TypeError, ValueError):
+        raise ValueError("Invalid cursor.")
+
+
+def review_page(home_id, sort="newest", cursor=None, limit=DEFAULT_PAGE_SIZE):
+    # One page of a home's reviews with each author's username, in a single query
+    columns, descending = SORTS[sort]
+    query = (
+        select(
+            Review.id,
+            Review.rating,
+            Review.review,
+            Review.created_at,
+            Review.home_id,
+            Review.user_id,
+            User.username,
+            CREATED_KEY,
+        )
+        .outerjoin(User, User.id == Review.user_id)
+        .where(Review.home_id == home_id)
+        .order_by(*(column.desc() if descending else column.asc() for column in columns))
+        .limit(limit + 1)
+    )
+    if cursor:
+        after = tuple_(*columns)
+        values = tuple_(*_cursor_values(sort, cursor))
+        query = query.where(after < values if descending else after > values)
+
+    rows = db.session.execute(query).all()
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        created_key = last.created_key if isinstance(last.created_key, str) else last.created_key.isoformat(" ")
+        next_cursor = encode_cursor(*([last.rating] if len(columns) == 3 else []), created_key, last.id)
+
+    reviews = [
+        {
+            "id": row.id,
+            "rating": row.rating,
+            "review": row.review,
+            "created_at": row.created_at.isoformat() if row.created_at else None,
+            "home_id": row.home_id,
+            "user_id": row.user_id,
+            "user": {"username": row.username},
+        }
+        for row in rows[:limit]
+    ]
+    return reviews, next_cursor
@@ -0,0 +1,52 @@
+import time
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+
+REPLICA = "replica"
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Set after a request writes: holds the time until which this client's reads stay on the
+# primary, so it sees its own writes while the replica catches up
+STICKY_COOKIE = "read_primary_until"
+
+
+# Bind Selection
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._reads_replica(clause):
+            return self._db.engines[REPLICA]
+        if bind is None and has_request_context() and (self._flushing or getattr(clause, "is_dml", False)):
+            g.wrote_primary = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reads_replica(self, clause):
+        # Plain SELECTs from a read-only request that has not written anything, on a session
+        # with nothing pending; everything else (flushes, DML, text()) goes to the primary
+        return (
+            getattr(clause, "is_select", False)
+            and has_request_context()
+            and request.method in READ_METHODS
+            and not g.get("wrote_primary")
+            and not _sticky()
+            and REPLICA in self._db.engines
+            and not self._flushing
+            and self._is_clean()
+        )
+
+
+def _sticky():
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+# Read-Your-Writes
+def stick_to_primary(response):
+    seconds = current_app.config["REPLICA_STICKY_SECONDS"]
+    if g.get("wrote_primary") and seconds and current_app.config["SQLALCHEMY_BINDS"].get(REPLICA):
+        response.set_cookie(
+            STICKY_COOKIE, str(time.time() + seconds), max_age=seconds, httponly=True, samesite="Lax"
+        )
+    return response
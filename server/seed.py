@@ -1,7 +1,6 @@
 #!/usr/bin/env python3
 
 import random
-import csv
 import sys
 
 # Remote library imports
@@ -9,8 +8,20 @@ from faker import Faker
 from rich import print
 
 # Local imports
-from server.config import db, app
-from models import Property, User, Review  # Adjust the import based on your project structure
+from config import db, app
+from models.user import User
+from models.home import Home
+from models.review import Review
+from models.favoritesCollection import FavoriteCollection
+from models.homeFavorite import HomeFavorite
+from models.similarHome import SimilarHome
+from models.similarHomeFit import SimilarHomeFit
+from models.userRecommendation import UserRecommendation
+from models.marketBucket import MarketBucket
+from models.marketHome import MarketHome
+import market  # noqa: F401 (its commit handler keeps the market summary current as homes load)
+from importer import import_homes, read_csv
+from passwords import hash_passwords
 
 fake = Faker()
 
@@ -22,8 +33,15 @@ def clear_tables():
         # Clean Database
         print('[purple]Cleaning Database 🧽 [/purple]...\n')
         try:
+            HomeFavorite.query.delete()
+            SimilarHome.query.delete()
+            SimilarHomeFit.query.delete()
+            UserRecommendation.query.delete()
+            MarketBucket.query.delete()
+            MarketHome.query.delete()
+            FavoriteCollection.query.delete()
             Review.query.delete()
-            Property.query.delete()
+            Home.query.delete()
             User.query.delete()
             db.session.commit()
             print('\t[green]Cleaning Complete[/green] ✅\n')
@@ -31,39 +49,11 @@ def clear_tables():
             print('[red]Cleaning Failed[/red] 😞', str(e), '\n')
             sys.exit(1)
 
-# Create Properties
-def load_properties(filename='properties.csv'):
-    with app.app_context():
-        print('[purple]Creating Properties 🏡[/purple] ...\n')
-        with open(filename, 'r', newline='', encoding='utf-8') as csvfile:
-            reader = csv.reader(csvfile)
-            next(reader)  # Skip header row
-            for row in reader:
-                try:
-                    # Adjust fields based on your CSV structure
-                    address, price, bedrooms, bathrooms, sq_ft, description = row
-                    property = Property(
-                        address=address,
-                        price=float(price),
-                        bedrooms=int(bedrooms),
-                        bathrooms=int(bathrooms),
-                        sq_ft=int(sq_ft),
-                        description=description
-                    )
-                    db.session.add(property)
-                except ValueError as ve:
-                    print(f"Error processing row {row}: {ve}")
-                    print('\t[red]Property Creation Failed[/red] 😞\n')
-                    sys.exit(1)
-            db.session.commit()
-            print('\t[green]Properties Created ✅[/green] \n')
-
 # Create Users
 def create_users():
     with app.app_context():
         print('[purple]Creating Users[/purple] 🧑🏻‍💻 ...\n')
         try:
-            users = []
             usernames = []
             emails = []
             for _ in range(20):
@@ -74,9 +64,12 @@ def create_users():
                     email = fake.email()
                 usernames.append(username)
                 emails.append(email)
-                user = User(username=username, email=email)
-                user.password_hash = user.username + 'Password1!'
-                users.append(user)
+            # All hashes are computed in one batch across the bcrypt process pool
+            hashes = hash_passwords([username + 'Password1!' for username in usernames])
+            users = [
+                User(username=username, email=email, _password_hash=password_hash)
+                for username, email, password_hash in zip(usernames, emails, hashes)
+            ]
             db.session.add_all(users)
             db.session.commit()
             print('\t[green]Users Created[/green] ✅ \n')
@@ -85,22 +78,30 @@ def create_users():
             print(e)
             sys.exit(1)
 
+# Create Homes
+def load_homes(filename='homes.csv'):
+    with app.app_context():
+        print('[purple]Creating Homes 🏡[/purple] ...\n')
+        host_ids = [id for (id,) in db.session.query(User.id)]
+        stats = import_homes(read_csv(filename), host_ids=host_ids)
+        for error in stats.errors:
+            print(f'\t[red]Skipped[/red] {error}')
+        print(f'\t[green]{stats.inserted} Homes Created ✅[/green] ({stats.rows_per_second:,.0f} rows/s)\n')
+
 # Create Reviews
 def create_reviews():
     with app.app_context():
         print('[purple]Creating Reviews[/purple] ✍🏽 ...\n')
-        
+
         try:
-            properties = Property.query.all()
-            users = User.query.all()
+            home_ids = [id for (id,) in db.session.query(Home.id)]
+            user_ids = [id for (id,) in db.session.query(User.id)]
             for _ in range(100):
-                property = random.choice(properties)
-                user = random.choice(users)
                 new_review = Review(
                     rating=random.randint(1, 5),
                     review=fake.paragraph(),
-                    user_id=user.id,
-                    property_id=property.id
+                    user_id=random.choice(user_ids),
+                    home_id=random.choice(home_ids)
                 )
                 db.session.add(new_review)
             db.session.commit()
@@ -112,6 +113,6 @@ def create_reviews():
 
 if __name__ == '__main__':
     clear_tables()
-    load_properties()
     create_users()
-    create_reviews()  # Include this if your app includes reviews
+    load_homes()
+    create_reviews()
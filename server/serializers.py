@@ -0,0 +1,171 @@
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from flask import current_app, stream_with_context
+from sqlalchemy import inspect
+from sqlalchemy.orm import RelationshipProperty, configure_mappers, joinedload, selectinload
+from sqlalchemy_serializer import SerializerMixin
+from sqlalchemy_serializer.lib.schema import Schema
+
+# orjson is optional; the stdlib encoder produces the same JSON, just slower
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+VALUE, ONE, MANY = 0, 1, 2
+MAX_DEPTH = 10
+SIMPLE_TYPES = (int, str, float, bool, type(None))
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+# Plan Compilation
+def _compile(model, schema, depth):
+    # Replays SerializerMixin.to_dict's schema resolution against the model class instead of an
+    # instance, so the walk over serialize_only/serialize_rules happens once rather than per object
+    if depth > MAX_DEPTH:
+        raise RecursionError(f"Serialization of {model.__name__} does not terminate; check its serialize_rules.")
+    schema.update(only=model.serialize_only, extend=model.serialize_rules)
+    mapper = inspect(model)
+    keys = schema.keys
+    if schema.is_greedy:
+        keys.update(attr.key for attr in mapper.attrs)
+
+    plan = []
+    for key in sorted(keys):
+        if not schema.is_included(key):
+            continue
+        prop = mapper.attrs.get(key)
+        if isinstance(prop, RelationshipProperty):
+            child = _compile(prop.mapper.class_, schema.fork(key), depth + 1)
+            plan.append((key, MANY if prop.uselist else ONE, child))
+        else:
+            plan.append((key, VALUE, None))
+    return tuple(plan)
+
+
+def compile_plan(model, only=(), rules=()):
+    schema = Schema()
+    schema.update(only=only, extend=rules)
+    return _compile(model, schema, 0)
+
+
+# Plan Execution
+def _convert(value):
+    if isinstance(value, SIMPLE_TYPES):
+        return value
+    elif isinstance(value, time):
+        return value.strftime(SerializerMixin.time_format)
+    elif isinstance(value, datetime):
+        return value.strftime(SerializerMixin.datetime_format)
+    elif isinstance(value, date):
+        return value.strftime(SerializerMixin.date_format)
+    elif isinstance(value, Decimal):
+        return SerializerMixin.decimal_format.format(value)
+    elif isinstance(value, dict):
+        return {key: _convert(item) for key, item in value.items()}
+    elif isinstance(value, (list, tuple, set)):
+        return [_convert(item) for item in value]
+    raise TypeError(f"Unserializable type: {type(value)}")
+
+
+def _run(plan, obj):
+    loaded = obj.__dict__
+    data = {}
+    for key, kind, child in plan:
+        # Loaded attributes are read straight from the instance dict, skipping the descriptor
+        value = loaded[key] if key in loaded else getattr(obj, key)
+        if kind == VALUE:
+            data[key] = value if type(value) in SIMPLE_TYPES else _convert(value)
+        elif kind == MANY:
+            data[key] = [_run(child, item) for item in value]
+        else:
+            data[key] = None if value is None else _run(child, value)
+    return data
+
+
+_plans = {}
+
+
+def get_plan(model, only=(), rules=()):
+    key = (model, tuple(only), tuple(rules))
+    if key not in _plans:
+        _plans[key] = compile_plan(model, only, rules)
+    return _plans[key]
+
+
+def to_dict(obj, only=(), rules=()):
+    return _run(get_plan(type(obj), only, rules), obj)
+
+
+def to_dicts(objs, only=(), rules=()):
+    objs = list(objs)
+    if not objs:
+        return []
+    plan = get_plan(type(objs[0]), only, rules)
+    return [_run(plan, obj) for obj in objs]
+
+
+# Loader Strategies
+def _loader_options(model, plan, joined, parent=None):
+    # Mirrors the plan: selectin loads for collections, joined loads for many-to-one
+    options = []
+    for key, kind, child in plan:
+        if kind == VALUE:
+            continue
+        attr = getattr(model, key)
+        selectin = kind == MANY or not joined
+        if parent is None:
+            loader = selectinload(attr) if selectin else joinedload(attr)
+        else:
+            loader = parent.selectinload(attr) if selectin else parent.joinedload(attr)
+        options.append(loader)
+        options += _loader_options(attr.property.mapper.class_, child, joined, loader)
+    return options
+
+
+def eager_options(model, only=(), rules=(), joined=True):
+    # Loads exactly the relationships the serializer will walk, in a fixed number of queries.
+    # joined=False uses selectin loads throughout, which (unlike joined loads) work with yield_per
+    return _loader_options(model, get_plan(model, only, rules), joined)
+
+
+# Encoding
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+
+def json_response(data, status=200, headers=None):
+    return current_app.response_class(dumps(data), status=status, headers=headers, mimetype="application/json")
+
+
+def iter_json(objs, only=(), rules=()):
+    # Encodes a JSON array row by row as objs is consumed, flushing in STREAM_CHUNK_SIZE chunks
+    buffer = bytearray(b"[")
+    plan = None
+    for obj in objs:
+        if plan is None:
+            plan = get_plan(type(obj), only, rules)
+        else:
+            buffer += b","
+        buffer += dumps(_run(plan, obj))
+        if len(buffer) >= STREAM_CHUNK_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    buffer += b"]"
+    yield bytes(buffer)
+
+
+def stream_response(objs, status=200, headers=None, only=(), rules=()):
+    # objs may be a lazy query (e.g. with yield_per); the request context stays open until the body is sent
+    body = stream_with_context(iter_json(objs, only, rules))
+    return current_app.response_class(body, status=status, headers=headers, mimetype="application/json")
+
+
+def warm_plans(*models):
+    configure_mappers()
+    for model in models:
+        get_plan(model)
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# Production server: the same Flask app on gevent's WSGI server, one greenlet per connection, so a
+# request waiting on the database or Cloudinary no longer holds a whole thread.
+#   python serve.py                # PORT (default 5555), HOST (default 0.0.0.0)
+#   gunicorn -c gunicorn.conf.py   # the same model with several worker processes
+# app.py's `app.run(debug=True)` stays the development server.
+
+# Patch before anything else imports socket, threading or time
+from gevent import monkey
+
+monkey.patch_all()
+
+import os
+import socket
+
+from gevent.pool import Pool
+from gevent.pywsgi import WSGIServer
+
+from app import app
+
+
+class Server(WSGIServer):
+    def handle(self, sock, address):
+        # pywsgi sends headers and body in separate writes; with Nagle on, the body of every
+        # keep-alive response after the first waits out the client's delayed ACK (~40ms)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        super().handle(sock, address)
+
+
+def main():
+    host, port = os.environ.get("HOST", "0.0.0.0"), int(os.environ.get("PORT", 5555))
+    # The pool bounds concurrent connections; beyond it, new ones wait in the listen backlog
+    server = Server((host, port), app, spawn=Pool(app.config["GEVENT_MAX_CONNECTIONS"]), log=None)
+    app.logger.info("Serving on %s:%s with gevent", host, port)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+
+from flask_session import Session
+from flask_session.defaults import Defaults
+from flask_session.sqlalchemy import SqlAlchemySessionInterface
+from sqlalchemy import Column, DateTime, Integer, String, Table, delete, insert, select, update
+
+# data: serialized session, expiry: effective expiry, stored_expiry: expiry last written to the table
+CacheEntry = namedtuple("CacheEntry", "data expiry stored_expiry cached_at")
+
+
+class SessionCache:
+    # Thread-safe LRU; entries older than `ttl` seconds are re-read from the table. Sessions that
+    # other workers destroy or rewrite are evicted sooner, through the invalidation log.
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry.cached_at > self.ttl:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, data, expiry, stored_expiry):
+        with self.lock:
+            self.entries[key] = CacheEntry(data, expiry, stored_expiry, time.monotonic())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+def create_invalidation_table(client, name):
+    # One row per session destroyed or rewritten, so every worker can drop its cached copy
+    if name in client.metadata.tables:
+        return client.metadata.tables[name]
+    return Table(
+        name,
+        client.metadata,
+        Column("id", Integer, primary_key=True),
+        Column("session_id", String(255), nullable=False),
+        Column("created_at", DateTime, nullable=False, index=True),
+    )
+
+
+class CachedSqlAlchemySessionInterface(SqlAlchemySessionInterface):
+    # Invalidations are re-read for this long, which covers commits that land out of id order
+    # and clock skew between workers; re-reading one only costs a duplicate eviction check
+    INVALIDATION_WINDOW = timedelta(seconds=10)
+
+    def __init__(
+        self, app, cache_size, cache_ttl, write_back_interval, purge_interval, invalidation_poll, invalidation_table, **kwargs
+    ):
+        super().__init__(app, **kwargs)
+        self.cache = SessionCache(cache_size, cache_ttl)
+        self.write_back_interval = timedelta(seconds=write_back_interval)
+        self.purge_interval = purge_interval
+        self.invalidations = create_invalidation_table(self.client, invalidation_table)
+        with app.app_context():
+            self.invalidations.create(bind=self.client.engine, checkfirst=True)
+        self.invalidation_poll = invalidation_poll
+        self._polled_at = None
+        self._poll_lock = threading.Lock()
+        self._seen_invalidations = {}
+        self._purger = None
+        self._stats_lock = threading.Lock()
+        self.stats = dict.fromkeys(("hits", "misses", "writes", "deferred_writes", "invalidated", "purged"), 0)
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def cache_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["size"] = len(self.cache.entries)
+        return stats
+
+    # Invalidation
+    def _invalidate(self, store_id):
+        # Part of the caller's transaction: the other workers only see it once the change commits.
+        # This worker already has the new state, so it marks the row as seen.
+        result = self.client.session.execute(
+            insert(self.invalidations).values(session_id=store_id, created_at=datetime.utcnow())
+        )
+        with self._poll_lock:
+            self._seen_invalidations[result.inserted_primary_key[0]] = time.monotonic()
+
+    def _sync_invalidations(self):
+        # Evicts sessions other workers destroyed (logout, account deletion) or rewrote, at most
+        # invalidation_poll seconds after the fact instead of a full cache TTL. One query per poll.
+        now = time.monotonic()
+        if self._polled_at is not None and now - self._polled_at < self.invalidation_poll:
+            return
+        if not self._poll_lock.acquire(blocking=False):
+            return
+        try:
+            self._polled_at = now
+            since = datetime.utcnow() - self.INVALIDATION_WINDOW - timedelta(seconds=self.invalidation_poll)
+            table = self.invalidations
+            rows = self.client.session.execute(
+                select(table.c.id, table.c.session_id).where(table.c.created_at >= since),
+                bind_arguments={"bind": self.client.engine},
+            ).all()
+            seen = self._seen_invalidations
+            for id, session_id in rows:
+                if id not in seen:
+                    self.cache.pop(session_id)
+                    self._count("invalidated")
+                seen[id] = now
+            for id in [id for id, polled_at in seen.items() if polled_at != now]:
+                del seen[id]
+        finally:
+            self._poll_lock.release()
+
+    # Storage
+    def _retrieve_session_data(self, store_id):
+        self._start_purger()
+        self._sync_invalidations()
+        now = datetime.utcnow()
+        entry = self.cache.get(store_id)
+        if entry and entry.expiry > now:
+            self._count("hits")
+            return self.serializer.decode(entry.data)
+
+        self._count("misses")
+        table = self.sql_session_model.__table__
+        # Always read from the primary: a session written at login must be visible on the next request
+        row = self.client.session.execute(
+            select(table.c.data, table.c.expiry).where(table.c.session_id == store_id),
+            bind_arguments={"bind": self.client.engine},
+        ).first()
+        if row is None:
+            return None
+        if row.expiry is None or row.expiry <= now:
+            self._delete_session(store_id)
+            return None
+        self.cache.put(store_id, row.data, row.expiry, row.expiry)
+        return self.serializer.decode(row.data)
+
+    def _upsert_session(self, session_lifetime, session, store_id):
+        expiry = datetime.utcnow() + session_lifetime
+        data = self.serializer.encode(session)
+
+        # Lazy write-back: an unchanged session only needs its expiry pushed forward,
+        # which is kept in memory until it drifts more than write_back_interval from the table
+        entry = self.cache.get(store_id)
+        if entry and entry.data == data and expiry - entry.stored_expiry < self.write_back_interval:
+            self.cache.put(store_id, data, expiry, entry.stored_expiry)
+            self._count("deferred_writes")
+            return
+
+        # Write-through: one UPDATE for known sessions, INSERT only when nothing matched
+        table = self.sql_session_model.__table__
+        try:
+            result = self.client.session.execute(
+                update(table).where(table.c.session_id == store_id).values(data=data, expiry=expiry)
+            )
+            if result.rowcount == 0:
+                self.client.session.execute(insert(table).values(session_id=store_id, data=data, expiry=expiry))
+            elif entry is None or entry.data != data:
+                # Other workers may hold the old data (a logout that kept other keys, say)
+                self._invalidate(store_id)
+            self.client.session.commit()
+        except Exception:
+            self.client.session.rollback()
+            raise
+        self.cache.put(store_id, data, expiry, expiry)
+        self._count("writes")
+
+    def _delete_session(self, store_id):
+        self.cache.pop(store_id)
+        table = self.sql_session_model.__table__
+        try:
+            self.client.session.execute(delete(table).where(table.c.session_id == store_id))
+            self._invalidate(store_id)
+            self.client.session.commit()
+        except Exception:
+            self.client.session.rollback()
+            raise
+
+    # Expired Rows
+    def _delete_expired_sessions(self):
+        table = self.sql_session_model.__table__
+        # An invalidation is useless once every entry cached before it has outlived the TTL
+        stale = datetime.utcnow() - max(timedelta(seconds=self.cache.ttl), self.INVALIDATION_WINDOW) * 2
+        try:
+            result = self.client.session.execute(delete(table).where(table.c.expiry <= datetime.utcnow()))
+            self.client.session.execute(delete(self.invalidations).where(self.invalidations.c.created_at < stale))
+            self.client.session.commit()
+        except Exception:
+            self.client.session.rollback()
+            raise
+        self._count("purged", result.rowcount)
+
+    def _purge_forever(self):
+        while True:
+            time.sleep(self.purge_interval)
+            try:
+                with self.app.app_context():
+                    self._delete_expired_sessions()
+            except Exception:
+                self.app.logger.exception("Expired session purge failed")
+
+    def _start_purger(self):
+        # Started on first use rather than at import so CLI commands don't spawn it
+        if self._purger is None and self.purge_interval:
+            self._purger = threading.Thread(target=self._purge_forever, name="session-purge", daemon=True)
+            self._purger.start()
+
+
+class CachedSession(Session):
+    def _get_interface(self, app):
+        config = app.config
+        if config.get("SESSION_TYPE") != "sqlalchemy" or not config.get("SESSION_CACHE_SIZE"):
+            return super()._get_interface(app)
+        return CachedSqlAlchemySessionInterface(
+            app=app,
+            client=config["SESSION_SQLALCHEMY"],
+            table=config.get("SESSION_SQLALCHEMY_TABLE", Defaults.SESSION_SQLALCHEMY_TABLE),
+            key_prefix=config.get("SESSION_KEY_PREFIX", Defaults.SESSION_KEY_PREFIX),
+            use_signer=config.get("SESSION_USE_SIGNER", Defaults.SESSION_USE_SIGNER),
+            permanent=config.get("SESSION_PERMANENT", Defaults.SESSION_PERMANENT),
+            sid_length=config.get("SESSION_ID_LENGTH", Defaults.SESSION_ID_LENGTH),
+            serialization_format=config.get("SESSION_SERIALIZATION_FORMAT", Defaults.SESSION_SERIALIZATION_FORMAT),
+            cache_size=config["SESSION_CACHE_SIZE"],
+            cache_ttl=config["SESSION_CACHE_TTL"],
+            write_back_interval=config["SESSION_WRITE_BACK_INTERVAL"],
+            purge_interval=config["SESSION_PURGE_INTERVAL"],
+            invalidation_poll=config["SESSION_INVALIDATION_POLL"],
+            invalidation_table=config["SESSION_INVALIDATION_TABLE"],
+        )
@@ -0,0 +1,426 @@
+import atexit
+import math
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from sqlalchemy import delete, func, or_, select
+
+from config import app, db
+from green import run_native
+from models.home import Home
+from models.similarHome import SimilarHome
+from models.similarHomeFit import SimilarHomeFit
+from model_events import on_commit
+
+# NumPy is optional: without it the lookup table is neither built nor refreshed, and
+# /homes/<id>/similar serves whatever it already holds
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+NUMERIC = ("price_per_night", "total_bedrooms", "total_bathrooms", "max_guests")
+# Each block is scaled to roughly unit norm before the weights apply, so one block can't
+# drown the others just by having more columns
+WEIGHTS = {"numeric": 1.0, "home_type": 1.0, "location": 1.0, "amenities": 0.75}
+MAX_LOCATIONS = 256
+MAX_AMENITIES = 64
+# Rows scored per matrix product: BATCH_SIZE x homes float32 scores in memory at a time, fewer
+# once that would pass SCORE_MEMORY bytes (16 rows at a million homes)
+BATCH_SIZE = 256
+SCORE_MEMORY = 64 * 1024 * 1024
+# Candidate rows whose stored k-th score is read per query
+FLOOR_CHUNK = 1000
+
+
+# Feature Vectors
+def amenity_tokens(amenities):
+    return {token.strip().lower() for token in (amenities or "").split(",") if token.strip()}
+
+
+def _vocabulary(values, limit):
+    return [value for value, _ in Counter(value for value in values if value).most_common(limit)]
+
+
+def _numeric(rows):
+    # Prices are compared on a log scale; missing values are NaN
+    numeric = np.array([[getattr(row, column) for column in NUMERIC] for row in rows], dtype=np.float64)
+    numeric[:, 0] = np.log1p(numeric[:, 0])
+    return numeric
+
+
+def _home_rows(connection, *conditions):
+    homes = Home.__table__
+    return connection.execute(
+        select(homes.c.id, *[homes.c[column] for column in NUMERIC], homes.c.home_type, homes.c.location, homes.c.amenities)
+        .where(homes.c.deleted_at.is_(None), *conditions)
+        .order_by(homes.c.id)
+    ).all()
+
+
+class HomeFit:
+    # The transform from a homes row to its feature vector: column statistics and vocabularies
+    # fitted by a full build and stored with it (similar_home_fits), so every refresh until the
+    # next build scores homes exactly as the stored lists were scored
+    def __init__(self, means, stds, home_types, locations, amenities, id=None):
+        self.id = id
+        self.means, self.stds = means, stds
+        self.home_types, self.locations, self.amenities = home_types, locations, amenities
+        self.codes = {
+            name: {value: code for code, value in enumerate(values)}
+            for name, values in (("home_type", home_types), ("location", locations), ("amenities", amenities))
+        }
+        self.width = len(NUMERIC) + len(home_types) + len(locations) + len(amenities)
+
+    @classmethod
+    def fit(cls, rows):
+        means, stds = [], []
+        for column in _numeric(rows).T:
+            known = column[~np.isnan(column)]
+            means.append(float(known.mean()) if len(known) else 0.0)
+            stds.append(float(known.std()) if len(known) else 0.0)
+        return cls(
+            means,
+            [std or 1.0 for std in stds],
+            _vocabulary([row.home_type for row in rows], None),
+            _vocabulary([row.location for row in rows], MAX_LOCATIONS),
+            _vocabulary([token for row in rows for token in amenity_tokens(row.amenities)], MAX_AMENITIES),
+        )
+
+    @property
+    def params(self):
+        return {
+            "means": self.means,
+            "stds": self.stds,
+            "home_types": self.home_types,
+            "locations": self.locations,
+            "amenities": self.amenities,
+        }
+
+    @classmethod
+    def from_params(cls, params, id=None):
+        return cls(**params, id=id)
+
+    def _one_hot(self, name, values):
+        codes = self.codes[name]
+        block = np.zeros((len(values), len(codes)), dtype=np.float32)
+        rows = [row for row, value in enumerate(values) if value in codes]
+        block[rows, [codes[values[row]] for row in rows]] = 1
+        return block
+
+    def _multi_hot(self, token_sets):
+        codes = self.codes["amenities"]
+        block = np.zeros((len(token_sets), len(codes)), dtype=np.float32)
+        for row, tokens in enumerate(token_sets):
+            if present := [codes[token] for token in tokens if token in codes]:
+                block[row, present] = 1 / math.sqrt(len(present))
+        return block
+
+    def transform(self, rows):
+        # Unit-length vectors, so a dot product is a cosine similarity. Each block is scaled to
+        # roughly unit norm before the weights apply; missing numbers sit at the fitted mean.
+        if not rows:
+            return np.zeros((0, self.width), dtype=np.float32)
+        means = np.array(self.means)
+        numeric = _numeric(rows)
+        numeric = np.where(np.isnan(numeric), means, numeric)
+        numeric = (numeric - means) / np.array(self.stds) / math.sqrt(len(NUMERIC))
+        matrix = np.hstack(
+            [
+                WEIGHTS["numeric"] * numeric.astype(np.float32),
+                WEIGHTS["home_type"] * self._one_hot("home_type", [row.home_type for row in rows]),
+                WEIGHTS["location"] * self._one_hot("location", [row.location for row in rows]),
+                WEIGHTS["amenities"] * self._multi_hot([amenity_tokens(row.amenities) for row in rows]),
+            ]
+        )
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+
+class HomeVectors:
+    def __init__(self, fit, ids, matrix):
+        self.fit = fit
+        self.size = len(ids)
+        self.ids = ids
+        self.matrix = matrix
+        self.alive = np.ones(len(ids), dtype=bool)
+        self.rows = {int(home_id): row for row, home_id in enumerate(ids)}
+
+    @classmethod
+    def load(cls, connection, fit=None):
+        # Vectors for every live home; fits the transform on them unless one is given
+        rows = _home_rows(connection)
+        fit = fit or HomeFit.fit(rows)
+        return cls(fit, np.array([row.id for row in rows], dtype=np.int64), fit.transform(rows))
+
+    def _grow(self):
+        # Amortised doubling, so appending new homes stays O(1) per row
+        capacity = max(len(self.ids) * 2, 16)
+        ids, matrix, alive = self.ids, self.matrix, self.alive
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.matrix = np.zeros((capacity, self.fit.width), dtype=np.float32)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.ids[: self.size], self.matrix[: self.size], self.alive[: self.size] = ids[: self.size], matrix[: self.size], alive[: self.size]
+
+    def update(self, rows, gone):
+        # Re-vectorises changed homes in place with the same fit and appends new ones; removed
+        # homes stay behind as dead rows, which never score
+        for row, vector in zip(rows, self.fit.transform(rows)):
+            index = self.rows.get(row.id)
+            if index is None:
+                if self.size == len(self.ids):
+                    self._grow()
+                index = self.rows[row.id] = self.size
+                self.ids[index] = row.id
+                self.size += 1
+            self.matrix[index] = vector
+            self.alive[index] = True
+        for home_id in gone:
+            if (index := self.rows.pop(home_id, None)) is not None:
+                self.alive[index] = False
+                self.matrix[index] = 0
+
+    def scores(self, rows):
+        # len(rows) x homes cosine similarities; a home's similarity to itself and to dead rows
+        # is masked out
+        scores = self.matrix[rows] @ self.matrix[: self.size].T
+        scores[:, ~self.alive[: self.size]] = -np.inf
+        scores[np.arange(len(rows)), rows] = -np.inf
+        return scores
+
+    def neighbours(self, rows, k):
+        # Top-k (rows, scores) for each of `rows`, best first
+        k = min(k, int(self.alive[: self.size].sum()) - 1)
+        scores = self.scores(rows)
+        if k <= 0:
+            return np.zeros((len(rows), 0), dtype=np.int64), np.zeros((len(rows), 0), dtype=np.float32)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+# Lookup Table
+def _batch_size(vectors):
+    return max(1, min(BATCH_SIZE, SCORE_MEMORY // (4 * max(vectors.size, 1))))
+
+
+def _write_neighbours(connection, vectors, rows, k):
+    table = SimilarHome.__table__
+    batch_size = _batch_size(vectors)
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start : start + batch_size]
+        neighbours, scores = vectors.neighbours(batch, k)
+        home_ids = vectors.ids[batch].tolist()
+        values = [
+            {"home_id": home_id, "rank": rank, "similar_home_id": int(vectors.ids[neighbour]), "score": float(score)}
+            for home_id, row_neighbours, row_scores in zip(home_ids, neighbours, scores)
+            for rank, (neighbour, score) in enumerate(zip(row_neighbours, row_scores))
+        ]
+        connection.execute(delete(table).where(table.c.home_id.in_(home_ids)))
+        if values:
+            connection.execute(table.insert(), values)
+
+
+def build_similar_homes(k=None, progress=None):
+    # Full rebuild: fits a new transform, stores it, then scores every live home against all
+    # others, a batch of rows per matrix product and one transaction per chunk of homes
+    k = k or app.config["SIMILAR_HOMES_K"]
+    table, fits = SimilarHome.__table__, SimilarHomeFit.__table__
+    with db.engine.connect() as connection:
+        vectors = HomeVectors.load(connection)
+    homes = Home.__table__
+    with db.engine.begin() as connection:
+        live = select(homes.c.id).where(homes.c.deleted_at.is_(None))
+        connection.execute(delete(table).where(table.c.home_id.not_in(live)))
+        # Inserted before the old fit goes, so fit ids keep rising (SQLite reuses the max id
+        # of an emptied table) and refreshing processes always see a new one
+        fit_id = connection.execute(fits.insert().values(k=k, params=vectors.fit.params)).inserted_primary_key[0]
+        connection.execute(delete(fits).where(fits.c.id < fit_id))
+    chunk = BATCH_SIZE * 16
+    for start in range(0, vectors.size, chunk):
+        with db.engine.begin() as connection:
+            _write_neighbours(connection, vectors, np.arange(start, min(start + chunk, vectors.size)), k)
+        if progress:
+            progress(min(start + chunk, vectors.size), vectors.size)
+    return vectors.size
+
+
+# Incremental Refresh
+_vectors = None
+# (max id, max updated_at) of the homes table when _vectors was last brought up to date
+_seen = None
+
+
+def _chunks(ids, size=1000):
+    for start in range(0, len(ids), size):
+        yield ids[start : start + size]
+
+
+def _table_state(connection):
+    # Two index lookups: new homes raise the max id, edits and soft deletes the max updated_at
+    homes = Home.__table__
+    return tuple(connection.execute(select(func.max(homes.c.id), func.max(homes.c.updated_at))).one())
+
+
+def _catch_up(connection, vectors, seen_id, seen_at):
+    # Re-vectorises homes other processes added, edited or removed since the vectors were last
+    # synced. Their lists were rewritten by the refresh of the process that changed them; this
+    # only keeps the vectors this process scores its own changes against current. updated_at has
+    # one-second resolution on some databases, so homes from the last second seen are read again.
+    homes = Home.__table__
+    since = homes.c.updated_at.isnot(None) if seen_at is None else homes.c.updated_at >= seen_at - timedelta(seconds=1)
+    changed = or_(homes.c.id > (seen_id or 0), since)
+    rows = _home_rows(connection, changed)
+    gone = connection.execute(select(homes.c.id).where(changed, homes.c.deleted_at.isnot(None))).scalars().all()
+    vectors.update(rows, gone)
+
+
+def _cached_vectors(connection):
+    # (vectors, k) of the last build. The vectors are kept between refreshes and loaded in full
+    # only on the first refresh in a process and after a new build; in between, homes changed by
+    # other processes are folded in before each refresh. (None, None) if never built.
+    global _vectors, _seen
+    fits = SimilarHomeFit.__table__
+    fit = connection.execute(select(fits.c.id, fits.c.k, fits.c.params).order_by(fits.c.id.desc()).limit(1)).first()
+    if fit is None:
+        return None, None
+    # Read first, so a home committed while the vectors load is picked up again next time
+    state = _table_state(connection)
+    if _vectors is None or _vectors.fit.id != fit.id:
+        _vectors = HomeVectors.load(connection, HomeFit.from_params(fit.params, id=fit.id))
+    elif state != _seen:
+        _catch_up(connection, _vectors, *_seen)
+    _seen = state
+    return _vectors, fit.k
+
+
+def _lists_entered(connection, vectors, best, k):
+    # Rows whose list a changed home now belongs in: its score beats the list's k-th score. The
+    # lowest k-th score of any list (one index lookup) rules most rows out, and only the floors of
+    # the rows left are read. Lists shorter than k only exist while there are at most k homes,
+    # when no list has a k-th score and every row is a candidate.
+    table = SimilarHome.__table__
+    lowest = connection.execute(select(func.min(table.c.score)).where(table.c.rank == k - 1)).scalar()
+    candidates = np.flatnonzero(best > (-np.inf if lowest is None else lowest))
+    entered = []
+    for start in range(0, len(candidates), FLOOR_CHUNK):
+        rows = candidates[start : start + FLOOR_CHUNK]
+        home_ids = vectors.ids[rows].tolist()
+        floors = {
+            home_id: floor if count >= k else -np.inf
+            for home_id, count, floor in connection.execute(
+                select(table.c.home_id, func.count(), func.min(table.c.score))
+                .where(table.c.home_id.in_(home_ids))
+                .group_by(table.c.home_id)
+            )
+        }
+        # Rows without a list (not built yet) are left to build_similar_homes
+        entered += [row for row, home_id in zip(rows.tolist(), home_ids) if home_id in floors and best[row] > floors[home_id]]
+    return entered
+
+
+def refresh_similar_homes(home_ids, k=None):
+    # Incremental refresh after homes change: re-vectorises just the changed homes with the
+    # build's fit, then recomputes their own lists, the lists that mention them (their scores
+    # moved, or they are gone) and the lists they now enter.
+    table = SimilarHome.__table__
+    changed = set(home_ids)
+    with db.engine.begin() as connection:
+        vectors, built_k = _cached_vectors(connection)
+        if vectors is None:
+            return 0
+        k = k or built_k
+        homes = Home.__table__
+        rows = [row for chunk in _chunks(sorted(changed)) for row in _home_rows(connection, homes.c.id.in_(chunk))]
+        vectors.update(rows, changed - {row.id for row in rows})
+
+        live = np.array(sorted(vectors.rows[home_id] for home_id in changed if home_id in vectors.rows), dtype=np.int64)
+        gone = [home_id for home_id in changed if home_id not in vectors.rows]
+
+        stale = set(live.tolist())
+        for (home_id,) in connection.execute(select(table.c.home_id).where(table.c.similar_home_id.in_(changed)).distinct()):
+            if home_id in vectors.rows:
+                stale.add(vectors.rows[home_id])
+
+        if len(live):
+            best = np.full(vectors.size, -np.inf, dtype=np.float32)
+            batch_size = _batch_size(vectors)
+            for start in range(0, len(live), batch_size):
+                np.maximum(best, vectors.scores(live[start : start + batch_size]).max(axis=0), out=best)
+            stale.update(_lists_entered(connection, vectors, best, k))
+
+        if gone:
+            connection.execute(delete(table).where(table.c.home_id.in_(gone)))
+        _write_neighbours(connection, vectors, np.array(sorted(stale), dtype=np.int64), k)
+    return len(stale)
+
+
+# Background Refresh
+_pending = set()
+_pending_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_wakeup = threading.Event()
+_worker = None
+
+
+def _refresh(home_ids):
+    with app.app_context():
+        refresh_similar_homes(home_ids)
+
+
+def _drain():
+    with _pending_lock:
+        home_ids = set(_pending)
+        _pending.clear()
+    if home_ids:
+        with _refresh_lock:
+            run_native(_refresh, home_ids)
+
+
+def _refresh_forever():
+    while True:
+        _wakeup.wait()
+        # Let a burst of commits (a feed sync, say) collect into one refresh
+        time.sleep(app.config["SIMILAR_HOMES_REFRESH_DELAY"])
+        _wakeup.clear()
+        try:
+            _drain()
+        except Exception:
+            app.logger.exception("Similar homes refresh failed")
+
+
+def queue_refresh(upserts, deleted):
+    global _worker
+    if np is None or not app.config["SIMILAR_HOMES_REFRESH"]:
+        return
+    with _pending_lock:
+        _pending.update(upserts)
+        _pending.update(deleted)
+        if _worker is None and not app.config["JOBS_EAGER"]:
+            _worker = threading.Thread(target=_refresh_forever, name="similar-homes", daemon=True)
+            _worker.start()
+    if app.config["JOBS_EAGER"]:
+        _drain()
+    else:
+        _wakeup.set()
+
+
+on_commit(Home, queue_refresh)
+# Short-lived processes (CLI imports and syncs) finish their refresh before exiting
+atexit.register(_drain)
+
+
+# Queries
+def similar_homes(home_id, limit):
+    # [(home, score)] nearest first; a single indexed lookup
+    rows = db.session.execute(
+        select(Home, SimilarHome.score)
+        .join(SimilarHome, SimilarHome.similar_home_id == Home.id)
+        .where(SimilarHome.home_id == home_id, Home.deleted_at.is_(None))
+        .order_by(SimilarHome.rank)
+        .limit(limit)
+    ).all()
+    return [(home, score) for home, score in rows]
@@ -0,0 +1,131 @@
+import os
+import sys
+import tempfile
+
+import pytest
+from flask.testing import FlaskClient
+
+# config reads the environment at import time, so it is set before anything imports the app
+DATABASE_DIR = tempfile.mkdtemp(prefix="dreamhome-tests-")
+os.environ["DATABASE_URI"] = f"sqlite:///{os.path.join(DATABASE_DIR, 'test.db')}"
+os.environ.setdefault("SESSION_SECRET", "test")
+os.environ["BCRYPT_POOL_WORKERS"] = "0"
+os.environ["BCRYPT_LOG_ROUNDS"] = "4"
+os.environ["SIMILAR_HOMES_REFRESH"] = "false"
+os.environ["JOBS_EAGER"] = "true"
+os.environ["HOME_FILTER_ENGINE"] = "false"
+os.environ["HOME_TEXT_INDEX"] = "false"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as _  # noqa: E402,F401 (registers every model and route)
+import filter_engine  # noqa: E402
+import model_events  # noqa: E402
+import text_index  # noqa: E402
+from config import app, db  # noqa: E402
+from models.favoritesCollection import FavoriteCollection  # noqa: E402
+from models.home import Home  # noqa: E402
+from models.user import User  # noqa: E402
+
+PASSWORD = "password123"
+
+
+class RequestClient(FlaskClient):
+    # A request would otherwise reuse the test's app context, and with it the test's session and
+    # identity map; each one gets its own, as it would in a server. Streamed bodies are read
+    # before that context closes, the way a server sends them.
+    def open(self, *args, **kwargs):
+        kwargs.setdefault("buffered", True)
+        with app.app_context():
+            return super().open(*args, **kwargs)
+
+
+app.testing = True
+app.test_client_class = RequestClient
+with app.app_context():
+    db.create_all()
+
+
+# Database
+@pytest.fixture(autouse=True)
+def database(monkeypatch):
+    # Each test starts from empty tables and fresh in-process indexes
+    monkeypatch.setattr(filter_engine, "_engine", None)
+    monkeypatch.setattr(text_index, "_index", None)
+    monkeypatch.setattr(model_events, "_handlers", {model: list(handlers) for model, handlers in model_events._handlers.items()})
+    with app.app_context():
+        yield db
+        db.session.remove()
+        with db.engine.begin() as connection:
+            for table in reversed(db.metadata.sorted_tables):
+                connection.execute(table.delete())
+
+
+@pytest.fixture(params=[False, True], ids=["sql", "filter_engine"])
+def search_backend(request, monkeypatch):
+    # /homes served from SQL, then from the NumPy filter engine
+    monkeypatch.setitem(app.config, "HOME_FILTER_ENGINE", request.param)
+    return request.param
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+# Factories
+@pytest.fixture
+def make_user():
+    def make(username, **values):
+        user = User(username=username, email=f"{username}@example.com", **values)
+        user.password_hash = PASSWORD
+        db.session.add(user)
+        db.session.commit()
+        return user
+
+    return make
+
+
+@pytest.fixture
+def make_home():
+    def make(**values):
+        home = Home(
+            **{
+                "title": "Sunny cottage",
+                "description": "A quiet place to stay near the lake",
+                "home_type": "house",
+                "max_guests": 4,
+                "total_bedrooms": 2,
+                "total_bathrooms": 1,
+                "location": "Chicago",
+                "amenities": "wifi, parking",
+                "price_per_night": 120.0,
+                **values,
+            }
+        )
+        db.session.add(home)
+        db.session.commit()
+        return home
+
+    return make
+
+
+@pytest.fixture
+def make_collection():
+    def make(user, name="My Stack"):
+        collection = FavoriteCollection(name=name, user_id=user.id)
+        db.session.add(collection)
+        db.session.commit()
+        return collection
+
+    return make
+
+
+@pytest.fixture
+def login(client):
+    def log_in(user):
+        response = client.post("/login", data={"email": user.email, "_password_hash": PASSWORD})
+        assert response.status_code == 200, response.get_json()
+        return response
+
+    return log_in
@@ -0,0 +1,78 @@
+import gzip
+import json
+
+import pytest
+
+import compression
+
+
+@pytest.fixture
+def listing(make_home):
+    # Enough homes that the page is well past COMPRESS_MIN_SIZE
+    for n in range(30):
+        make_home(title=f"Sunny cottage {n}", price_per_night=100.0 + n)
+
+
+def decode(response):
+    encoding = response.headers.get("Content-Encoding")
+    if encoding == "gzip":
+        return json.loads(gzip.decompress(response.data))
+    if encoding == "br":
+        return json.loads(compression.brotli.decompress(response.data))
+    return json.loads(response.data)
+
+
+# Negotiation
+def test_gzip_is_used_when_accepted(client, listing):
+    plain = client.get("/homes?limit=30")
+    response = client.get("/homes?limit=30", headers={"Accept-Encoding": "gzip, deflate"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert len(response.data) < len(plain.data)
+    assert decode(response) == decode(plain)
+    assert response.headers["ETag"].startswith('W/"')
+
+
+def test_identity_without_an_accepted_encoding(client, listing):
+    for headers in ({}, {"Accept-Encoding": "identity"}, {"Accept-Encoding": "gzip;q=0"}):
+        response = client.get("/homes?limit=30", headers=headers)
+        assert "Content-Encoding" not in response.headers
+        assert "Accept-Encoding" in response.headers["Vary"]
+
+
+def test_brotli_is_preferred_when_installed(client, listing):
+    pytest.importorskip("brotli")
+    response = client.get("/homes?limit=30", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["Content-Encoding"] == "br"
+    assert len(decode(response)) == 30
+
+
+def test_brotli_is_not_offered_without_the_package(client, listing, monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert client.get("/homes?limit=30", headers={"Accept-Encoding": "br"}).headers.get("Content-Encoding") is None
+    assert client.get("/homes?limit=30", headers={"Accept-Encoding": "br, gzip"}).headers["Content-Encoding"] == "gzip"
+
+
+# Size Threshold
+def test_small_bodies_are_not_compressed(client, make_home):
+    home_id = make_home().id
+    response = client.get(f"/homes/{home_id}", headers={"Accept-Encoding": "gzip"})
+    assert len(response.data) < client.application.config["COMPRESS_MIN_SIZE"]
+    assert "Content-Encoding" not in response.headers
+    assert response.get_json()["id"] == home_id
+
+
+def test_not_modified_responses_are_left_alone(client, listing):
+    etag = client.get("/homes?limit=30").headers["ETag"]
+    response = client.get("/homes?limit=30", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 304 and "Content-Encoding" not in response.headers
+
+
+# Streaming
+def test_a_streamed_listing_decodes_to_the_buffered_one(client, listing):
+    buffered = client.get("/homes?limit=30").get_json()
+    streamed = client.get("/homes?limit=30&stream=1")
+    compressed = client.get("/homes?limit=30&stream=1", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in streamed.headers and "Content-Length" not in streamed.headers
+    assert compressed.headers["Content-Encoding"] == "gzip" and "Content-Length" not in compressed.headers
+    assert decode(streamed) == decode(compressed) == buffered
@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+from werkzeug.http import http_date
+
+from config import db
+from models.home import Home
+from models.review import Review
+
+
+@pytest.fixture
+def alice(make_user, login):
+    alice = make_user("alice")
+    login(alice)
+    return alice
+
+
+def revalidate(client, url, response):
+    return client.get(url, headers={"If-None-Match": response.headers["ETag"]})
+
+
+def add_review(user_id, home_id, rating=4):
+    db.session.add(Review(rating=rating, review="Lovely stay", home_id=home_id, user_id=user_id))
+    db.session.commit()
+
+
+# If-None-Match
+@pytest.mark.parametrize("url", ["/homes", "/homes?sort=price_asc&limit=1", "/homes/{home}", "/users/{user}", "/me", "/users/{user}/favorites"])
+def test_a_current_etag_gets_a_304(client, alice, make_home, url):
+    url = url.format(home=make_home().id, user=alice.id)
+    make_home(title="Lake house")
+    response = client.get(url)
+    assert response.status_code == 200 and response.headers["ETag"].startswith('W/"')
+    assert "no-cache" in response.headers["Cache-Control"]
+
+    not_modified = revalidate(client, url, response)
+    assert not_modified.status_code == 304 and not not_modified.data
+    assert not_modified.headers["ETag"] == response.headers["ETag"]
+    assert client.get(url, headers={"If-None-Match": 'W/"stale"'}).status_code == 200
+
+
+def test_user_payloads_are_private(client, alice):
+    for url in (f"/users/{alice.id}", "/me", f"/users/{alice.id}/favorites"):
+        assert client.get(url).headers["Cache-Control"] == "private, no-cache"
+    assert client.get("/homes").headers["Cache-Control"] == "no-cache"
+
+
+# If-Modified-Since
+def test_if_modified_since_revalidates_a_home(client, make_home):
+    home_id = make_home().id
+    response = client.get(f"/homes/{home_id}")
+    last_modified = response.headers["Last-Modified"]
+    assert client.get(f"/homes/{home_id}", headers={"If-Modified-Since": last_modified}).status_code == 304
+
+    earlier = http_date(response.last_modified - timedelta(hours=1))
+    assert client.get(f"/homes/{home_id}", headers={"If-Modified-Since": earlier}).status_code == 200
+    # If-None-Match wins over If-Modified-Since
+    headers = {"If-Modified-Since": last_modified, "If-None-Match": 'W/"stale"'}
+    assert client.get(f"/homes/{home_id}", headers=headers).status_code == 200
+
+
+def test_an_edited_home_is_modified_since(client, make_home):
+    home = make_home()
+    home_id = home.id
+    since = http_date(datetime.utcnow() - timedelta(days=1))
+    backdated = datetime.utcnow() - timedelta(days=2)
+    db.session.execute(update(Home).where(Home.id == home_id).values(created_at=backdated, updated_at=backdated))
+    db.session.commit()
+    assert client.get(f"/homes/{home_id}", headers={"If-Modified-Since": since}).status_code == 304
+
+    home.price_per_night = 150.0
+    db.session.commit()
+    assert client.get(f"/homes/{home_id}", headers={"If-Modified-Since": since}).status_code == 200
+
+
+# Invalidation
+def test_a_review_changes_the_home_and_user_etags(client, alice, make_user, make_home):
+    home_id, alice_id = make_home().id, alice.id
+    client.post(f"/{alice_id}/add_to_stack/{home_id}")
+    urls = ["/homes", f"/homes/{home_id}", f"/users/{alice_id}", f"/users/{alice_id}/favorites"]
+    before = {url: client.get(url) for url in urls}
+
+    # Someone else's review reaches alice's favorites through the home's rating
+    add_review(make_user("bob").id, home_id)
+    for url in urls:
+        assert revalidate(client, url, before[url]).status_code == 200, url
+
+    before = client.get(f"/users/{alice_id}")
+    add_review(alice_id, home_id, rating=2)
+    assert revalidate(client, f"/users/{alice_id}", before).status_code == 200
+
+
+def test_a_favorite_changes_the_user_etags(client, alice, make_home):
+    home_id, alice_id = make_home().id, alice.id
+    urls = [f"/users/{alice_id}", "/me", f"/users/{alice_id}/favorites"]
+    before = {url: client.get(url) for url in urls}
+
+    assert client.post(f"/{alice_id}/add_to_stack/{home_id}").status_code == 201
+    for url in urls:
+        assert revalidate(client, url, before[url]).status_code == 200, url
+
+    before = {url: client.get(url) for url in urls}
+    assert client.delete(f"/{alice_id}/remove_favorite/{home_id}").status_code == 200
+    for url in urls:
+        assert revalidate(client, url, before[url]).status_code == 200, url
+    # Homes themselves are untouched by a favorite
+    response = client.get(f"/homes/{home_id}")
+    assert revalidate(client, f"/homes/{home_id}", response).status_code == 304
@@ -0,0 +1,151 @@
+import pytest
+from sqlalchemy import select
+
+from config import db
+from favorites import apply_operations, parse_operations
+from models.favoritesCollection import FavoriteCollection
+from models.homeFavorite import HomeFavorite
+
+
+def contents(collection_id):
+    return set(
+        db.session.execute(
+            select(HomeFavorite.home_id).where(HomeFavorite.favorite_collection_id == collection_id)
+        ).scalars()
+    )
+
+
+@pytest.fixture
+def alice(make_user):
+    return make_user("alice")
+
+
+@pytest.fixture
+def homes(make_home):
+    return [make_home().id for _ in range(6)]
+
+
+@pytest.fixture
+def stacks(alice, make_collection):
+    return make_collection(alice, "Weekend").id, make_collection(alice, "Summer").id
+
+
+def batch(client, user_id, *operations):
+    return client.post(f"/users/{user_id}/favorites/batch", json={"operations": list(operations)})
+
+
+# Diffs
+def test_batch_reports_net_changes_per_collection(client, login, alice, homes, stacks):
+    weekend, summer = stacks
+    login(alice)
+    response = batch(
+        client,
+        alice.id,
+        {"op": "add", "collection_id": weekend, "home_ids": homes[:4]},
+        {"op": "remove", "collection_id": weekend, "home_ids": [homes[0]]},
+        {"op": "move", "from_collection_id": weekend, "to_collection_id": summer, "home_ids": [homes[1], homes[5]]},
+    )
+    assert response.status_code == 200
+    assert response.get_json() == {
+        "collections": [
+            {"favorite_collection_id": weekend, "added": [homes[2], homes[3]], "removed": []},
+            {"favorite_collection_id": summer, "added": [homes[1], homes[5]], "removed": []},
+        ],
+        "added": 4,
+        "removed": 0,
+    }
+    assert contents(weekend) == {homes[2], homes[3]}
+    assert contents(summer) == {homes[1], homes[5]}
+
+
+def test_removing_and_readding_is_no_change(alice, homes, stacks):
+    weekend, _ = stacks
+    apply_operations(alice.id, parse_operations({"operations": [{"op": "add", "collection_id": weekend, "home_ids": homes[:2]}]}))
+    db.session.commit()
+    version = db.session.get(FavoriteCollection, weekend).version
+
+    diff = apply_operations(
+        alice.id,
+        parse_operations(
+            {
+                "operations": [
+                    {"op": "remove", "collection_id": weekend, "home_ids": homes[:2]},
+                    {"op": "add", "collection_id": weekend, "home_ids": [homes[1], homes[0], homes[0]]},
+                ]
+            }
+        ),
+    )
+    db.session.commit()
+    assert diff == {"collections": [], "added": 0, "removed": 0}
+    assert contents(weekend) == set(homes[:2])
+    db.session.expire_all()
+    assert db.session.get(FavoriteCollection, weekend).version == version
+
+
+def test_replace_diffs_against_the_current_contents(alice, homes, stacks):
+    weekend, _ = stacks
+    apply_operations(alice.id, [{"op": "add", "collection_id": weekend, "home_ids": homes[:3]}])
+    diff = apply_operations(alice.id, [{"op": "replace", "collection_id": weekend, "home_ids": homes[2:5]}])
+    assert diff["collections"] == [
+        {"favorite_collection_id": weekend, "added": [homes[3], homes[4]], "removed": [homes[0], homes[1]]}
+    ]
+    assert contents(weekend) == set(homes[2:5])
+
+
+def test_deletes_without_returning(alice, homes, stacks, monkeypatch):
+    # The select-then-delete path used on databases without DELETE ... RETURNING
+    weekend, summer = stacks
+    apply_operations(alice.id, [{"op": "add", "collection_id": weekend, "home_ids": homes[:3]}])
+    monkeypatch.setattr(db.session.get_bind().dialect, "delete_returning", False)
+    diff = apply_operations(
+        alice.id,
+        [
+            {"op": "remove", "collection_id": weekend, "home_ids": [homes[0], homes[5]]},
+            {"op": "move", "from_collection_id": weekend, "to_collection_id": summer, "home_ids": [homes[1]]},
+        ],
+    )
+    assert (diff["removed"], diff["added"]) == (2, 1)
+    assert contents(weekend) == {homes[2]}
+    assert contents(summer) == {homes[1]}
+
+
+# Validation
+def test_batch_is_all_or_nothing(client, login, alice, homes, stacks):
+    weekend, _ = stacks
+    login(alice)
+    response = batch(
+        client,
+        alice.id,
+        {"op": "add", "collection_id": weekend, "home_ids": homes[:2]},
+        {"op": "add", "collection_id": weekend, "home_ids": [9999]},
+    )
+    assert response.status_code == 404
+    assert contents(weekend) == set()
+
+
+@pytest.mark.parametrize(
+    "operations",
+    [
+        [],
+        [{"op": "rename", "collection_id": 1, "home_ids": []}],
+        [{"op": "add", "collection_id": "1", "home_ids": [1]}],
+        [{"op": "add", "collection_id": 1, "home_ids": [True]}],
+        [{"op": "move", "from_collection_id": 1, "home_ids": [1]}],
+    ],
+)
+def test_malformed_batches_are_rejected(operations):
+    with pytest.raises(ValueError):
+        parse_operations({"operations": operations})
+
+
+def test_batches_only_touch_the_callers_collections(client, login, make_user, make_collection, alice, homes, stacks):
+    weekend, _ = stacks
+    bob = make_user("bob")
+    theirs = make_collection(bob).id
+    login(bob)
+
+    assert batch(client, alice.id, {"op": "add", "collection_id": weekend, "home_ids": homes[:1]}).status_code == 403
+    assert batch(client, bob.id, {"op": "add", "collection_id": weekend, "home_ids": homes[:1]}).status_code == 404
+    assert batch(client, bob.id, {"op": "add", "collection_id": theirs, "home_ids": homes[:1]}).status_code == 200
+    assert contents(weekend) == set()
+    assert contents(theirs) == {homes[0]}
@@ -0,0 +1,45 @@
+from config import db
+from filter_engine import HomeFilterEngine
+
+
+def values(home_id, **columns):
+    return {"id": home_id, "price_per_night": 100.0, "total_bedrooms": 2, "max_guests": 4, "location": "Chicago", **columns}
+
+
+# Maintenance
+def test_changes_committed_during_the_load_are_replayed(make_home):
+    homes = [make_home(price_per_night=100.0 + n).id for n in range(3)]
+    engine = HomeFilterEngine(capacity=2)
+
+    # Commits that land before the scan finishes: an edit, a new home and a delete
+    engine.apply_changes({homes[0]: values(homes[0], price_per_night=999.0), 50: values(50)}, set())
+    engine.apply_changes({}, {homes[1]})
+    assert engine.size == 0
+    engine.load(db.session)
+
+    assert engine.loaded and engine.size == 4
+    assert engine.search({}, "id")[0] == [homes[0], homes[2], 50]
+    assert engine.search({"min_price": 500}, "id")[0] == [homes[0]]
+    # Once loaded, changes apply straight away
+    engine.apply_changes({}, {50})
+    assert engine.search({}, "id")[0] == [homes[0], homes[2]]
+
+
+def test_null_columns_never_match_a_bound():
+    # NaN compares false, as NULL does in SQL
+    engine = HomeFilterEngine()
+    engine.load(db.session)
+    engine.upsert(1, values(1))
+    engine.upsert(2, values(2, price_per_night=None, total_bedrooms=None))
+
+    assert engine.search({"min_bedrooms": 0}, "id")[0] == [1]
+    assert engine.search({}, "price_asc")[0] == [1]
+    assert engine.search({}, "id")[0] == [1, 2]
+
+
+def test_unknown_codes_match_nothing():
+    engine = HomeFilterEngine()
+    engine.load(db.session)
+    engine.upsert(1, values(1))
+    assert engine.search({"location": "Atlantis"}, "id") == ([], None)
+    assert engine.search({"location": "Chicago"}, "id") == ([1], None)
@@ -0,0 +1,83 @@
+import pytest
+from sqlalchemy import event
+
+from config import app, db
+from models.home import Home
+from models.review import Review
+
+MODES = ["immediate", "deferred"]
+
+
+@pytest.fixture(params=MODES)
+def mode(request, monkeypatch):
+    monkeypatch.setitem(app.config, "FK_VALIDATION_MODE", request.param)
+    return request.param
+
+
+@pytest.fixture
+def alice(make_user):
+    return make_user("alice")
+
+
+def add_review(user_id, home_id):
+    # Immediate mode raises on assignment, deferred mode at the flush
+    db.session.add(Review(rating=4, review="Lovely stay", home_id=home_id, user_id=user_id))
+    db.session.flush()
+
+
+# Validation
+def test_valid_parents_are_accepted(mode, alice, make_home):
+    home_id = make_home().id
+    add_review(alice.id, home_id)
+    db.session.commit()
+    assert Review.query.one().home_id == home_id
+
+
+def test_dangling_parents_are_rejected(mode, alice, make_home):
+    make_home()
+    with pytest.raises(ValueError, match="999 has to correspond to an existing home"):
+        add_review(alice.id, 999)
+    db.session.rollback()
+    assert Review.query.count() == 0
+
+
+def test_deferred_mode_checks_a_batch_in_one_query(monkeypatch, alice, make_home):
+    monkeypatch.setitem(app.config, "FK_VALIDATION_MODE", "deferred")
+    homes = [make_home().id for _ in range(20)]
+    user_id = alice.id
+    db.session.expire_all()
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)  # noqa: E731
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        db.session.add_all(Review(rating=3, review="Fine stay", home_id=home_id, user_id=user_id) for home_id in homes)
+        db.session.flush()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+    lookups = [statement for statement in statements if statement.lstrip().startswith("SELECT")]
+    assert len(lookups) == 2  # one IN query for the homes, one for the user
+
+
+# Cache
+def test_the_cache_forgets_a_parent_deleted_in_the_same_transaction(mode, alice, make_home):
+    home = make_home()
+    home_id = home.id
+    add_review(alice.id, home_id)
+    db.session.delete(home)
+    db.session.flush()
+    with pytest.raises(ValueError):
+        add_review(alice.id, home_id)
+    db.session.rollback()
+
+
+def test_the_cache_forgets_a_parent_deleted_by_another_transaction(mode, alice, make_home):
+    home_id = make_home().id
+    add_review(alice.id, home_id)
+    db.session.commit()
+    with db.engine.begin() as connection:
+        connection.execute(Review.__table__.delete())
+        connection.execute(Home.__table__.delete().where(Home.id == home_id))
+    with pytest.raises(ValueError):
+        add_review(alice.id, home_id)
+    db.session.rollback()
@@ -0,0 +1,106 @@
+import math
+import random
+
+import pytest
+
+import geo
+from config import db
+from gazetteer import CITIES
+from models.home import Home
+
+CENTER = (41.8781, -87.6298)
+RADIUS_KM = 10
+# Degrees of longitude shrink by this factor at the center's latitude
+SCALE = math.cos(math.radians(CENTER[0]))
+
+
+def served(client, **query):
+    response = client.get("/homes", query_string={"limit": 100, **query})
+    assert response.status_code == 200, response.get_json()
+    return {home["id"] for home in response.get_json()}
+
+
+# Geohash
+def test_geohash_matches_the_reference_encoding():
+    assert geo.encode_geohash(57.64911, 10.40744) == "u4pruydqq"
+    assert geo.encode_geohash(-25.382708, -49.265506, 6) == "6gkzwg"
+
+
+def test_bbox_cover_contains_every_point_in_the_box():
+    rng = random.Random(0)
+    for south, west, north, east in [(41.0, -88.5, 42.5, -87.0), (-0.3, -0.3, 0.3, 0.3), (25.70, -80.25, 25.80, -80.10)]:
+        prefixes = geo.cover_bbox(south, west, north, east)
+        assert len(prefixes) <= geo.MAX_COVER_CELLS
+        for _ in range(200):
+            geohash = geo.encode_geohash(rng.uniform(south, north), rng.uniform(west, east))
+            assert any(geohash.startswith(prefix) for prefix in prefixes)
+
+
+def test_homes_are_geocoded_from_their_location(make_home):
+    home = make_home(location="Miami")
+    assert (home.latitude, home.longitude) == CITIES["miami"]
+    assert home.geohash == geo.encode_geohash(*CITIES["miami"])
+    home.location = "Chicago"
+    db.session.commit()
+    assert (home.latitude, home.longitude) == CITIES["chicago"]
+
+
+# Filters
+def test_near_includes_the_radius_boundary(client, search_backend, make_home):
+    step = RADIUS_KM / geo.KM_PER_DEGREE
+    inside = [
+        make_home(latitude=CENTER[0] + step * 0.999, longitude=CENTER[1]).id,
+        make_home(latitude=CENTER[0] - step * 0.7, longitude=CENTER[1] + step * 0.7 / SCALE).id,
+        make_home(latitude=CENTER[0], longitude=CENTER[1]).id,
+    ]
+    outside = [
+        make_home(latitude=CENTER[0] + step * 1.001, longitude=CENTER[1]).id,
+        make_home(latitude=CENTER[0] + step * 0.75, longitude=CENTER[1] + step * 0.75 / SCALE).id,
+        make_home(location="Miami").id,
+    ]
+    found = served(client, near=f"{CENTER[0]},{CENTER[1]}", radius_km=RADIUS_KM)
+    assert found == set(inside)
+    assert not found & set(outside)
+
+
+def test_bbox_is_inclusive_of_its_edges(client, search_backend, make_home):
+    south, west, north, east = 41.80, -87.70, 41.95, -87.55
+    inside = [
+        make_home(latitude=south, longitude=west).id,
+        make_home(latitude=north, longitude=east).id,
+        make_home(latitude=41.88, longitude=-87.63).id,
+    ]
+    make_home(latitude=north + 0.001, longitude=-87.63)
+    make_home(latitude=41.88, longitude=west - 0.001)
+    make_home(location="Miami")
+    assert served(client, bbox=f"{west},{south},{east},{north}") == set(inside)
+
+
+def test_geo_filters_combine_with_the_others(client, search_backend, make_home):
+    cheap = make_home(latitude=CENTER[0], longitude=CENTER[1], price_per_night=80.0).id
+    make_home(latitude=CENTER[0], longitude=CENTER[1], price_per_night=300.0)
+    assert served(client, near=f"{CENTER[0]},{CENTER[1]}", radius_km=5, max_price=100) == {cheap}
+
+
+# Validation
+@pytest.mark.parametrize(
+    "query",
+    [
+        {"near": "91,0"},
+        {"near": "0,181"},
+        {"near": "chicago"},
+        {"near": "41.8,-87.6", "radius_km": "0"},
+        {"near": "41.8,-87.6", "radius_km": "far"},
+        {"bbox": "-87.5,41.9,-87.7,41.8"},
+        {"bbox": "-87.7,41.8,-87.5"},
+        {"bbox": "-87.7,-91,-87.5,41.8"},
+    ],
+)
+def test_bad_coordinates_are_rejected(client, query):
+    assert client.get("/homes", query_string=query).status_code == 400
+
+
+@pytest.mark.parametrize("column, value", [("latitude", 90.5), ("longitude", -180.5), ("latitude", "north")])
+def test_homes_reject_bad_coordinates(column, value):
+    with pytest.raises((TypeError, ValueError)):
+        Home(**{column: value})
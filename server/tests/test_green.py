@@ -0,0 +1,88 @@
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import green
+
+SERVER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# Without gevent
+def test_run_native_is_a_plain_call_when_not_patched():
+    assert not green.monkey_patched()
+    caller = threading.get_ident()
+    assert green.run_native(lambda *args: (threading.get_ident(), args), 1, 2) == (caller, (1, 2))
+    with pytest.raises(ZeroDivisionError):
+        green.run_native(lambda: 1 / 0)
+
+
+def test_the_executor_is_the_standard_one_when_not_patched():
+    with green.thread_pool_executor(max_workers=1, thread_name_prefix="test") as executor:
+        assert isinstance(executor, ThreadPoolExecutor)
+        assert executor.submit(lambda: 2 + 2).result() == 4
+
+
+# Under gevent
+PATCHED = """
+from gevent import monkey
+
+monkey.patch_all()
+
+import time
+
+import gevent
+
+import green
+
+native_ident = monkey.get_original("threading", "get_ident")
+native_sleep = monkey.get_original("time", "sleep")
+ticks = []
+
+
+def busy(seconds):
+    # Blocks its OS thread without yielding, like a numpy build or an index load
+    native_sleep(seconds)
+    return native_ident()
+
+
+def tick():
+    for _ in range(10):
+        ticks.append(time.monotonic())
+        gevent.sleep(0.01)
+
+
+assert green.monkey_patched()
+ticker = gevent.spawn(tick)
+gevent.sleep(0)
+worker = green.run_native(busy, 0.3)
+assert worker != native_ident(), "ran on the hub's thread"
+# The other greenlet kept running while the work blocked a native thread
+assert len(ticks) >= 5, ticks
+ticker.join()
+
+try:
+    green.run_native(lambda: 1 / 0)
+except ZeroDivisionError:
+    pass
+else:
+    raise AssertionError("exception lost")
+
+with green.thread_pool_executor(max_workers=2, thread_name_prefix="ignored") as executor:
+    assert executor.submit(busy, 0).result() != native_ident()
+print("ok")
+"""
+
+
+def test_run_native_offloads_to_an_os_thread_under_gevent():
+    pytest.importorskip("gevent")
+    # Patching is process-wide and irreversible, so it happens in a child interpreter
+    result = subprocess.run(
+        [sys.executable, "-c", textwrap.dedent(PATCHED)], cwd=SERVER, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "ok"
@@ -0,0 +1,132 @@
+from datetime import datetime
+
+import pytest
+
+from config import app, db
+from home_search import parse_home_filters
+from models.home import Home
+
+PRICES = [150.0, 90.0, 120.0, 90.0, 200.0, 120.0, 90.0, 175.0, 60.0, 120.0, 150.0, 90.0]
+
+
+def pages(client, query):
+    # Follows X-Next-Cursor to the end -> the pages of ids served
+    served, cursor = [], None
+    while True:
+        response = client.get("/homes", query_string={**query, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200, response.get_json()
+        served.append([home["id"] for home in response.get_json()])
+        if not (cursor := response.headers.get("X-Next-Cursor")):
+            return served
+
+
+@pytest.fixture
+def priced_homes(make_home):
+    return {make_home(price_per_night=price).id: price for price in PRICES}
+
+
+# Keyset Cursors
+def test_id_pages_cover_every_home_once(client, search_backend, priced_homes):
+    served = pages(client, {"limit": 5})
+    assert [len(page) for page in served] == [5, 5, 2]
+    assert sum(served, []) == sorted(priced_homes)
+
+
+@pytest.mark.parametrize("sort", ["price_asc", "price_desc"])
+def test_price_pages_break_ties_by_id(client, search_backend, priced_homes, sort):
+    sign = 1 if sort == "price_asc" else -1
+    expected = sorted(priced_homes, key=lambda home_id: (sign * priced_homes[home_id], home_id))
+    assert sum(pages(client, {"sort": sort, "limit": 4}), []) == expected
+
+
+def test_filters_apply_on_every_page(client, search_backend, priced_homes):
+    served = sum(pages(client, {"min_price": 100, "max_price": 160, "limit": 2}), [])
+    assert served == sorted(home_id for home_id, price in priced_homes.items() if 100 <= price <= 160)
+
+
+def test_rows_inserted_between_pages_are_not_served_twice(client, search_backend, make_home, priced_homes):
+    first = client.get("/homes", query_string={"sort": "price_asc", "limit": 6})
+    cheapest = make_home(price_per_night=10.0)
+    dearest = make_home(price_per_night=500.0)
+    rest = pages(client, {"sort": "price_asc", "limit": 6, "cursor": first.headers["X-Next-Cursor"]})
+    served = [home["id"] for home in first.get_json()] + sum(rest, [])
+    assert len(served) == len(set(served))
+    # Behind the cursor: skipped, not shifted into the next page
+    assert cheapest.id not in served and served[-1] == dearest.id
+
+
+def test_soft_deleted_homes_are_not_served(client, search_backend, priced_homes):
+    first = client.get("/homes", query_string={"limit": 5})
+    gone = sorted(priced_homes)[7]
+    db.session.get(Home, gone).deleted_at = datetime.utcnow()
+    db.session.commit()
+    rest = pages(client, {"limit": 5, "cursor": first.headers["X-Next-Cursor"]})
+    assert gone not in sum(rest, [])
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "WyJhIl0", "WzEsMiwzXQ"])
+def test_invalid_cursors_are_rejected(client, search_backend, priced_homes, cursor):
+    response = client.get("/homes", query_string={"sort": "price_asc", "cursor": cursor})
+    assert response.status_code == 400
+
+
+# Keyword Cursors
+@pytest.fixture(params=[False, True], ids=["like", "text_index"])
+def text_backend(request, monkeypatch):
+    monkeypatch.setitem(app.config, "HOME_TEXT_INDEX", request.param)
+    return request.param
+
+
+@pytest.fixture
+def described_homes(make_home):
+    descriptions = ["quiet lake cabin retreat", "busy city loft", "quiet garden view", "lake house, quiet mornings"]
+    return [make_home(description=descriptions[n % 4] + f" number {n}", price_per_night=100.0 + n).id for n in range(20)]
+
+
+def test_keyword_pages_cover_every_match_once(client, text_backend, described_homes):
+    served = sum(pages(client, {"q": "quiet lake", "limit": 3}), [])
+    if text_backend:
+        # Ranked: any of the terms matches
+        assert sorted(served) == [home_id for n, home_id in enumerate(described_homes) if n % 4 != 1]
+    else:
+        # The LIKE scan requires every term and serves in id order
+        assert served == [home_id for n, home_id in enumerate(described_homes) if n % 4 in (0, 3)]
+
+
+def test_keyword_pages_combine_with_filters(client, text_backend, described_homes):
+    served = sum(pages(client, {"q": "quiet", "max_price": 110, "limit": 2}), [])
+    assert sorted(served) == [home_id for n, home_id in enumerate(described_homes) if n % 4 != 1 and n <= 10]
+
+
+def test_keyword_pages_survive_inserts(client, text_backend, described_homes, make_home):
+    first = client.get("/homes", query_string={"q": "quiet", "limit": 4})
+    for n in range(10):
+        make_home(description=f"quiet quiet lake number {n}")
+    rest = pages(client, {"q": "quiet", "limit": 4, "cursor": first.headers["X-Next-Cursor"]})
+    served = [home["id"] for home in first.get_json()] + sum(rest, [])
+    assert len(served) == len(set(served))
+    assert set(home_id for n, home_id in enumerate(described_homes) if n % 4 != 1) <= set(served)
+
+
+def test_keyword_cursor_is_validated(client, text_backend, described_homes):
+    response = client.get("/homes", query_string={"q": "quiet", "cursor": "WyJhIiwxXQ"})
+    assert response.status_code == 400
+
+
+# Filters
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ({"price_range": "$100 - $160"}, {"min_price": 100.0, "max_price": 160.0}),
+        ({"price_range": "150+"}, {"min_price": 150.0}),
+        ({"bedrooms": "2 Bedrooms"}, {"min_bedrooms": 2, "max_bedrooms": 2}),
+        ({"bedrooms": "4+ Bedrooms", "guests": "3"}, {"min_bedrooms": 4, "min_guests": 3}),
+    ],
+)
+def test_browse_labels_parse_into_filters(query, expected):
+    assert parse_home_filters(query) == expected
+
+
+@pytest.mark.parametrize("query", [{"price_range": "cheap"}, {"bedrooms": "many"}, {"sort": "rating"}, {"limit": "0"}])
+def test_bad_filters_are_rejected(client, query):
+    assert client.get("/homes", query_string=query).status_code == 400
@@ -0,0 +1,108 @@
+import pytest
+
+import importer
+from config import db
+from models.home import Home
+
+
+def feed_row(property_id, price="500000", **values):
+    return {
+        "property_id": property_id,
+        "property_type": "Cottage",
+        "location": "Chicago",
+        "price": price,
+        "square_footage": "900",
+        "bedrooms": "2",
+        "bathrooms": "1",
+        "description": f"Feed listing {property_id} with a garden and plenty of light.",
+        "link": f"https://example.com/property/{property_id}",
+        **values,
+    }
+
+
+# Import
+def test_importing_twice_skips_the_stored_homes():
+    rows = [feed_row(str(n)) for n in range(1, 6)]
+    first = importer.import_homes(rows, chunk_size=2)
+    assert (first.inserted, first.skipped) == (5, 0)
+
+    second = importer.import_homes(rows + [feed_row("6")], chunk_size=2)
+    assert (second.inserted, second.skipped) == (1, 5)
+    assert second.errors[0] == "row 1: property_id '1' was already imported."
+    assert Home.query.count() == 6
+
+
+def test_duplicates_within_a_feed_are_skipped():
+    stats = importer.import_homes([feed_row("1"), feed_row("2"), feed_row("1", price="900000")])
+    assert (stats.inserted, stats.skipped) == (2, 1)
+    assert stats.errors == ["row 3: Duplicate property_id '1'."]
+    assert db.session.execute(db.select(Home.price_per_night).filter_by(property_id="1")).scalar_one() == 250.0
+
+
+def test_synthetic_homes_do_not_collide_with_the_feed():
+    importer.import_homes([feed_row(str(n)) for n in range(1, 4)])
+    stats = importer.import_homes(importer.synthetic_rows(3))
+    assert (stats.inserted, stats.skipped) == (3, 0)
+    assert sorted(Home.query.with_entities(Home.property_id).all()) == [
+        ("1",), ("2",), ("3",), ("synthetic-1",), ("synthetic-2",), ("synthetic-3",)
+    ]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 100])
+def test_bad_rows_are_skipped_with_their_line(chunk_size):
+    stats = importer.import_homes([feed_row("1"), feed_row("2", property_type="Spaceship"), feed_row("3")], chunk_size)
+    assert (stats.inserted, stats.skipped) == (2, 1)
+    assert stats.errors == ["row 2: Unknown property type 'Spaceship'."]
+
+
+# Feed Sync
+def stored(property_id):
+    db.session.expire_all()
+    return Home.query.filter_by(property_id=property_id).one()
+
+
+def test_unchanged_rows_are_skipped_by_content_hash():
+    rows = [feed_row(str(n)) for n in range(1, 4)]
+    first = importer.sync_homes(rows)
+    assert (first.inserted, first.updated, first.unchanged) == (3, 0, 0)
+    version = stored("1").version
+
+    second = importer.sync_homes(rows, chunk_size=2)
+    assert (second.inserted, second.updated, second.unchanged, second.deleted) == (0, 0, 3, 0)
+    assert stored("1").version == version
+
+
+def test_changed_rows_are_updated_in_place():
+    importer.sync_homes([feed_row("1"), feed_row("2")])
+    home = stored("1")
+    home_id, version = home.id, home.version
+
+    stats = importer.sync_homes([feed_row("1", price="700000"), feed_row("2")])
+    assert (stats.inserted, stats.updated, stats.unchanged) == (0, 1, 1)
+    home = stored("1")
+    assert (home.id, home.price_per_night, home.version) == (home_id, 350.0, version + 1)
+    assert home.content_hash == importer.content_hash(feed_row("1", price="700000"))
+
+
+def test_missing_rows_are_soft_deleted_and_leave_the_listing(client, search_backend):
+    importer.sync_homes([feed_row(str(n)) for n in range(1, 4)])
+    assert len(client.get("/homes").get_json()) == 3
+    ids = {property_id: stored(property_id).id for property_id in ("1", "2", "3")}
+
+    stats = importer.sync_homes([feed_row("1"), feed_row("3")])
+    assert (stats.unchanged, stats.deleted) == (2, 1)
+    assert stored("2").deleted_at is not None
+    assert [home["id"] for home in client.get("/homes").get_json()] == [ids["1"], ids["3"]]
+    assert client.get(f"/homes/{ids['2']}").status_code == 404
+
+    # A row back in the feed is restored, even though its content is unchanged
+    stats = importer.sync_homes([feed_row(str(n)) for n in range(1, 4)])
+    assert (stats.updated, stats.unchanged, stats.deleted) == (1, 2, 0)
+    assert stored("2").deleted_at is None
+    assert len(client.get("/homes").get_json()) == 3
+
+
+def test_keep_missing_leaves_absent_rows_alone():
+    importer.sync_homes([feed_row("1"), feed_row("2")])
+    stats = importer.sync_homes([feed_row("1")], delete_missing=False)
+    assert stats.deleted == 0 and stored("2").deleted_at is None
@@ -0,0 +1,103 @@
+import math
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+
+import market
+from config import db
+from models.home import Home
+from models.marketBucket import MarketBucket
+from models.marketHome import MarketHome
+
+
+def buckets():
+    rows = db.session.execute(select(MarketBucket.__table__)).mappings()
+    return {tuple(row[key] for key in market.KEY): (row["count"], round(row["price_sum"], 6)) for row in rows}
+
+
+def contributions():
+    return {row["home_id"]: dict(row) for row in db.session.execute(select(MarketHome.__table__)).mappings()}
+
+
+# Buckets
+@pytest.mark.parametrize("price", [1.0, 1.03, 59.99, 120.0, 1234.5, 99999.0])
+def test_bucket_price_is_within_the_relative_accuracy(price):
+    # From 1 up: anything cheaper shares bucket 0
+    assert abs(market.bucket_price(market.price_bucket(price)) - price) <= market.RELATIVE_ACCURACY * price + 1e-9
+
+
+def test_unpriced_homes_get_their_own_bucket():
+    assert market.price_bucket(None) == market.price_bucket(0) == market.UNPRICED
+
+
+# Incremental Updates
+def test_commits_keep_the_buckets_equal_to_a_rebuild(make_home):
+    homes = [
+        make_home(location=location, home_type=home_type, total_bedrooms=bedrooms, price_per_night=price)
+        for location, home_type, bedrooms, price in [
+            ("Chicago", "house", 2, 120.0),
+            ("Chicago", "house", 2, 121.0),
+            ("Chicago", "condo", 1, 80.0),
+            ("Miami", "house", 3, 300.0),
+            ("Miami", "cabin", None, 95.0),
+            ("Austin", "apartment", 1, 60.0),
+        ]
+    ]
+    assert sum(count for count, _ in buckets().values()) == len(homes)
+
+    # Moves between buckets: price, location, bedrooms; then a soft and a hard delete
+    homes[0].price_per_night = 250.0
+    homes[1].location = "Miami"
+    homes[3].total_bedrooms = 4
+    homes[4].deleted_at = datetime.utcnow()
+    db.session.delete(homes[5])
+    db.session.commit()
+    make_home(location="Chicago", home_type="condo", total_bedrooms=1, price_per_night=80.0)
+
+    incremental, incremental_homes = buckets(), contributions()
+    assert all(count > 0 for count, _ in incremental.values())
+    assert ("Austin", "apartment", 1, market.price_bucket(60.0)) not in incremental
+    assert incremental[("Chicago", "condo", 1, market.price_bucket(80.0))] == (2, 160.0)
+
+    market.rebuild_market()
+    assert buckets() == incremental
+    assert contributions() == incremental_homes
+
+
+def test_unchanged_columns_leave_the_buckets_alone(make_home):
+    home = make_home()
+    before = buckets()
+    home.description = "Now with a brand new kitchen"
+    home.price_per_night = 120.0
+    db.session.commit()
+    assert buckets() == before
+
+
+def test_bulk_writers_notify_the_buckets(make_home):
+    from model_events import notify_changes
+
+    homes = [make_home(price_per_night=100.0 + n) for n in range(5)]
+    ids = [home.id for home in homes]
+    with db.engine.begin() as connection:
+        connection.execute(Home.__table__.update().where(Home.id.in_(ids[:3])).values(price_per_night=500.0))
+    notify_changes(Home, ids[:3])
+
+    counts = {key[-1]: count for key, (count, _) in buckets().items()}
+    assert counts[market.price_bucket(500.0)] == 3
+    assert sum(counts.values()) == 5
+    incremental = buckets()
+    market.rebuild_market()
+    assert buckets() == incremental
+
+
+def test_summary_percentiles_are_within_the_relative_accuracy(make_home):
+    prices = [float(price) for price in range(50, 450, 7)]
+    for price in prices:
+        make_home(price_per_night=price)
+    (summary,) = market.market_summary(["Chicago"])
+    price = summary["price_per_night"]
+    assert price["count"] == len(prices) and price["mean"] == round(sum(prices) / len(prices), 2)
+    for percentile in market.PERCENTILES:
+        exact = prices[math.floor(percentile / 100 * (len(prices) - 1))]
+        assert abs(price["percentiles"][f"p{percentile}"] - exact) <= market.RELATIVE_ACCURACY * exact + 0.01
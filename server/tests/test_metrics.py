@@ -0,0 +1,90 @@
+import re
+
+import pytest
+
+import metrics
+from config import app
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[a-zA-Z_]\w*="(?:[^"\\]|\\.)*",?)*\})? (\S+)$')
+
+
+@pytest.fixture
+def token(monkeypatch):
+    monkeypatch.setitem(app.config, "METRICS_TOKEN", "scrape-secret")
+    return {"Authorization": "Bearer scrape-secret"}
+
+
+def scrape(client, headers):
+    # {sample name with labels: value}, checking every line is valid exposition format
+    response = client.get("/metrics", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    samples, typed = {}, set()
+    for line in response.get_data(as_text=True).splitlines():
+        if line.startswith("# TYPE "):
+            typed.add(line.split()[2])
+            continue
+        if line.startswith("# HELP "):
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        name = match.group(1)
+        assert name in typed or re.sub(r"_(bucket|sum|count)$", "", name) in typed, line
+        samples[name + (match.group(2) or "")] = float(match.group(3))
+    return samples
+
+
+# Access
+def test_metrics_need_the_token(client, token):
+    assert client.get("/metrics").status_code == 403
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 403
+    assert client.get("/metrics", headers=token).status_code == 200
+
+
+def test_without_a_token_metrics_are_only_public_when_configured(client, monkeypatch):
+    monkeypatch.setitem(app.config, "METRICS_TOKEN", None)
+    monkeypatch.setitem(app.config, "METRICS_PUBLIC", False)
+    assert client.get("/metrics").status_code == 403
+    monkeypatch.setitem(app.config, "METRICS_PUBLIC", True)
+    assert client.get("/metrics").status_code == 200
+
+
+# Exposition
+def test_metrics_are_prometheus_text(client, token):
+    client.get("/homes")
+    samples = scrape(client, token)
+    assert 'http_requests_total{endpoint="homes",method="GET",status="200"}' in samples
+    assert samples['http_request_duration_seconds_bucket{endpoint="homes",method="GET",le="+Inf"}'] == samples[
+        'http_request_duration_seconds_count{endpoint="homes",method="GET"}'
+    ]
+    assert 'session_cache{stat="hit_rate"}' in samples
+
+
+def test_requests_count_their_statements(client, token, make_home):
+    home_id = make_home().id
+    before = scrape(client, token)
+    for _ in range(3):
+        assert client.get(f"/homes/{home_id}").status_code == 200
+    after = scrape(client, token)
+
+    def delta(sample):
+        return after.get(sample, 0) - before.get(sample, 0)
+
+    assert delta('http_requests_total{endpoint="homebyid",method="GET",status="200"}') == 3
+    assert delta('http_request_sql_statements_count{endpoint="homebyid"}') == 3
+    assert delta('http_request_sql_statements_sum{endpoint="homebyid"}') == 6
+    assert delta('db_statements_total{endpoint="homebyid"}') == 6
+    assert delta('db_statement_seconds_total{endpoint="homebyid"}') > 0
+
+
+# Slow Statements
+def test_slow_statements_are_logged_normalised(client, make_home, monkeypatch, caplog):
+    home_id = make_home().id
+    monkeypatch.setitem(app.config, "SLOW_QUERY_SECONDS", 1e-9)
+    with caplog.at_level("WARNING"):
+        client.get(f"/homes/{home_id}")
+    assert any("Slow query" in record.getMessage() and "in homebyid" in record.getMessage() for record in caplog.records)
+
+    statement = "SELECT * FROM homes WHERE id IN (?, ?, ?, ?, ?)"
+    assert metrics.loggable_statement(statement) == "SELECT * FROM homes WHERE id IN (? x5)"
+    assert metrics.loggable_statement("SELECT " + "x" * 2000).endswith("... (2,007 chars)")
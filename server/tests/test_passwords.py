@@ -0,0 +1,70 @@
+import bcrypt
+import pytest
+
+import passwords
+from config import app, db
+from models.user import User
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    # A real one-process pool, torn down after the test
+    monkeypatch.setitem(app.config, "BCRYPT_POOL_WORKERS", 1)
+    monkeypatch.setattr(passwords, "_pool", None)
+    monkeypatch.setattr(passwords, "_slots", None)
+    yield
+    if passwords._pool is not None:
+        passwords._pool.shutdown()
+
+
+def log_in(client, email, password="password123"):
+    return client.post("/login", data={"email": email, "_password_hash": password})
+
+
+# Pool
+def test_login_hashes_and_checks_in_the_process_pool(client, make_user, pool):
+    make_user("alice")
+    assert passwords._pool is not None and passwords._pool._processes
+    assert log_in(client, "alice@example.com").status_code == 200
+    assert log_in(client, "alice@example.com", "wrong-password").status_code == 422
+    assert passwords.hash_passwords(["password123", "password456"], rounds=4)[1].startswith("$2b$04$")
+
+
+def test_a_full_pool_turns_logins_away(client, make_user, pool, monkeypatch):
+    make_user("alice")
+    monkeypatch.setitem(app.config, "BCRYPT_QUEUE_TIMEOUT", 0.01)
+    # Every slot taken: the caller gets a 503 instead of queueing
+    while passwords._slots.acquire(blocking=False):
+        pass
+    assert log_in(client, "alice@example.com").status_code == 503
+
+
+# Rehash on Login
+def test_legacy_hashes_are_upgraded_on_login(client, make_user, monkeypatch):
+    alice = make_user("alice")
+    alice._password_hash = bcrypt.hashpw(b"password123", bcrypt.gensalt(5)).decode("utf-8")
+    db.session.commit()
+    alice_id = alice.id
+    assert passwords.hash_cost(alice.password_hash) == 5
+
+    assert log_in(client, "alice@example.com").status_code == 200
+    db.session.expire_all()
+    upgraded = db.session.get(User, alice_id).password_hash
+    assert passwords.hash_cost(upgraded) == app.config["BCRYPT_LOG_ROUNDS"]
+    assert passwords.check_password(upgraded, "password123")
+
+
+def test_current_hashes_and_failed_logins_are_left_alone(client, make_user):
+    alice = make_user("alice")
+    original, alice_id = alice.password_hash, alice.id
+    assert log_in(client, "alice@example.com").status_code == 200
+    db.session.expire_all()
+    assert db.session.get(User, alice_id).password_hash == original
+
+    alice = db.session.get(User, alice_id)
+    alice._password_hash = bcrypt.hashpw(b"password123", bcrypt.gensalt(5)).decode("utf-8")
+    db.session.commit()
+    legacy = alice.password_hash
+    assert log_in(client, "alice@example.com", "wrong-password").status_code == 422
+    db.session.expire_all()
+    assert db.session.get(User, alice_id).password_hash == legacy
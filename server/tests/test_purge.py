@@ -0,0 +1,107 @@
+import pytest
+from sqlalchemy import select
+
+from config import db
+from models.favoritesCollection import FavoriteCollection
+from models.home import Home
+from models.homeFavorite import HomeFavorite
+from models.job import Job
+from models.review import Review
+from models.user import User
+from purge import purge_user
+from ratings import STARS, rebuild_rating_aggregates
+
+
+def review(user, home, rating):
+    db.session.add(Review(rating=rating, review="Lovely stay", home_id=home.id, user_id=user.id))
+    db.session.commit()
+
+
+def aggregates(home_id):
+    db.session.expire_all()
+    home = db.session.get(Home, home_id)
+    return (home.rating_count, home.rating_sum, home.rating_avg, [getattr(home, f"rating_{star}") for star in STARS])
+
+
+def expected_aggregates(*ratings):
+    return (
+        len(ratings),
+        sum(ratings),
+        sum(ratings) / len(ratings) if ratings else None,
+        [ratings.count(star) for star in STARS],
+    )
+
+
+@pytest.fixture
+def accounts(make_user, make_home, make_collection):
+    # alice hosts two homes, reviews three and favorites four; bob reviews two of the same homes
+    alice, bob = make_user("alice"), make_user("bob")
+    hosted = [make_home(host_id=alice.id) for _ in range(2)]
+    others = [make_home(host_id=bob.id) for _ in range(4)]
+    for home, rating in zip(others[:3], (5, 2, 4)):
+        review(alice, home, rating)
+    review(bob, others[0], 3)
+    review(bob, others[3], 1)
+    for collection in (make_collection(alice, "Weekend"), make_collection(alice, "Summer")):
+        db.session.add_all(HomeFavorite(favorite_collection_id=collection.id, home_id=home.id) for home in others[:2])
+    db.session.commit()
+    return alice, bob, [home.id for home in hosted], [home.id for home in others]
+
+
+# Purge
+def test_purge_removes_everything_behind_a_user(accounts):
+    alice, bob, hosted, others = accounts
+    alice_id, bob_id = alice.id, bob.id
+    assert aggregates(others[0]) == expected_aggregates(5, 3)
+
+    result = purge_user(alice_id, batch_size=2)
+    db.session.expire_all()
+    assert result == {"favorites": 4, "reviews": 3, "homes_released": 2}
+    assert db.session.get(User, alice_id) is None
+    assert not db.session.execute(select(FavoriteCollection.id).where(FavoriteCollection.user_id == alice_id)).all()
+    assert db.session.execute(select(Review.user_id).distinct()).scalars().all() == [bob_id]
+    for home_id in hosted:
+        home = db.session.get(Home, home_id)
+        assert home.host_id is None and home.deleted_at is not None
+
+    # The aggregates are rebuilt from the reviews that are left
+    assert aggregates(others[0]) == expected_aggregates(3)
+    assert aggregates(others[1]) == expected_aggregates()
+    assert aggregates(others[2]) == expected_aggregates()
+    assert aggregates(others[3]) == expected_aggregates(1)
+
+
+def test_deleting_an_account_runs_the_purge(client, login, accounts):
+    alice, bob, _, others = accounts
+    alice_id, email = alice.id, alice.email
+    login(bob)
+    assert client.delete(f"/users/{alice_id}").status_code == 403
+
+    login(alice)
+    response = client.delete(f"/users/{alice_id}")
+    assert response.status_code == 202
+    assert "Location" not in response.headers and response.get_json() == {}
+    db.session.expire_all()
+    job = Job.query.filter_by(kind="purge_user").one()
+    assert (job.user_id, job.status) == (alice_id, "succeeded")
+    assert db.session.get(User, alice_id) is None
+    assert aggregates(others[0]) == expected_aggregates(3)
+    # Logged out, and the account can't be used again
+    assert client.get("/me").status_code == 400
+    assert client.post("/login", data={"email": email, "_password_hash": "password123"}).status_code == 422
+
+
+# Rating Aggregates
+def test_rebuild_matches_incremental_aggregates(accounts):
+    alice, bob, _, others = accounts
+    db.session.delete(db.session.execute(select(Review).where(Review.user_id == bob.id, Review.home_id == others[3])).scalar_one())
+    db.session.commit()
+    incremental = {home_id: aggregates(home_id) for home_id in others}
+
+    with db.engine.begin() as connection:
+        connection.execute(Home.__table__.update().values(rating_count=99, rating_sum=0, rating_avg=7.0, rating_1=99))
+        assert rebuild_rating_aggregates(connection, others[:2]) == 2
+    assert aggregates(others[2])[0] == 99
+    with db.engine.begin() as connection:
+        rebuild_rating_aggregates(connection, batch_size=1)
+    assert {home_id: aggregates(home_id) for home_id in others} == incremental
@@ -0,0 +1,73 @@
+import pytest
+
+from config import app, db
+from models.homeFavorite import HomeFavorite
+from models.home import Home
+from models.review import Review
+from query_budget import QueryBudgetExceeded, query_budget
+
+
+def queries(count):
+    for _ in range(count):
+        db.session.execute(db.select(Home.id)).all()
+    return count
+
+
+# Guard
+def test_going_over_budget_fails_under_test():
+    handler = query_budget(2)(queries)
+    with app.test_request_context():
+        assert handler(2) == 2
+        with pytest.raises(QueryBudgetExceeded, match=r"queries issued 3 queries \(budget 2\)"):
+            handler(3)
+
+
+def test_going_over_budget_only_logs_when_not_strict(monkeypatch, caplog):
+    monkeypatch.setitem(app.config, "QUERY_BUDGET_STRICT", False)
+    with app.test_request_context():
+        assert query_budget(1)(queries)(3) == 3
+    assert "issued 3 queries (budget 1)" in caplog.text
+
+
+# Endpoints
+@pytest.fixture
+def profile(make_user, make_home, make_collection):
+    # Enough collections, favorites and reviews that a lazy load per row would blow every budget
+    alice = make_user("alice")
+    homes = [make_home(host_id=alice.id) for _ in range(8)]
+    for n in range(4):
+        collection = make_collection(alice, f"Stack {n}")
+        db.session.add_all(HomeFavorite(favorite_collection_id=collection.id, home_id=home.id) for home in homes[n:])
+    db.session.add_all(Review(rating=4, review="Lovely stay", home_id=home.id, user_id=alice.id) for home in homes)
+    db.session.commit()
+    return alice
+
+
+@pytest.mark.parametrize("path", ["/me", "/users/{id}", "/users/{id}/favorites", "/users/{id}/favorites?stream=1"])
+def test_profile_endpoints_stay_within_budget(client, login, profile, path):
+    login(profile)
+    response = client.get(path.format(id=profile.id))
+    assert response.status_code == 200
+    assert response.get_json()
+    assert int(response.headers["X-Query-Count"]) <= 8
+
+
+def test_query_count_is_constant_in_the_number_of_rows(client, login, profile, make_home, make_collection):
+    login(profile)
+    before = {path: client.get(path).headers["X-Query-Count"] for path in ("/me", f"/users/{profile.id}/favorites")}
+    collection = make_collection(profile, "Another")
+    for _ in range(10):
+        home = make_home()
+        db.session.add(HomeFavorite(favorite_collection_id=collection.id, home_id=home.id))
+        db.session.add(Review(rating=5, review="Lovely stay", home_id=home.id, user_id=profile.id))
+    db.session.commit()
+    assert {path: client.get(path).headers["X-Query-Count"] for path in before} == before
+
+
+@pytest.mark.parametrize("query", ["limit=50", "sort=price_asc&limit=50", "q=quiet&limit=50"])
+def test_home_search_stays_within_budget(client, make_home, query):
+    for _ in range(60):
+        make_home()
+    response = client.get(f"/homes?{query}")
+    assert response.status_code == 200
+    assert int(response.headers["X-Query-Count"]) <= 4
@@ -0,0 +1,21 @@
+from config import db
+from models.userRecommendation import UserRecommendation
+
+
+def test_users_only_see_their_own_recommendations(client, login, make_user, make_home):
+    alice, bob = make_user("alice"), make_user("bob")
+    home_id = make_home().id
+    db.session.add(UserRecommendation(user_id=bob.id, home_id=home_id, rank=0, score=0.9))
+    db.session.commit()
+    alice_id, bob_id = alice.id, bob.id
+
+    assert client.get(f"/users/{bob_id}/recommendations").status_code == 422
+    login(alice)
+    assert client.get(f"/users/{bob_id}/recommendations").get_json() == {"Error": "Access Denied."}
+    assert client.get(f"/users/{bob_id}/recommendations").status_code == 403
+    assert client.get(f"/users/{alice_id}/recommendations").get_json() == []
+
+    login(bob)
+    response = client.get(f"/users/{bob_id}/recommendations")
+    assert response.status_code == 200
+    assert [(home["id"], home["score"]) for home in response.get_json()] == [(home_id, 0.9)]
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from config import db
+from models.review import Review
+from pagination import encode_cursor
+
+SORT_KEYS = {
+    "newest": (lambda review: (review["created_at"], review["id"]), True),
+    "highest": (lambda review: (review["rating"], review["created_at"], review["id"]), True),
+    "lowest": (lambda review: (review["rating"], review["created_at"], review["id"]), False),
+}
+
+
+@pytest.fixture
+def home_id(make_user, make_home):
+    # Ties at every level: shared ratings, reviews written in the same second (server default,
+    # stored without microseconds) next to backdated ones with microseconds
+    alice, bob = make_user("alice"), make_user("bob")
+    home_id, other_home_id = make_home().id, make_home().id
+    start = datetime.utcnow() - timedelta(days=3)
+    reviews = [Review(rating=1 + n % 3, review=f"Stay number {n}", home_id=home_id, user_id=alice.id) for n in range(9)]
+    reviews += [
+        Review(rating=1 + n % 5, review=f"Older stay {n}", home_id=home_id, user_id=bob.id, created_at=start + timedelta(hours=n // 2, microseconds=n))
+        for n in range(14)
+    ]
+    reviews.append(Review(rating=5, review="Another home entirely", home_id=other_home_id, user_id=bob.id))
+    db.session.add_all(reviews)
+    db.session.commit()
+    return home_id
+
+
+def pages(client, home_id, sort, limit):
+    served, cursor = [], None
+    while True:
+        url = f"/homes/{home_id}/reviews?sort={sort}&limit={limit}" + (f"&cursor={cursor}" if cursor else "")
+        response = client.get(url)
+        assert response.status_code == 200
+        page = response.get_json()
+        assert len(page) <= limit
+        served += page
+        if not (cursor := response.headers.get("X-Next-Cursor")):
+            return served
+
+
+# Paging
+@pytest.mark.parametrize("sort", SORT_KEYS)
+@pytest.mark.parametrize("limit", [1, 4, 23, 100])
+def test_pages_cover_every_review_once_in_order(client, home_id, sort, limit):
+    everything = client.get(f"/homes/{home_id}/reviews?sort={sort}&limit=100").get_json()
+    assert len(everything) == 23
+    key, descending = SORT_KEYS[sort]
+    assert everything == sorted(everything, key=key, reverse=descending)
+
+    served = pages(client, home_id, sort, limit)
+    assert [review["id"] for review in served] == [review["id"] for review in everything]
+    assert all(review["user"]["username"] in ("alice", "bob") for review in served)
+
+
+def test_an_unknown_home_is_a_404(client, home_id):
+    assert client.get("/homes/999/reviews").status_code == 404
+
+
+# Validation
+@pytest.mark.parametrize(
+    "query",
+    [
+        "cursor=not-a-cursor!",
+        f"cursor={encode_cursor('2024-01-01 00:00:00')}",
+        f"cursor={encode_cursor(5, '2024-01-01 00:00:00', 3)}",
+        f"sort=highest&cursor={encode_cursor('five', '2024-01-01 00:00:00', 3)}",
+        f"cursor={encode_cursor(20240101, 3)}",
+        "cursor=eyJhIjoxfQ",
+        "sort=oldest",
+        "limit=0",
+        "limit=many",
+    ],
+)
+def test_bad_parameters_are_a_400(client, home_id, query):
+    response = client.get(f"/homes/{home_id}/reviews?{query}")
+    assert response.status_code == 400
+    assert "Error" in response.get_json()
@@ -0,0 +1,88 @@
+import time
+
+import pytest
+from sqlalchemy import create_engine, event
+
+import routing
+from config import app, db
+
+
+@pytest.fixture
+def statements(monkeypatch):
+    # A "replica" engine on the same database file, so both binds see the same rows;
+    # statements are recorded by the engine that ran them
+    replica = create_engine(db.engine.url)
+    monkeypatch.setitem(db.engines, routing.REPLICA, replica)
+    monkeypatch.setitem(app.config["SQLALCHEMY_BINDS"], routing.REPLICA, str(db.engine.url))
+    recorded = {"primary": [], "replica": []}
+    listeners = {
+        engine: lambda conn, cursor, statement, *args, name=name: recorded[name].append(statement)
+        for engine, name in ((db.engine, "primary"), (replica, "replica"))
+    }
+    for engine, listener in listeners.items():
+        event.listen(engine, "before_cursor_execute", listener)
+    yield recorded
+    for engine, listener in listeners.items():
+        event.remove(engine, "before_cursor_execute", listener)
+    replica.dispose()
+
+
+def reset(statements):
+    for recorded in statements.values():
+        recorded.clear()
+
+
+def touches(recorded, table):
+    return [statement for statement in recorded if f"FROM {table}" in statement or f"INTO {table}" in statement]
+
+
+# Reads
+def test_reads_go_to_the_replica(client, statements, make_home):
+    home_id = make_home().id
+    reset(statements)
+    assert client.get("/homes").status_code == 200
+    assert client.get(f"/homes/{home_id}").status_code == 200
+    assert statements["replica"] and not statements["primary"]
+    assert routing.STICKY_COOKIE not in client.get("/homes").headers.get("Set-Cookie", "")
+
+
+# Writes
+def test_writes_go_to_the_primary_and_stick(client, login, make_user, make_home, statements):
+    alice, home_id = make_user("alice"), make_home().id
+    login(alice)
+    reset(statements)
+    response = client.post(f"/{alice.id}/add_to_stack/{home_id}")
+    assert response.status_code == 201
+    assert touches(statements["primary"], "home_favorites") and not statements["replica"]
+    assert f"{routing.STICKY_COOKIE}=" in response.headers["Set-Cookie"]
+
+    # The client's next reads see its own write on the primary
+    reset(statements)
+    assert client.get(f"/users/{alice.id}/favorites").get_json()[0]["home_favorites"]
+    assert statements["primary"] and not statements["replica"]
+
+    # Once the window has passed, reads return to the replica
+    client.set_cookie("localhost", routing.STICKY_COOKIE, str(time.time() - 1))
+    reset(statements)
+    assert client.get(f"/users/{alice.id}/favorites").status_code == 200
+    assert touches(statements["replica"], "favorite_collections")
+    assert not touches(statements["primary"], "favorite_collections")
+
+
+def test_no_sticky_cookie_without_a_replica(client, login, make_user, make_home):
+    alice, home_id = make_user("alice"), make_home().id
+    login(alice)
+    response = client.post(f"/{alice.id}/add_to_stack/{home_id}")
+    assert routing.STICKY_COOKIE not in response.headers.get("Set-Cookie", "")
+
+
+# Sessions
+def test_sessions_are_read_from_the_primary(client, login, make_user, statements, monkeypatch):
+    monkeypatch.setitem(app.config, "REPLICA_STICKY_SECONDS", 0)
+    login(make_user("alice"))
+    app.session_interface.cache.entries.clear()
+    reset(statements)
+    assert client.get("/me").status_code == 200
+    assert touches(statements["primary"], "sessions")
+    assert not touches(statements["replica"], "sessions")
+    assert touches(statements["replica"], "users")
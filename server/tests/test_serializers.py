@@ -0,0 +1,52 @@
+import json
+from datetime import datetime
+
+import pytest
+
+import serializers
+from config import db
+from models.favoritesCollection import FavoriteCollection
+from models.home import Home
+from models.homeFavorite import HomeFavorite
+from models.review import Review
+from models.user import User
+
+
+@pytest.fixture
+def graph(make_user, make_home, make_collection):
+    # A user with hosted homes, reviews on them and favorites of them: every relationship the
+    # serialize_rules walk is populated, including a NULL column and a datetime
+    alice, bob = make_user("alice"), make_user("bob")
+    homes = [make_home(host_id=alice.id), make_home(host_id=bob.id, price_per_night=95.5), make_home(total_bedrooms=None)]
+    db.session.add_all(
+        [
+            Review(rating=5, review="Lovely stay", home_id=homes[0].id, user_id=bob.id),
+            Review(rating=2, review="Too noisy at night", home_id=homes[1].id, user_id=alice.id),
+        ]
+    )
+    for collection in (make_collection(alice), make_collection(bob, "Trips")):
+        db.session.add_all(HomeFavorite(favorite_collection_id=collection.id, home_id=home.id) for home in homes[:2])
+    db.session.commit()
+    homes[2].deleted_at = datetime(2024, 5, 1, 12, 30)
+    db.session.commit()
+    db.session.expire_all()
+    return alice
+
+
+@pytest.mark.parametrize("model", [User, Home, Review, FavoriteCollection])
+def test_compiled_serializer_matches_serializer_mixin(graph, model):
+    objects = db.session.query(model).order_by(model.id).all()
+    assert objects
+    for obj in objects:
+        assert serializers.to_dict(obj) == obj.to_dict()
+
+
+@pytest.mark.parametrize("only, rules", [(("id", "title", "host.username"), ()), ((), ("-reviews", "-host"))])
+def test_compiled_serializer_honours_call_site_rules(graph, only, rules):
+    for home in Home.query.order_by(Home.id):
+        assert serializers.to_dict(home, only, rules) == home.to_dict(only=only, rules=rules)
+
+
+def test_json_output_matches_the_stdlib_encoding(graph):
+    users = User.query.order_by(User.id).all()
+    assert json.loads(serializers.dumps(serializers.to_dicts(users))) == json.loads(json.dumps([user.to_dict() for user in users]))
@@ -0,0 +1,95 @@
+import copy
+import threading
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import select
+
+from config import app, db
+from session_store import SessionCache
+
+
+@pytest.fixture
+def interface(monkeypatch):
+    # The app's interface outlives each test: start every test from an empty cache and zeroed stats
+    interface = app.session_interface
+    monkeypatch.setattr(interface, "cache", SessionCache(interface.cache.maxsize, interface.cache.ttl))
+    monkeypatch.setattr(interface, "stats", dict.fromkeys(interface.stats, 0))
+    monkeypatch.setattr(interface, "_seen_invalidations", {})
+    monkeypatch.setattr(interface, "_polled_at", None)
+    return interface
+
+
+def other_worker(interface):
+    # A second process's interface: same tables, its own cache, stats and invalidation bookkeeping
+    worker = copy.copy(interface)
+    worker.cache = SessionCache(interface.cache.maxsize, interface.cache.ttl)
+    worker.stats = dict.fromkeys(interface.stats, 0)
+    worker._stats_lock = threading.Lock()
+    worker._poll_lock = threading.Lock()
+    worker._seen_invalidations = {}
+    worker._polled_at = None
+    return worker
+
+
+def stored_session(interface):
+    table = interface.sql_session_model.__table__
+    return db.session.execute(select(table.c.session_id, table.c.expiry)).one()
+
+
+# Cache
+def test_requests_are_served_from_the_cache(client, login, make_user, interface):
+    login(make_user("alice"))
+    assert client.get("/me").status_code == 200
+    assert client.get("/me").status_code == 200
+    assert (interface.stats["hits"], interface.stats["misses"]) == (2, 0)
+
+    # An entry dropped from the cache is re-read from the table once
+    interface.cache.entries.clear()
+    assert client.get("/me").status_code == 200
+    assert client.get("/me").status_code == 200
+    stats = interface.cache_stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (3, 1, 1)
+    assert stats["hit_rate"] == 0.75
+
+
+def test_unchanged_sessions_defer_the_expiry_write(client, login, make_user, interface, monkeypatch):
+    login(make_user("alice"))
+    store_id, stored_expiry = stored_session(interface)
+    writes = interface.stats["writes"]
+
+    assert client.get("/me").status_code == 200
+    db.session.expire_all()
+    assert stored_session(interface).expiry == stored_expiry
+    assert interface.stats["writes"] == writes and interface.stats["deferred_writes"] == 1
+    entry = interface.cache.get(store_id)
+    assert entry.expiry > stored_expiry and entry.stored_expiry == stored_expiry
+
+    # Once the in-memory expiry drifts past the interval it is written through
+    monkeypatch.setattr(interface, "write_back_interval", timedelta(0))
+    assert client.get("/me").status_code == 200
+    db.session.expire_all()
+    assert stored_session(interface).expiry > stored_expiry
+    assert interface.stats["writes"] == writes + 1
+
+
+# Invalidation
+def test_a_session_destroyed_by_another_worker_is_evicted(client, login, make_user, interface):
+    login(make_user("alice"))
+    store_id, _ = stored_session(interface)
+    worker = other_worker(interface)
+    assert worker._retrieve_session_data(store_id)["user_id"]
+    assert worker.cache.get(store_id)
+
+    assert client.delete("/logout").status_code == 204
+    db.session.expire_all()
+    # Until its next poll the other worker still serves its cached copy
+    assert worker._retrieve_session_data(store_id)["user_id"]
+
+    worker._polled_at = None
+    assert worker._retrieve_session_data(store_id) is None
+    assert worker.stats["invalidated"] == 1 and worker.cache.get(store_id) is None
+    # The worker that logged out already knew and evicts nothing
+    interface._polled_at = None
+    interface._sync_invalidations()
+    assert interface.stats["invalidated"] == 0
@@ -0,0 +1,83 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select, update
+
+import similar_homes
+from config import db
+from models.home import Home
+from models.similarHome import SimilarHome
+
+PRICES = [80.0, 95.0, 110.0, 400.0, 420.0, 900.0, 950.0, 60.0]
+
+
+@pytest.fixture
+def homes(make_home, monkeypatch):
+    # A fresh per-process cache, and a lookup table built over homes of spread-out prices
+    monkeypatch.setattr(similar_homes, "_vectors", None)
+    monkeypatch.setattr(similar_homes, "_seen", None)
+    ids = [make_home(price_per_night=price, total_bedrooms=1 + n % 3).id for n, price in enumerate(PRICES)]
+    similar_homes.build_similar_homes(k=3)
+    return ids
+
+
+def stored_lists():
+    table = SimilarHome.__table__
+    lists = {}
+    for home_id, similar_home_id in db.session.execute(select(table.c.home_id, table.c.similar_home_id).order_by(table.c.home_id, table.c.rank)):
+        lists.setdefault(home_id, []).append(similar_home_id)
+    return lists
+
+
+def expected_list(vectors, home_id, k=3):
+    # The list a full scoring pass with the build's fit gives today
+    with db.engine.connect() as connection:
+        fresh = similar_homes.HomeVectors.load(connection, vectors.fit)
+    neighbours, _ = fresh.neighbours([fresh.rows[home_id]], k)
+    return fresh.ids[neighbours[0]].tolist()
+
+
+# Cached Vectors
+def test_refresh_picks_up_homes_changed_by_other_processes(homes):
+    similar_homes.refresh_similar_homes([homes[0]])
+    vectors = similar_homes._vectors
+
+    # Another worker edits, removes and adds homes; none of it reaches this process's handlers
+    table = Home.__table__
+    with db.engine.begin() as connection:
+        connection.execute(update(table).where(table.c.id == homes[1]).values(price_per_night=5000.0))
+        connection.execute(update(table).where(table.c.id == homes[2]).values(deleted_at=datetime.utcnow()))
+        added = connection.execute(
+            table.insert().values(title="Lake cabin", description="A cabin by the lake", home_type="house", max_guests=2, price_per_night=85.0)
+        ).inserted_primary_key[0]
+
+    similar_homes.refresh_similar_homes([homes[7]])
+    assert similar_homes._vectors is vectors  # caught up in place, not reloaded
+    edited = similar_homes._home_rows(db.session.connection(), table.c.id == homes[1])
+    assert vectors.matrix[vectors.rows[homes[1]]].tolist() == pytest.approx(vectors.fit.transform(edited)[0].tolist())
+    assert homes[2] not in vectors.rows and added in vectors.rows
+    assert stored_lists()[homes[7]] == expected_list(vectors, homes[7])
+
+
+def test_a_new_build_reloads_the_vectors(homes):
+    similar_homes.refresh_similar_homes([homes[0]])
+    vectors = similar_homes._vectors
+    similar_homes.build_similar_homes(k=3)
+    similar_homes.refresh_similar_homes([homes[0]])
+    assert similar_homes._vectors is not vectors
+    assert similar_homes._vectors.fit.id != vectors.fit.id
+
+
+# Batches
+def test_batches_shrink_as_the_table_grows(homes, monkeypatch):
+    vectors = similar_homes._vectors or similar_homes.HomeVectors.load(db.session.connection())
+    assert similar_homes._batch_size(vectors) == similar_homes.BATCH_SIZE
+    vectors.size = 1_000_000
+    assert similar_homes._batch_size(vectors) == 16
+
+    # Scoring one row at a time writes the same lists
+    built = stored_lists()
+    monkeypatch.setattr(similar_homes, "SCORE_MEMORY", 1)
+    similar_homes.build_similar_homes(k=3)
+    db.session.expire_all()
+    assert stored_lists() == built
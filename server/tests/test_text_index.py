@@ -0,0 +1,92 @@
+import math
+
+import pytest
+
+import text_index
+from config import db
+from text_index import HomeTextIndex
+
+WORDS = ["lake", "cabin", "quiet", "modern", "loft", "beach", "garden", "view", "cozy", "city"]
+
+
+# Ranking
+def corpus(index, count, offset=0, length=2):
+    # Deterministic documents with varied term frequencies and lengths
+    for n in range(offset, offset + count):
+        words = [WORDS[(n * 7 + k * 3) % len(WORDS)] for k in range(length + n % 9)]
+        index.upsert(n + 1, {"title": words[0], "description": " ".join(words), "amenities": "wifi" * (n % 2)})
+
+
+def brute_force(index, text, statistics, after=None):
+    # Every matching document scored with plain BM25 under the given statistics (rounded, so
+    # float noise between the two computations doesn't reorder ties)
+    average_length, idfs = statistics
+    ranked = []
+    for home_id, terms in index.doc_terms.items():
+        score = 0.0
+        for term, idf in zip(dict.fromkeys(text_index.tokenize(text)), idfs):
+            if term in terms:
+                frequency = terms[term]
+                norm = index.K1 * (1 - index.B + index.B * index.doc_lengths[home_id] / average_length)
+                score += idf * frequency * (index.K1 + 1) / (frequency + norm)
+        if score > 0:
+            ranked.append((round(score, 9), home_id))
+    ranked.sort(key=lambda item: (-item[0], item[1]))
+    if after:
+        score, last_id = round(after[0], 9), after[1]
+        ranked = [item for item in ranked if item[0] < score or (item[0] == score and item[1] > last_id)]
+    return ranked
+
+
+def assert_same_ranking(served, expected):
+    assert [home_id for _, home_id in served] == [home_id for _, home_id in expected]
+    assert all(math.isclose(a, b) for (a, _), (b, _) in zip(served, expected))
+
+
+def test_text_pages_match_bm25_order():
+    index = HomeTextIndex()
+    corpus(index, 200)
+    statistics = index.statistics("quiet lake cabin")
+    served, after = [], None
+    while page := index.search("quiet lake cabin", 7, after, statistics):
+        served += page
+        after = page[-1]
+    assert_same_ranking(served, brute_force(index, "quiet lake cabin", statistics))
+
+
+def test_text_pages_keep_their_statistics_while_the_corpus_changes():
+    index = HomeTextIndex()
+    corpus(index, 200)
+    statistics = index.statistics("cozy view")
+    first = index.search("cozy view", 10, None, statistics)
+
+    # Enough new, longer documents to move the average length past STATS_DRIFT and refreeze it
+    corpus(index, 300, offset=1000, length=8)
+    index.remove(first[3][1])
+    assert index.statistics("cozy view")[0] > statistics[0] * (1 + index.STATS_DRIFT)
+
+    rest = index.search("cozy view", 25, first[-1], statistics)
+    assert_same_ranking(rest, brute_force(index, "cozy view", statistics, first[-1])[:25])
+    assert not {home_id for _, home_id in first} & {home_id for _, home_id in rest}
+
+
+def test_text_statistics_must_match_the_query():
+    index = HomeTextIndex()
+    corpus(index, 20)
+    with pytest.raises(ValueError):
+        index.search("quiet lake", 5, None, index.statistics("quiet"))
+
+
+# Maintenance
+def test_changes_committed_during_the_load_are_replayed(make_home):
+    homes = [make_home(description=f"quiet lake cabin number {n}").id for n in range(3)]
+    index = HomeTextIndex()
+    index.apply_changes({homes[0]: {"title": "Loft", "description": "busy city loft"}}, set())
+    index.apply_changes({}, {homes[1]})
+    assert not index.doc_terms
+    index.load(db.session)
+
+    assert [home_id for _, home_id in index.search("lake", 10)] == [homes[2]]
+    assert [home_id for _, home_id in index.search("loft", 10)] == [homes[0]]
+    index.apply_changes({}, {homes[2]})
+    assert index.search("lake", 10) == []
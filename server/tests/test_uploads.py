@@ -0,0 +1,65 @@
+import io
+
+import pytest
+
+import uploads
+from config import app, db
+from models.job import Job
+from models.user import User
+
+
+@pytest.fixture(autouse=True)
+def local_uploads(monkeypatch, tmp_path):
+    monkeypatch.setitem(app.config, "IMAGE_UPLOAD_BACKEND", "local")
+    monkeypatch.setitem(app.config, "IMAGE_UPLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+
+def image(name="me.png"):
+    return (io.BytesIO(b"\x89PNG fake image bytes"), name)
+
+
+def test_signup_queues_the_profile_image(client, local_uploads):
+    response = client.post(
+        "/signup",
+        data={"username": "carol", "email": "carol@example.com", "_password_hash": "password123", "profile_image": image()},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 201
+    job = client.get(response.headers["X-Upload-Job"]).get_json()
+    assert (job["kind"], job["status"]) == ("profile_image", "succeeded")
+    user = User.query.filter_by(username="carol").one()
+    assert user.profile_image_status == "ready"
+    assert len(list(local_uploads.iterdir())) == 1
+
+
+def test_users_can_only_edit_their_own_account(client, login, make_user):
+    alice, bob = make_user("alice"), make_user("bob")
+    bob_id = bob.id
+    login(alice)
+    response = client.patch(f"/users/{bob_id}", data={"username": "mallory", "profile_image": image()}, content_type="multipart/form-data")
+    assert response.status_code == 403
+    db.session.expire_all()
+    assert db.session.get(User, bob_id).username == "bob"
+    assert Job.query.count() == 0
+
+    response = client.patch(f"/users/{alice.id}", data={"username": "alicia", "profile_image": image()}, content_type="multipart/form-data")
+    assert response.status_code == 202
+    assert client.get(response.headers["X-Upload-Job"]).get_json()["status"] == "succeeded"
+    db.session.expire_all()
+    assert db.session.get(User, alice.id).username == "alicia"
+
+
+def test_a_failed_upload_marks_the_image_failed(client, login, make_user, monkeypatch):
+    def fail(self, data, filename):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(uploads.LocalFileBackend, "upload", fail)
+    alice = make_user("alice")
+    login(alice)
+    response = client.patch(f"/users/{alice.id}", data={"profile_image": image()}, content_type="multipart/form-data")
+    assert response.status_code == 202
+    job = client.get(response.headers["X-Upload-Job"]).get_json()
+    assert job["status"] == "failed" and "disk full" in job["error"]
+    db.session.expire_all()
+    assert db.session.get(User, alice.id).profile_image_status == "failed"
@@ -0,0 +1,247 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+
+from flask import current_app
+
+from config import db
+from green import run_native
+from models.home import Home
+from model_events import on_commit
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = {"a", "an", "and", "at", "by", "for", "in", "is", "of", "on", "or", "the", "to", "with"}
+TITLE_WEIGHT = 2
+
+
+def tokenize(text):
+    tokens = []
+    for token in TOKEN_RE.findall((text or "").lower()):
+        if len(token) < 2 or token in STOPWORDS:
+            continue
+        # Light plural folding so "pools" matches "pool"
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def _document_terms(values):
+    terms = Counter(tokenize(values.get("description")))
+    terms.update(tokenize(values.get("amenities")))
+    for token in tokenize(values.get("title")):
+        terms[token] += TITLE_WEIGHT
+    return terms
+
+
+class HomeTextIndex:
+    K1 = 1.2
+    B = 0.75
+    # BM25 splits into a per-term idf and a per-document weight that depends on the average
+    # document length. Postings are kept sorted by weight, computed with a frozen average that
+    # is only refreshed once the corpus drifts by this fraction; idfs come from the live counts.
+    STATS_DRIFT = 0.25
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.loaded = False
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self.postings = {}
+        self.doc_terms = {}
+        self.doc_lengths = {}
+        self.total_length = 0
+        self._ranked = {}
+        self._weights = {}
+        self._stats = None
+
+    # Maintenance
+    def load(self, session, batch_size=10000):
+        with self.lock:
+            query = session.query(Home.id, Home.title, Home.description, Home.amenities)
+            query = query.filter(Home.deleted_at.is_(None))
+            for home_id, title, description, amenities in query.yield_per(batch_size):
+                self.upsert(home_id, {"title": title, "description": description, "amenities": amenities})
+            # Commits that landed during the scan, replayed in order (as in HomeFilterEngine.load)
+            with self._pending_lock:
+                for upserts, deleted in self._pending:
+                    self._apply(upserts, deleted)
+                self._pending = None
+                self.loaded = True
+
+    def upsert(self, home_id, values):
+        with self.lock:
+            self.remove(home_id)
+            terms = _document_terms(values)
+            if not terms:
+                return
+            self.doc_terms[home_id] = terms
+            self.doc_lengths[home_id] = length = sum(terms.values())
+            self.total_length += length
+            for term, frequency in terms.items():
+                self.postings.setdefault(term, {})[home_id] = frequency
+                if term in self._ranked:
+                    self._insert_weight(term, home_id)
+
+    def remove(self, home_id):
+        with self.lock:
+            terms = self.doc_terms.pop(home_id, None)
+            if terms is None:
+                return
+            self.total_length -= self.doc_lengths.pop(home_id)
+            for term in terms:
+                if term in self._ranked:
+                    self._remove_weight(term, home_id)
+                postings = self.postings[term]
+                del postings[home_id]
+                if not postings:
+                    del self.postings[term]
+                    self._ranked.pop(term, None)
+                    self._weights.pop(term, None)
+
+    def _apply(self, upserts, deleted):
+        for home_id, values in upserts.items():
+            self.upsert(home_id, values)
+        for home_id in deleted:
+            self.remove(home_id)
+
+    def apply_changes(self, upserts, deleted):
+        with self._pending_lock:
+            if not self.loaded:
+                self._pending.append((upserts, deleted))
+                return
+        with self.lock:
+            self._apply(upserts, deleted)
+
+    # Scoring
+    def _current_stats(self):
+        count = len(self.doc_lengths)
+        average_length = self.total_length / count if count else 1.0
+        if self._stats is not None:
+            frozen_count, frozen_length = self._stats
+            if (
+                abs(count - frozen_count) <= self.STATS_DRIFT * max(frozen_count, 1)
+                and abs(average_length - frozen_length) <= self.STATS_DRIFT * frozen_length
+            ):
+                return self._stats
+        self._stats = (count, average_length)
+        self._ranked.clear()
+        self._weights.clear()
+        return self._stats
+
+    def _idf(self, term):
+        document_frequency = len(self.postings.get(term, ()))
+        if not document_frequency:
+            return 0.0
+        count = len(self.doc_lengths)
+        return math.log(1 + (count - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def _weight(self, term, home_id, average_length=None):
+        average_length = average_length or self._stats[1]
+        frequency = self.postings[term][home_id]
+        norm = self.K1 * (1 - self.B + self.B * self.doc_lengths[home_id] / average_length)
+        return frequency * (self.K1 + 1) / (frequency + norm)
+
+    def _insert_weight(self, term, home_id):
+        weight = self._weight(term, home_id)
+        self._weights[term][home_id] = weight
+        bisect.insort(self._ranked[term], (-weight, home_id))
+
+    def _remove_weight(self, term, home_id):
+        weight = self._weights[term].pop(home_id)
+        ranked = self._ranked[term]
+        del ranked[bisect.bisect_left(ranked, (-weight, home_id))]
+
+    def _ranked_postings(self, term):
+        if term not in self._ranked:
+            weights = {home_id: self._weight(term, home_id) for home_id in self.postings[term]}
+            self._weights[term] = weights
+            self._ranked[term] = sorted((-weight, home_id) for home_id, weight in weights.items())
+        return self._ranked[term], self._weights[term]
+
+    # Queries
+    def statistics(self, text):
+        # -> (average length, idf per query term): what a search is scored with. Later pages
+        # are scored with the first page's statistics, so the (score, id) cursor stays put
+        # while the corpus changes underneath it.
+        with self.lock:
+            return self._current_stats()[1], [self._idf(term) for term in dict.fromkeys(tokenize(text))]
+
+    def search(self, text, limit, after=None, statistics=None):
+        # Top-k by BM25 (score desc, id asc) strictly after the (score, id) cursor, using the
+        # threshold algorithm so only the heads of the postings are visited
+        terms = list(dict.fromkeys(tokenize(text)))
+        with self.lock:
+            frozen_length = self._current_stats()[1]
+            average_length, idfs = statistics or self.statistics(text)
+            if len(idfs) != len(terms) or average_length <= 0:
+                raise ValueError("Invalid cursor.")
+            lists = [
+                (term, idf, *self._ranked_postings(term))
+                for term, idf in zip(terms, idfs)
+                if idf > 0 and term in self.postings
+            ]
+            if not lists:
+                return []
+            # Postings are ordered by weights under the frozen average; under another average a
+            # weight is off by at most the ratio of the two, which bounds the threshold
+            slack = max(average_length / frozen_length, frozen_length / average_length)
+
+            best, seen, depth = [], set(), 0
+            while True:
+                threshold, progressed = 0.0, False
+                for _, idf, ranked, _ in lists:
+                    if depth >= len(ranked):
+                        continue
+                    progressed = True
+                    negative_weight, home_id = ranked[depth]
+                    threshold -= idf * negative_weight
+                    if home_id in seen:
+                        continue
+                    seen.add(home_id)
+                    if average_length == frozen_length:
+                        score = sum(idf * weights.get(home_id, 0.0) for _, idf, _, weights in lists)
+                    else:
+                        score = sum(
+                            idf * self._weight(term, home_id, average_length)
+                            for term, idf, _, weights in lists
+                            if home_id in weights
+                        )
+                    if after and not (score < after[0] or (score == after[0] and home_id > after[1])):
+                        continue
+                    item = (score, -home_id)
+                    if len(best) < limit:
+                        heapq.heappush(best, item)
+                    elif item > best[0]:
+                        heapq.heapreplace(best, item)
+                depth += 1
+                if not progressed or (len(best) == limit and best[0][0] > threshold * slack):
+                    break
+            return [(score, -negative_id) for score, negative_id in sorted(best, reverse=True)]
+
+
+def _load(app, index):
+    # May run off the request's thread (green.run_native), hence a fresh app context
+    with app.app_context():
+        index.load(db.session)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    if not current_app.config.get("HOME_TEXT_INDEX"):
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = HomeTextIndex()
+                on_commit(Home, index.apply_changes)
+                run_native(_load, current_app._get_current_object(), index)
+                _index = index
+    return _index
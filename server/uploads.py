@@ -0,0 +1,70 @@
+import io
+import os
+import uuid
+
+import cloudinary.uploader
+from flask import current_app
+from werkzeug.utils import secure_filename
+
+from config import db
+from jobs import create_job
+from metrics import UPLOAD_SECONDS
+from models.user import User
+
+
+# Backends
+class CloudinaryBackend:
+    def upload(self, data, filename):
+        response = cloudinary.uploader.upload(
+            io.BytesIO(data),
+            upload_preset="HomeApp",
+            unique_filename=True,
+            overwrite=True,
+            eager=[{"width": 500, "crop": "fill"}],
+        )
+        return response["eager"][0]["secure_url"]
+
+
+class LocalFileBackend:
+    # Filesystem stand-in for development and tests; files are served from /uploads/<name>
+    def __init__(self, directory):
+        self.directory = directory
+
+    def upload(self, data, filename):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{uuid.uuid4().hex}-{secure_filename(filename) or 'image'}"
+        with open(os.path.join(self.directory, name), "wb") as f:
+            f.write(data)
+        return f"/uploads/{name}"
+
+
+def get_backend():
+    if current_app.config["IMAGE_UPLOAD_BACKEND"] == "local":
+        return LocalFileBackend(current_app.config["IMAGE_UPLOAD_DIR"])
+    return CloudinaryBackend()
+
+
+# Profile Images
+def upload_profile_image(user_id, data, filename):
+    backend = get_backend()
+    try:
+        with UPLOAD_SECONDS.time(backend=current_app.config["IMAGE_UPLOAD_BACKEND"]):
+            image_url = backend.upload(data, filename)
+    except Exception:
+        if user := db.session.get(User, user_id):
+            user.profile_image_status = "failed"
+            db.session.commit()
+        raise
+    if user := db.session.get(User, user_id):
+        user.profile_image = image_url
+        user.profile_image_status = "ready"
+        db.session.commit()
+    return {"profile_image": image_url}
+
+
+def queue_profile_image(user, file):
+    # Reads the upload now (the request stream closes with the request) and defers the remote call
+    data = file.read()
+    db.session.flush()
+    user.profile_image_status = "pending"
+    return create_job("profile_image", upload_profile_image, user.id, data, file.filename, user_id=user.id)